@@ -8,6 +8,16 @@ def change_preferences_path(tmp_path_factory):
     preferences.set_path(tmp_path_factory.mktemp("preferences") / "preferences.json")
 
 
+@pytest.fixture(autouse=True)
+def clear_layer_tile_cache():
+    """Layer tiles rendered by one test must not be found by the next one"""
+    from volumina.pixelpipeline.tilecache import LAYER_TILE_CACHE
+
+    LAYER_TILE_CACHE.clear()
+    yield
+    LAYER_TILE_CACHE.clear()
+
+
 @pytest.fixture()
 def patch_threadpool():
     """
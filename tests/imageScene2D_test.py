@@ -26,6 +26,7 @@ import time
 
 import pytest
 
+from qtpy.QtCore import QCoreApplication, QRectF
 from qtpy.QtGui import QImage, QPainter
 from qtpy.QtWidgets import QStyleOptionGraphicsItem
 
@@ -34,12 +35,14 @@ import numpy as np
 
 from volumina.imageScene2D import ImageScene2D, DirtyIndicator
 from volumina.positionModel import PositionModel
-from volumina.pixelpipeline.datasources import ConstantSource
+from volumina.pixelpipeline.datasources import ArraySource, ConstantSource
 from volumina.pixelpipeline.slicesources import PlanarSliceSource
-from volumina.pixelpipeline.imagepump import StackedImageSources
+from volumina.pixelpipeline.imagepump import ImagePump, StackedImageSources
 from volumina.tiling import Tiling
 from volumina.layerstack import LayerStackModel
 from volumina.layer import GrayscaleLayer
+from volumina.slicingtools import SliceProjection
+from volumina.warmUpController import WarmUpController
 
 
 @pytest.fixture(autouse=True)
@@ -140,6 +143,97 @@ class ImageScene2DTest(ut.TestCase):
         s.stackedImageSources = sims
         self.assertEqual(id(s.stackedImageSources), id(sims))
 
+    def testFastScrollingFetchesKeyframesOnly(self):
+        s = ImageScene2D(PositionModel(), (0, 3, 4), preemptive_fetch_number=0)
+        step = s.SLICE_SETTLE / 2
+        fetched = []
+        for i in range(40):
+            s._coalesceSliceChange(100.0 + i * step)
+            fetched.append(s._fetchSlice)
+
+        # the first slice, then one keyframe per interval
+        n_keyframes = 40 * step / s.KEYFRAME_INTERVAL
+        assert fetched[0]
+        assert n_keyframes - 1 <= sum(fetched) <= n_keyframes + 2
+
+        # the slice the user stops at is fetched
+        s._onSliceSettled()
+        assert s._fetchSlice
+
+        # slow scrolling fetches every slice
+        s._coalesceSliceChange(200.0)
+        s._coalesceSliceChange(200.0 + 2 * s.SLICE_SETTLE)
+        assert s._fetchSlice
+
+    def testPrefetchFramesStreamsFramesOfCurrentSlice(self):
+        data = np.random.randint(0, 255, (4, 300, 200, 3, 1)).astype(np.uint8)
+        layerstack = LayerStackModel()
+        layerstack.append(GrayscaleLayer(ArraySource(data), normalize=False))
+        pump = ImagePump(layerstack, SliceProjection(), sync_along=(0, 1))
+        posModel = PositionModel()
+        posModel.shape5D = list(data.shape)
+        s = ImageScene2D(posModel, (0, 3, 4), preemptive_fetch_number=0)
+        s.stackedImageSources = pump.stackedImageSources
+        s.dataShape = (300, 200)
+
+        s.prefetchFrames([1, 2])
+        deadline = time.perf_counter() + 10
+        while s.frameProgress(1) < 1 or s.frameProgress(2) < 1:
+            assert time.perf_counter() < deadline, "frames were not streamed"
+            QCoreApplication.processEvents()
+            time.sleep(0.01)
+            # like the playback does on every tick, e.g. after the data range of the layer was updated
+            s.prefetchFrames([1, 2])
+        assert s.frameProgress(3) == 0.0
+        assert s.frameFetchSeconds() > 0
+
+        s.prefetchFrames([])
+        assert s._tileProvider._prefetch_stacks == frozenset()
+
+    def testPlaybackRestoresCacheSize(self):
+        s = ImageScene2D(PositionModel(), (0, 3, 4), preemptive_fetch_number=0)
+        s.stackedImageSources = StackedImageSources(LayerStackModel())
+        s.dataShape = (30, 20)
+        s.setCacheSize(2)
+
+        s.prefetchFrames(range(1, 6))
+        assert s.cacheSize() == 6
+        s.prefetchFrames(range(2, 8))
+        assert s.cacheSize() == 7
+        s.prefetchFrames([])
+        assert s.cacheSize() == 2
+
+    def testWarmUpRoi(self):
+        data = np.random.randint(0, 255, (2, 300, 200, 3, 1)).astype(np.uint8)
+        layerstack = LayerStackModel()
+        layerstack.append(GrayscaleLayer(ArraySource(data), normalize=False))
+        pump = ImagePump(layerstack, SliceProjection(), sync_along=(0, 1))
+        posModel = PositionModel()
+        posModel.shape5D = list(data.shape)
+        posModel.slicingPos = (0, 0, 1)
+        s = ImageScene2D(posModel, (0, 3, 4), preemptive_fetch_number=0)
+        s.stackedImageSources = pump.stackedImageSources
+        s.dataShape = (300, 200)
+
+        rectF, throughs = s.roiSlices((0, 10, 20, 0), (2, 110, 70, 3))
+        assert rectF == QRectF(10, 20, 100, 50)
+        # nearest to the current slice first
+        assert throughs[0] == (0, 1)
+        assert sorted(throughs) == [(t, z) for t in range(2) for z in range(3)]
+
+        warmUp = WarmUpController([s])
+        finished = []
+        warmUp.finished.connect(finished.append)
+        warmUp.start((0, 10, 20, 0), (2, 110, 70, 3))
+        deadline = time.perf_counter() + 10
+        while not finished:
+            assert time.perf_counter() < deadline, "region was not warmed up"
+            QCoreApplication.processEvents()
+            time.sleep(0.01)
+        assert finished == [True]
+        assert warmUp.skippedSlices == 0
+        assert all(s.sliceProgress(rectF, through) == 1.0 for through in throughs)
+
 
 @pytest.mark.usefixtures("qapp")
 class ImageScene2D_RenderTest(ut.TestCase):
@@ -180,10 +180,12 @@ class GrayscaleImageSourceTest2(ImageSourcesTestBase):
 
         result_array = qimage2ndarray.byte_view(result)
 
-        assert (result_array[:10, :, -1] == 255).all()
-        assert (result_array[-10:, :, -1] == 255).all()
-        assert (result_array[:, :10, -1] == 255).all()
-        assert (result_array[:, -10:, -1] == 255).all()
+        # masked pixels are transparent
+        assert (result_array[:10, :, -1] == 0).all()
+        assert (result_array[-10:, :, -1] == 0).all()
+        assert (result_array[:, :10, -1] == 0).all()
+        assert (result_array[:, -10:, -1] == 0).all()
+        assert (result_array[10:-10, 10:-10, -1] == 255).all()
 
     def testSetDirty(self):
         def checkAllDirty(rect):
@@ -345,6 +345,38 @@ def test_requests_are_cancelled_bc_keep_different_stack(
     assert request_buffer._active == 0  # pyright: ignore [reportPrivateUsage]
 
 
+def test_clear_keeps_requests_of_kept_stacks(
+    request_buffer: LazyflowRequestBuffer,
+    default_waiting_func: WaitingFunc,
+    buffer_finished_evt: TimeoutRaisingEvent,
+    default_context: Context,
+):
+    stack_id2 = (object(), ((0, 0)))
+    stack_id3 = (object(), ((0, 1)))
+    for stack_id in (stack_id2, stack_id3):
+        for _ in range(5):
+            request_buffer.submit(
+                lambda: None,
+                priority=default_context.priority,
+                viewport_ref=default_context.view_port,
+                stack_id=stack_id,
+                tile_no=default_context.tile_no,
+            )
+    request_buffer.clear_non_relevant_tasks_from_queue(
+        default_context.view_port, default_context.stack_id, keep_tiles=[0], keep_stacks=[stack_id2]
+    )
+    assert request_buffer._cleared_tasks == 5  # pyright: ignore [reportPrivateUsage]
+    # the running task of a kept stack is not cancelled
+    request_buffer.clear_non_relevant_tasks_from_queue(
+        default_context.view_port, stack_id2, keep_tiles=[0], keep_stacks=[default_context.stack_id]
+    )
+    assert default_waiting_func.running
+    default_waiting_func.req_continue.set()
+    default_waiting_func.done.wait_raise()
+    buffer_finished_evt.wait_raise()
+    assert default_context.view_port.setTileDirty.call_count == 5
+
+
 def test_clear_keeps_requests_from_other_vp(
     request_buffer: LazyflowRequestBuffer,
     default_waiting_func: WaitingFunc,
@@ -442,3 +474,165 @@ def test_clear(
     buffer_finished_evt.wait_raise()
     assert default_context.view_port.setTileDirty.call_count == 0  # pyright: ignore [reportPrivateUsage]
     assert request_buffer._active == 0  # pyright: ignore [reportPrivateUsage]
+
+
+def test_running_request_cancelled_on_slice_change(default_context: Context):
+    request_buffer = LazyflowRequestBuffer(1)
+    waiting_func = WaitingFunc()
+    ims_request = MagicMock()
+    request_buffer.submit(
+        waiting_func,
+        priority=default_context.priority,
+        viewport_ref=default_context.view_port,
+        stack_id=default_context.stack_id,
+        tile_no=default_context.tile_no,
+        request=ims_request,
+    )
+    waiting_func.started.wait_raise()
+
+    # running tasks in the current slice are kept, even if no longer in view
+    request_buffer.clear_non_relevant_tasks_from_queue(
+        default_context.view_port, default_context.stack_id, keep_tiles=[]
+    )
+    ims_request.cancel.assert_not_called()
+
+    stack_id2 = (object(), ((0, 1)))
+    for _ in range(2):
+        request_buffer.clear_non_relevant_tasks_from_queue(
+            default_context.view_port, stack_id2, keep_tiles=[default_context.tile_no]
+        )
+    ims_request.cancel.assert_called_once()
+    assert request_buffer._cancelled_running == 1  # pyright: ignore [reportPrivateUsage]
+    default_context.view_port.setTileDirty.assert_called_once_with(default_context.stack_id, default_context.tile_no)
+    waiting_func.req_continue.set()
+    waiting_func.done.wait_raise()
+
+
+def test_reprioritize(
+    request_buffer: LazyflowRequestBuffer,
+    default_waiting_func: WaitingFunc,
+    buffer_finished_evt: TimeoutRaisingEvent,
+    default_context: Context,
+):
+    viewPort2 = MagicMock()
+    for i in range(3):
+        request_buffer.submit(
+            lambda: None,
+            priority=(i,),
+            viewport_ref=default_context.view_port,
+            stack_id=default_context.stack_id,
+            tile_no=i,
+        )
+    request_buffer.submit(
+        lambda: None, priority=(10,), viewport_ref=viewPort2, stack_id=default_context.stack_id, tile_no=0
+    )
+
+    request_buffer.reprioritize(default_context.view_port, lambda priority, tile_no: (-tile_no,))
+
+    queues = request_buffer._queues.values()  # pyright: ignore [reportPrivateUsage]
+    queued = sorted(task for queue in queues for task in queue)
+    assert [task.priority for task in queued] == [(-2,), (-1,), (0,), (10,)]
+    default_waiting_func.req_continue.set()
+    buffer_finished_evt.wait_raise()
+
+
+def _submit(buffer: LazyflowRequestBuffer, func, priority, viewport, context: Context, tile_no: int = 0):
+    buffer.submit(func, priority=priority, viewport_ref=viewport, stack_id=context.stack_id, tile_no=tile_no)
+
+
+def test_active_viewport_gets_reserved_share(default_context: Context):
+    request_buffer = LazyflowRequestBuffer(2, active_share=0.5)
+    background, active = MagicMock(), MagicMock()
+    running = [WaitingFunc(), WaitingFunc()]
+    for i, func in enumerate(running):
+        _submit(request_buffer, func, (0,), background, default_context, tile_no=i)
+        func.started.wait_raise()
+
+    queued_background, queued_active = WaitingFunc(), WaitingFunc()
+    _submit(request_buffer, queued_background, (-1000,), background, default_context, tile_no=2)
+    _submit(request_buffer, queued_active, (0,), active, default_context)
+    request_buffer.set_active_viewport(active)
+
+    running[0].req_continue.set()
+    queued_active.started.wait_raise()
+    assert not queued_background.running
+
+    stats = request_buffer.viewport_stats(background)
+    assert (stats.queued, stats.running) == (1, 1)
+    assert request_buffer.viewport_stats(active).running == 1
+
+    for func in (running[1], queued_active, queued_background):
+        func.req_continue.set()
+    queued_background.done.wait_raise()
+
+
+def test_starved_viewport_is_aged(default_context: Context):
+    request_buffer = LazyflowRequestBuffer(1, active_share=0.0, aging_interval=1.0)
+    vp1, vp2 = MagicMock(), MagicMock()
+    blocking = WaitingFunc()
+    _submit(request_buffer, blocking, (0,), vp1, default_context)
+    blocking.started.wait_raise()
+
+    fresh, starved = WaitingFunc(), WaitingFunc()
+    _submit(request_buffer, fresh, (-1000,), vp1, default_context, tile_no=1)
+    _submit(request_buffer, starved, (0,), vp2, default_context)
+    (starved_task,) = request_buffer._queues[vp2]  # pyright: ignore [reportPrivateUsage]
+    starved_task._submitted -= 2.0  # pyright: ignore [reportPrivateUsage]
+
+    blocking.req_continue.set()
+    starved.started.wait_raise()
+    assert not fresh.running
+    assert request_buffer.viewport_stats(vp2).wait_time >= 2.0
+
+    starved.req_continue.set()
+    fresh.req_continue.set()
+    fresh.done.wait_raise()
+
+
+def test_pruning_skips_unchanged_view(
+    request_buffer: LazyflowRequestBuffer,
+    default_waiting_func: WaitingFunc,
+    buffer_finished_evt: TimeoutRaisingEvent,
+    default_context: Context,
+):
+    vp = default_context.view_port
+    ran = []
+    for tile_no in (1, 2):
+        _submit(request_buffer, lambda tile_no=tile_no: ran.append(tile_no), (0,), vp, default_context, tile_no)
+
+    request_buffer.clear_non_relevant_tasks_from_queue(vp, default_context.stack_id, keep_tiles=[1])
+    assert request_buffer._cleared_tasks == 1  # pyright: ignore [reportPrivateUsage]
+    queue = request_buffer._queues[vp]  # pyright: ignore [reportPrivateUsage]
+    assert not queue._unpruned  # pyright: ignore [reportPrivateUsage]
+
+    # nothing changed: nothing to look at
+    request_buffer.clear_non_relevant_tasks_from_queue(vp, default_context.stack_id, keep_tiles=[1])
+    assert request_buffer._cleared_tasks == 1  # pyright: ignore [reportPrivateUsage]
+
+    _submit(request_buffer, lambda: ran.append(3), (0,), vp, default_context, tile_no=3)
+    assert queue._unpruned == {(default_context.stack_id, 3)}  # pyright: ignore [reportPrivateUsage]
+    request_buffer.clear_non_relevant_tasks_from_queue(vp, default_context.stack_id, keep_tiles=[1])
+    assert request_buffer._cleared_tasks == 2  # pyright: ignore [reportPrivateUsage]
+    assert request_buffer.viewport_stats(vp).queued == 1
+
+    finished = install_finish_even(request_buffer, "decr")
+    default_waiting_func.req_continue.set()
+    buffer_finished_evt.wait_raise()
+    finished.wait_raise()
+    assert ran == [1]
+
+
+def test_idle(
+    request_buffer: LazyflowRequestBuffer,
+    default_waiting_func: WaitingFunc,
+    buffer_finished_evt: TimeoutRaisingEvent,
+    default_context: Context,
+):
+    assert not request_buffer.idle()
+    _submit(request_buffer, lambda: None, (0,), default_context.view_port, default_context, tile_no=1)
+
+    finished = install_finish_even(request_buffer, "decr")
+    default_waiting_func.req_continue.set()
+    buffer_finished_evt.wait_raise()
+    finished.wait_raise()
+    assert request_buffer.idle()
@@ -54,6 +54,7 @@ def layer_obj(request, src: DataSourceABC, priority: int):
         (layer.AlphaModulatedLayer, imsrc.AlphaModulatedImageSource),
         (layer.GrayscaleLayer, imsrc.GrayscaleImageSource),
         (layer.ColortableLayer, imsrc.ColortableImageSource),
+        (layer.MultiChannelCompositeLayer, imsrc.MultiChannelCompositeImageSource),
         (layer.DummyGraphicsItemLayer, imsrc.DummyItemSource),
         (layer.DummyRasterItemLayer, imsrc.DummyRasterItemSource),
         (layer.SegmentationEdgesLayer, imsrc.SegmentationEdgesItemSource),
@@ -71,7 +72,9 @@ def test_create_image_source_returns_correct_type_and_prio(
 
 
 @pytest.mark.parametrize(
-    "layer_obj", [layer.AlphaModulatedLayer, layer.GrayscaleLayer, layer.ColortableLayer], indirect=["layer_obj"]
+    "layer_obj",
+    [layer.AlphaModulatedLayer, layer.GrayscaleLayer, layer.ColortableLayer, layer.MultiChannelCompositeLayer],
+    indirect=["layer_obj"],
 )
 def test_reacts_on_name_change(planar_src: PlanarSliceSourceABC, layer_obj: layer.Layer):
     new_src = layer_obj.createImageSource([planar_src])
@@ -1,3 +1,4 @@
+import os
 import sys
 import threading
 import time
@@ -10,6 +11,7 @@ from qtpy.QtCore import QObject, Signal
 
 from volumina.pixelpipeline.datasources.cachesource import CacheSource
 from volumina.utility.cache import KVCache
+from volumina.utility.diskcache import DiskCache
 
 
 class DummySource(QObject):
@@ -184,3 +186,88 @@ def test_cache_not_written_concurrently(monkeypatch, cached_source):
 
     assert not exceptions
     assert cached_source._cache._set_calls == 2, "cache.__setitem__ must be called by both threads to test concurrency"
+
+
+def test_shared_request_cancelled_by_last_requester(cached_source, raw_source):
+    slicing = np.s_[1:2, 2:3, 3:4]
+    req0 = cached_source.request(slicing)
+    req1 = cached_source.request(slicing)
+    assert req0 is req1
+    raw_request = req0._rq = mock.Mock()
+
+    req0.cancel()
+    raw_request.cancel.assert_not_called()
+    assert cached_source.request(slicing) is req1
+
+    req1.cancel()
+    raw_request.cancel.assert_not_called()
+    req1.cancel()
+    raw_request.cancel.assert_called_once()
+
+    # a new request is created after cancellation
+    assert cached_source.request(slicing) is not req1
+
+
+class FingerprintedSource(DummySource):
+    fingerprint = "dummy-v1"
+
+
+@pytest.fixture
+def disk_cache(tmp_path):
+    return DiskCache(str(tmp_path), 1024 * 1024)
+
+
+def test_persisted_data_survives_the_session(disk_cache):
+    slicing = np.s_[1:2, 2:3, 3:4]
+    raw_source = FingerprintedSource(np.arange(60).reshape(3, 4, 5))
+    cached_source = CacheSource(raw_source, cache=KVCache(1000, getsizeof=sys.getsizeof), disk_cache=disk_cache)
+    assert_array_equal(np.array([[[33]]]), cached_source.request(slicing).wait())
+    disk_cache.flush()
+    assert len(disk_cache) == 1
+
+    # a new session starts with an empty memory cache
+    fresh = CacheSource(raw_source, cache=KVCache(1000, getsizeof=sys.getsizeof), disk_cache=disk_cache)
+    req = fresh.request(slicing)
+    raw_request = req._rq = mock.Mock()
+    req.submit()
+    assert_array_equal(np.array([[[33]]]), req.wait())
+    raw_request.submit.assert_not_called()
+    raw_request.wait.assert_not_called()
+
+
+def test_dirty_source_discards_persisted_data(disk_cache):
+    slicing = np.s_[2:3, 0:1, 2:3]
+    raw_source = FingerprintedSource(np.arange(60).reshape(3, 4, 5))
+    cached_source = CacheSource(raw_source, cache=KVCache(1000, getsizeof=sys.getsizeof), disk_cache=disk_cache)
+    assert_array_equal(np.array([[[42]]]), cached_source.request(slicing).wait())
+
+    raw_source.set_data(np.arange(27, 87).reshape(3, 4, 5))
+    assert len(disk_cache) == 0
+    assert_array_equal(np.array([[[69]]]), cached_source.request(slicing).wait())
+    # the data no longer matches the fingerprint: it is persisted again once the fingerprint changes
+    disk_cache.flush()
+    assert len(disk_cache) == 0
+    assert not os.listdir(disk_cache._directory)
+
+    raw_source.fingerprint = "dummy-v2"
+    assert_array_equal(np.array([[[70]]]), cached_source.request(np.s_[2:3, 0:1, 3:4]).wait())
+    disk_cache.flush()
+    assert len(disk_cache) == 1
+
+
+def test_data_requested_before_the_source_became_dirty_is_not_persisted(disk_cache):
+    slicing = np.s_[2:3, 0:1, 2:3]
+    raw_source = FingerprintedSource(np.arange(60).reshape(3, 4, 5))
+    cached_source = CacheSource(raw_source, cache=KVCache(1000, getsizeof=sys.getsizeof), disk_cache=disk_cache)
+    req = cached_source.request(slicing)
+
+    raw_source.set_data(np.arange(27, 87).reshape(3, 4, 5))
+    req.wait()
+    disk_cache.flush()
+    assert len(disk_cache) == 0
+
+
+def test_sources_without_fingerprint_are_not_persisted(raw_source, disk_cache):
+    cached_source = CacheSource(raw_source, disk_cache=disk_cache)
+    cached_source.request(np.s_[2:3, 0:1, 2:3]).wait()
+    assert len(disk_cache) == 0
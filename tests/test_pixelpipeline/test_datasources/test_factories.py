@@ -7,6 +7,7 @@ from numpy.random import rand
 from numpy.testing import assert_array_equal
 
 from volumina.pixelpipeline import datasources as ds
+from volumina.utility.diskcache import DiskCache
 
 
 @pytest.fixture
@@ -82,6 +83,19 @@ def test_lazyflow_tagged_shape_embedding(lazyflow_op, vigra, dims, expected_shap
     assert_array_equal(expected_array, src_array)
 
 
+def test_lazyflow_fingerprint_enables_the_disk_cache(lazyflow_op, tmp_path):
+    lazyflow_op.Input.setValue(np.arange(60).reshape(3, 4, 5))
+
+    outsrc = ds.createDataSource(lazyflow_op.Output, fingerprint="piper-v1")
+    assert isinstance(outsrc, ds.CacheSource)
+    assert outsrc.fingerprint == "piper-v1"
+
+    outsrc._disk_cache = disk_cache = DiskCache(str(tmp_path), 1024 * 1024)
+    outsrc.request(np.s_[0:1, 0:1, 0:1, 0:1, 0:1]).wait()
+    disk_cache.flush()
+    assert len(disk_cache) == 1
+
+
 @pytest.mark.parametrize(
     "shape,expected_shape",
     [
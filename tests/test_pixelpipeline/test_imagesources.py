@@ -1,13 +1,27 @@
 import contextlib
 import logging
+from functools import partial
 
 from unittest import mock
 
+import numpy as np
 import pytest
 
 from qtpy.QtCore import QRect
+from qtpy.QtGui import QColor, QImage
 from volumina.pixelpipeline import imagesources as imsrc
-from volumina.pixelpipeline.interface import ImageSourceABC, PlanarSliceSourceABC
+from volumina.pixelpipeline.datasources.arraysource import ArrayRequest
+from volumina.pixelpipeline.imagesources._render import (
+    LookupTables,
+    additive_composite,
+    alpha_modulated_to_argb32,
+    apply_colortable,
+    argb32_view,
+    normalize_to_argb32,
+    palette_from_colortable,
+    render,
+)
+from volumina.pixelpipeline.interface import ImageSourceABC, PlanarSliceSourceABC, RequestABC
 
 
 class PipelineCfg:
@@ -77,3 +91,465 @@ def test_pixelpipeline_nonverbose_log(img_source, nonverbose_pipeline, caplog):
     img_source.request(rect)
 
     assert len(caplog.records) == 0
+
+
+class DeferredRequest(RequestABC):
+    """Array request that only completes when finish() is called"""
+
+    def __init__(self, array):
+        self._array = array
+        self._callbacks = []
+        self.finished = False
+        self.submitted = False
+
+    def submit(self):
+        self.submitted = True
+        return self
+
+    def add_done_callback(self, fn):
+        if self.finished:
+            fn(self)
+        else:
+            self._callbacks.append(fn)
+
+    def finish(self):
+        self.finished = True
+        for fn in self._callbacks:
+            fn(self)
+
+    def wait(self):
+        assert self.finished, "wait() would block"
+        return self._array
+
+
+@pytest.mark.parametrize(
+    "make_request",
+    [
+        lambda req: imsrc.grayscale.GrayscaleImageRequest(req, normalize=(0, 255)),
+        lambda req: imsrc.alphamodulated.AlphaModulatedImageRequest(req, QColor(255, 0, 0), (0, 255)),
+        lambda req: imsrc.rgba.RGBAImageRequest(req, req, req, req, [4, 3]),
+    ],
+)
+def test_image_request_done_callback(make_request):
+    array_req = DeferredRequest(np.full((4, 3), 42, dtype=np.uint8))
+    img_req = make_request(array_req)
+    done = []
+
+    assert img_req.submit() is img_req
+    assert array_req.submitted
+    img_req.add_done_callback(done.append)
+    assert done == []
+
+    array_req.finish()
+    assert done == [img_req]
+    assert isinstance(img_req.wait(), QImage)
+
+
+def test_synchronous_request_calls_back_immediately():
+    img_req = imsrc.grayscale.GrayscaleImageRequest(ArrayRequest(np.zeros((4, 3), dtype=np.uint8), np.s_[:, :]))
+    done = []
+    img_req.submit().add_done_callback(done.append)
+    assert done == [img_req]
+
+
+@pytest.mark.parametrize(
+    "make_request, n_cancelled",
+    [
+        (lambda req: imsrc.grayscale.GrayscaleImageRequest(req), 1),
+        (lambda req: imsrc.colortable.ColortableImageRequest(req, np.zeros((2, 4), dtype=np.uint8), None), 1),
+        (lambda req: imsrc.alphamodulated.AlphaModulatedImageRequest(req, QColor(255, 0, 0)), 1),
+        (lambda req: imsrc.rgba.RGBAImageRequest(req, req, req, req, [4, 3]), 4),
+    ],
+)
+def test_image_request_cancel_is_forwarded(make_request, n_cancelled):
+    array_req = mock.Mock(spec=RequestABC)
+    make_request(array_req).cancel()
+    assert array_req.cancel.call_count == n_cancelled
+
+
+def _colortable(*colors):
+    table = np.zeros((len(colors), 4), dtype=np.uint8)
+    for i, color in enumerate(colors):
+        table[i] = color.blue(), color.green(), color.red(), color.alpha()
+    return table
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.int32, np.uint32, np.int64, np.uint64])
+def test_colortable_wraps_labels(dtype):
+    colors = [QColor(255, 0, 0), QColor(0, 255, 0), QColor(0, 0, 255)]
+    labels = np.array([[0, 1, 2], [3, 4, 5]], dtype=dtype)
+    if np.dtype(dtype).itemsize == 8:
+        labels[1] += np.iinfo(np.int64).max - 5
+    req = imsrc.colortable.ColortableImageRequest(ArrayRequest(labels, np.s_[:, :]), _colortable(*colors), None)
+
+    img = req.wait()
+
+    assert (img.width(), img.height()) == (3, 2)
+    for (y, x), label in np.ndenumerate(labels):
+        assert img.pixel(x, y) == colors[int(label) % len(colors)].rgba()
+
+
+def test_colortable_masked_labels_are_transparent():
+    labels = np.ma.masked_array(np.arange(6, dtype=np.uint64).reshape(2, 3), mask=[[0, 1, 0], [0, 0, 1]])
+    colors = [QColor(255, 0, 0), QColor(0, 255, 0)]
+    req = imsrc.colortable.ColortableImageRequest(ArrayRequest(labels, np.s_[:, :]), _colortable(*colors), None)
+
+    img = req.wait()
+
+    assert img.pixel(1, 0) == 0
+    assert img.pixel(2, 1) == 0
+    assert img.pixel(0, 1) == colors[1].rgba()
+
+
+def test_numpy_colortable_matches_vigra():
+    vigra = pytest.importorskip("vigra")
+    from qimage2ndarray import byte_view
+
+    table = np.random.randint(0, 256, (17, 4), dtype=np.uint8)
+    labels = np.random.randint(0, 1000, (64, 48), dtype=np.uint32)
+    expected = QImage(48, 64, QImage.Format_ARGB32)
+    vigra.colors.applyColortable(vigra.taggedView(labels, "xy"), table, byte_view(expected))
+    result = QImage(48, 64, QImage.Format_ARGB32)
+    apply_colortable(labels, palette_from_colortable(table), argb32_view(result))
+    assert result == expected
+
+
+def _gray(value):
+    return QColor(value, value, value).rgba()
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.int16, np.uint16, np.int32, np.uint64, np.float32])
+def test_grayscale_normalization(dtype):
+    data = np.array([[0, 10, 20], [30, 40, 50]], dtype=dtype)
+    req = imsrc.grayscale.GrayscaleImageRequest(ArrayRequest(data, np.s_[:, :]), normalize=(10, 30))
+
+    img = req.wait()
+
+    assert img.format() == QImage.Format_ARGB32_Premultiplied
+    expected = [[0, 0, 127], [255, 255, 255]]
+    for (y, x), value in np.ndenumerate(expected):
+        assert img.pixel(x, y) == _gray(value)
+
+
+def test_grayscale_strided_masked_view():
+    data = np.ma.masked_array(np.arange(-8, 8, dtype=np.int16).reshape(4, 4), mask=np.eye(4, dtype=bool))
+    view = data.T[::2]
+    out = argb32_view(QImage(4, 2, QImage.Format_ARGB32_Premultiplied))
+
+    render(view, out, partial(normalize_to_argb32, normalize=(-8, 8)))
+
+    gray = np.clip((view.data + 8) * (255.0 / 16), 0, 255).astype(np.uint32)
+    expected = np.where(view.mask, 0, 0xFF000000 | gray * 0x010101)
+    np.testing.assert_array_equal(out, expected)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.int8, np.uint16, np.int16])
+@pytest.mark.parametrize(
+    "kernel",
+    [
+        partial(normalize_to_argb32, normalize=(-100, 1000)),
+        partial(alpha_modulated_to_argb32, normalize=(3, 200), tint=QColor(255, 128, 0)),
+    ],
+)
+def test_lookup_table_matches_kernel(dtype, kernel):
+    info = np.iinfo(dtype)
+    data = np.random.randint(info.min, info.max, (16, 16), dtype=dtype)
+    expected = np.empty(data.shape, dtype=np.uint32)
+    kernel(data, expected)
+
+    luts = LookupTables()
+    out = np.empty(data.shape, dtype=np.uint32)
+    render(data, out, kernel, luts, "params")
+
+    np.testing.assert_array_equal(out, expected)
+    assert luts.get(np.dtype(dtype), "params", None) is luts.get(np.dtype(dtype), "params", None)
+
+
+def test_lookup_table_rebuilt_for_new_normalization():
+    luts = LookupTables()
+    data = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    for normalize in [(0, 10), (0, 10), (2, 4)]:
+        img = imsrc.grayscale.GrayscaleImageRequest(ArrayRequest(data, np.s_[:, :]), normalize, luts=luts).wait()
+        assert img.pixel(3, 0) == _gray(int(255 * (3 - normalize[0]) / (normalize[1] - normalize[0])))
+    assert len(luts._tables) == 2
+
+
+def test_colortable_lookup_table_normalizes():
+    colors = [QColor(255, 0, 0), QColor(0, 255, 0), QColor(0, 0, 255)]
+    data = np.array([[0, 50, 100]], dtype=np.int16)
+    req = imsrc.colortable.ColortableImageRequest(
+        ArrayRequest(data, np.s_[:, :]), _colortable(*colors), (0, 100), luts=LookupTables()
+    )
+
+    img = req.wait()
+
+    assert [img.pixel(x, 0) for x in range(3)] == [color.rgba() for color in colors]
+
+
+@pytest.fixture
+def counted_slice_source():
+    from volumina.pixelpipeline.datasources.arraysource import ArraySource
+    from volumina.pixelpipeline.slicesources import PlanarSliceSource
+
+    data = np.arange(2 * 8 * 6, dtype=np.uint8).reshape(2, 8, 6, 1, 1)
+    datasource = ArraySource(data)
+    with mock.patch.object(datasource, "request", wraps=datasource.request) as request:
+        yield PlanarSliceSource(datasource), request
+
+
+def test_display_change_rerenders_from_raw_arrays(counted_slice_source):
+    slice_source, datasource_request = counted_slice_source
+    layer = mock.MagicMock()
+    layer.normalize = [(0, 255)]
+    source = imsrc.GrayscaleImageSource(slice_source, layer)
+    rect = QRect(0, 0, 8, 6)
+
+    before = argb32_view(source.request(rect, ((0, 1),)).wait()).copy()
+    layer.normalize = [(0, 127)]
+    after = argb32_view(source.request(rect, ((0, 1),)).wait())
+
+    assert datasource_request.call_count == 1
+    assert not np.array_equal(before, after)
+
+    source.request(rect, ((0, 0),)).wait()
+    assert datasource_request.call_count == 2
+
+
+def test_data_change_invalidates_raw_arrays(counted_slice_source):
+    slice_source, datasource_request = counted_slice_source
+    layer = mock.MagicMock()
+    layer.normalize = [None]
+    source = imsrc.ColortableImageSource(slice_source, layer)
+
+    source.request(QRect(0, 0, 4, 6)).wait()
+    source.request(QRect(4, 0, 4, 6)).wait()
+    slice_source.setDirty(np.s_[0:2, 0:6])
+    source.request(QRect(0, 0, 4, 6)).wait()
+    source.request(QRect(4, 0, 4, 6)).wait()
+
+    assert datasource_request.call_count == 3
+
+
+def test_raw_arrays_are_shared_between_image_sources(counted_slice_source):
+    slice_source, datasource_request = counted_slice_source
+    layer = mock.MagicMock()
+    layer.normalize = [None]
+    rect = QRect(0, 0, 8, 6)
+
+    imsrc.GrayscaleImageSource(slice_source, layer).request(rect, ((0, 1),)).wait()
+    imsrc.ColortableImageSource(slice_source, layer).request(rect, ((0, 1),)).wait()
+
+    assert datasource_request.call_count == 1
+
+
+def test_raw_arrays_requested_before_invalidation_are_not_stored():
+    cache = imsrc._base.RawArrayCache(2**20)
+    slice_source = mock.MagicMock(spec=PlanarSliceSourceABC)
+    slice_source.through = [0, 0, 0]
+    slice_source.request.return_value = ArrayRequest(np.zeros((4, 4), dtype=np.uint8), np.s_[:, :])
+    cache.register(slice_source)
+
+    req = cache.request(slice_source, QRect(0, 0, 4, 4))
+    cache.invalidate(slice_source)
+    req.wait()
+
+    assert len(cache) == 0
+
+
+def _grayscale_source(slice_source, normalize=(0, 255)):
+    layer = mock.MagicMock()
+    layer.normalize = [normalize]
+    return imsrc.GrayscaleImageSource(slice_source, layer)
+
+
+def test_layer_tiles_are_shared_between_views(counted_slice_source):
+    from volumina.pixelpipeline.slicesources import PlanarSliceSource
+    from volumina.pixelpipeline.tilecache import CachedTileRequest, LayerTileCache
+
+    slice_source, datasource_request = counted_slice_source
+    other_view = PlanarSliceSource(slice_source.datasource)
+    cache = LayerTileCache(2**20)
+    rect = QRect(0, 0, 8, 6)
+
+    img = cache.request(_grayscale_source(slice_source), rect, ((0, 1),)).wait()
+    shared = cache.request(_grayscale_source(other_view), rect, ((0, 1),))
+
+    assert isinstance(shared, CachedTileRequest)
+    assert shared.wait() == img
+    assert datasource_request.call_count == 1
+
+    assert not isinstance(cache.request(_grayscale_source(other_view), rect, ((0, 0),)), CachedTileRequest)
+    assert not isinstance(cache.request(_grayscale_source(other_view, (0, 127)), rect, ((0, 1),)), CachedTileRequest)
+
+
+def test_data_change_invalidates_shared_tiles(counted_slice_source):
+    from volumina.pixelpipeline.tilecache import CachedTileRequest, LayerTileCache
+
+    slice_source, datasource_request = counted_slice_source
+    source = _grayscale_source(slice_source)
+    cache = LayerTileCache(2**20)
+    rect = QRect(0, 0, 8, 6)
+
+    cache.request(source, rect).wait()
+    outdated = cache.request(_grayscale_source(slice_source), QRect(0, 0, 4, 4))
+    slice_source.datasource.setDirty(np.s_[:, 0:2, 0:2, :, :])
+    outdated.wait()
+
+    assert not isinstance(cache.request(source, rect), CachedTileRequest)
+    assert not isinstance(cache.request(source, QRect(0, 0, 4, 4)), CachedTileRequest)
+
+
+def _reference_rgba(r, g, b, a):
+    from qimage2ndarray import array2qimage
+
+    img = array2qimage(np.dstack(np.broadcast_arrays(r, g, b, a)).astype(np.uint8))
+    return argb32_view(img.convertToFormat(QImage.Format_ARGB32_Premultiplied))
+
+
+@pytest.mark.parametrize("constant_alpha", [False, True])
+def test_rgba_matches_qt_premultiplication(constant_alpha):
+    rng = np.random.default_rng(42)
+    r, g, b, a = rng.integers(0, 256, size=(4, 7, 5), dtype=np.uint8)
+    if constant_alpha:
+        a = np.asarray(100, dtype=np.uint8)
+    channels = [r, g, b, a]
+    requests = [c if c.ndim == 0 else ArrayRequest(c, np.s_[:, :]) for c in channels]
+
+    img = imsrc.rgba.RGBAImageRequest(*requests, [7, 5], luts=LookupTables()).wait()
+
+    assert img.format() == QImage.Format_ARGB32_Premultiplied
+    np.testing.assert_array_equal(argb32_view(img), _reference_rgba(*channels))
+
+
+def test_rgba_normalizes_channels():
+    red = np.array([[0, 1000], [2000, 4000]], dtype=np.uint16)
+    constant = np.asarray(255, dtype=np.uint8)
+    req = imsrc.rgba.RGBAImageRequest(
+        ArrayRequest(red, np.s_[:, :]), constant, constant, constant, [2, 2], (0, 2000), None, None, None
+    )
+
+    expected = _reference_rgba(np.array([[0, 127], [255, 255]]), 255, 255, 255)
+    np.testing.assert_array_equal(argb32_view(req.wait()), expected)
+
+
+def test_rgba_constant_channels_are_not_requested():
+    from volumina.pixelpipeline.datasources.constantsource import ConstantSource
+    from volumina.pixelpipeline.slicesources import PlanarSliceSource
+
+    constant = PlanarSliceSource(ConstantSource(7))
+    layer = mock.MagicMock()
+    layer._normalize = [None] * 4
+    source = imsrc.RGBAImageSource(constant, constant, constant, constant, layer)
+
+    with mock.patch.object(constant.datasource, "request") as request:
+        img = source.request(QRect(0, 0, 3, 2)).wait()
+
+    request.assert_not_called()
+    np.testing.assert_array_equal(argb32_view(img), _reference_rgba(np.full((3, 2), 7), 7, 7, 7))
+
+
+@pytest.fixture
+def composite_layer():
+    from volumina.layer import MultiChannelCompositeLayer
+    from volumina.pixelpipeline.datasources.arraysource import ArraySource
+    from volumina.pixelpipeline.slicesources import PlanarSliceSource
+
+    data = np.zeros((1, 4, 3, 1, 3), dtype=np.uint16)
+    data[0, :, :, 0, 0] = 1000
+    data[0, :, :, 0, 1] = 500
+    data[0, 0, 0, 0, 2] = 4000
+    datasource = ArraySource(data)
+    layer = MultiChannelCompositeLayer(datasource, normalize=(0, 1000))
+    with mock.patch.object(datasource, "request", wraps=datasource.request) as request:
+        yield layer, layer.createImageSource([PlanarSliceSource(datasource)]), request
+
+
+def test_multichannel_composite_blends_channels(composite_layer):
+    layer, source, _ = composite_layer
+    layer.setTintColor(1, QColor(0, 0, 255))
+
+    pixels = argb32_view(source.request(QRect(0, 0, 4, 3)).wait())
+
+    assert pixels.shape == (4, 3)
+    # red at full intensity plus blue at half intensity, the third (blue) channel saturates blue at (0, 0)
+    assert pixels[1, 1] == 0xFFFF007F
+    assert pixels[0, 0] == 0xFFFF00FF
+
+
+def test_multichannel_composite_settings_do_not_refetch(composite_layer):
+    layer, source, datasource_request = composite_layer
+    dirty = []
+    source.isDirty.connect(dirty.append)
+    rect = QRect(0, 0, 4, 3)
+    source.request(rect, ((0, 0),)).wait()
+
+    layer.setChannelVisible(0, False)
+    layer.setNormalize(1, (0, 500))
+    pixels = argb32_view(source.request(rect, ((0, 0),)).wait())
+
+    assert len(dirty) == 2
+    assert datasource_request.call_count == 1
+    assert pixels[1, 1] == 0xFF00FF00
+
+
+def test_additive_composite_masked_pixels_are_transparent():
+    stack = np.ma.masked_array(np.full((2, 2, 2), 255, dtype=np.uint8), mask=False)
+    stack.mask[0, 1, 1] = True
+    out = np.empty((2, 2), dtype=np.uint32)
+
+    additive_composite(stack, out, [(0, 255), (0, 255)], [(1, 0, 0), (0, 0, 1)])
+
+    np.testing.assert_array_equal(out, [[0xFFFF00FF, 0], [0xFFFF00FF, 0xFFFF00FF]])
+
+
+@pytest.mark.parametrize(
+    "pixels",
+    [
+        # grayscale
+        np.arange(48, dtype=np.uint32).reshape(6, 8) * 0x010101 | 0xFF000000,
+        # a few label colors
+        np.array([0x00000000, 0xFFFF0000, 0xFF00FF00], dtype=np.uint32)[np.arange(48).reshape(6, 8) % 3],
+        # many colors
+        np.arange(300, dtype=np.uint32).reshape(15, 20) * 0x10203 | 0xFF000000,
+    ],
+)
+def test_compressed_tiles_are_restored_exactly(pixels):
+    from qimage2ndarray import raw_view
+    from volumina.pixelpipeline.tilecache import CompressedTile
+
+    img = QImage(pixels.shape[1], pixels.shape[0], QImage.Format_ARGB32_Premultiplied)
+    raw_view(img)[:] = pixels
+    tile = CompressedTile.compress(img)
+    restored = tile.decompress()
+
+    assert restored.format() == img.format()
+    np.testing.assert_array_equal(raw_view(restored), pixels)
+    assert tile.nbytes < tile.rawBytes
+
+
+def test_evicted_tiles_are_kept_compressed(counted_slice_source):
+    from volumina.pixelpipeline.tilecache import CachedTileRequest, CompressedTileRequest, LayerTileCache
+
+    slice_source, datasource_request = counted_slice_source
+    source = _grayscale_source(slice_source)
+    rect = QRect(0, 0, 8, 6)
+    tile_bytes = 8 * 6 * 4
+    cache = LayerTileCache(tile_bytes, coldbytes=2**20)
+
+    img = cache.request(source, rect, ((0, 1),)).wait()
+    cache.request(source, rect, ((0, 0),)).wait()
+    cold = cache.request(source, rect, ((0, 1),))
+
+    assert isinstance(cold, CompressedTileRequest)
+    assert cold.wait() == img
+    assert isinstance(cache.request(source, rect, ((0, 1),)), CachedTileRequest)
+    assert datasource_request.call_count == 2
+
+    stats = cache.stats()
+    assert (stats.tiles, stats.cold_tiles) == (1, 1)
+    assert (stats.hits, stats.cold_hits, stats.misses) == (1, 1, 2)
+    assert stats.compression_ratio > 1
+    assert stats.cold_hit_latency > 0
+
+    slice_source.datasource.setDirty(np.s_[:, 0:2, 0:2, :, :])
+    assert not isinstance(cache.request(source, rect, ((0, 0),)), (CachedTileRequest, CompressedTileRequest))
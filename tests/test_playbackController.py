@@ -0,0 +1,116 @@
+import pytest
+
+from volumina.playbackController import PlaybackController
+from volumina.positionModel import PositionModel
+
+
+class FakeScene:
+    """Stands in for an ImageScene2D: frames in 'ready' are completely fetched"""
+
+    def __init__(self, layer_seconds=(0.01, 0.05, 0.02)):
+        self.stackedImageSources = [None] * len(layer_seconds)
+        self.layer_seconds = layer_seconds
+        self.ready = set()
+        self.streamed = ([], None)
+
+    def prefetchFrames(self, times, layer_indexes=None):
+        self.streamed = (list(times), layer_indexes)
+
+    def frameProgress(self, t, layer_indexes=None):
+        return 1.0 if t in self.ready else 0.0
+
+    def frameFetchSeconds(self, layer_indexes=None):
+        return sum(self.layer_seconds[i] for i in layer_indexes)
+
+
+@pytest.fixture
+def posModel():
+    posModel = PositionModel()
+    posModel.shape5D = [5, 10, 10, 10, 1]
+    return posModel
+
+
+@pytest.fixture
+def scene():
+    return FakeScene()
+
+
+@pytest.fixture
+def player(qapp, posModel, scene):
+    player = PlaybackController(posModel, [scene], fps=25, lookahead=3)
+    yield player
+    player.stop()
+
+
+def test_play_streams_upcoming_frames(player, posModel, scene):
+    posModel.time = 3
+    player.play()
+    assert player.isPlaying()
+    assert scene.streamed == ([4, 0, 1], None)
+
+    player.stop()
+    assert not player.isPlaying()
+    assert scene.streamed == ([], None)
+
+
+def test_ready_frame_is_shown(player, posModel, scene):
+    player.play()
+    scene.ready = {1, 2}
+    player._onTick()
+    assert posModel.time == 1
+    assert scene.streamed == ([2, 3, 4], None)
+    player._onTick()
+    assert posModel.time == 2
+    assert player.droppedFrames == 0
+    assert player.achievedFps > 0
+
+
+def test_late_frame_is_dropped_and_current_frame_held(player, posModel, scene):
+    player.play()
+    player._onTick()
+    assert posModel.time == 0
+    assert player.droppedFrames == 1
+
+    scene.ready = {1}
+    player._onTick()
+    assert posModel.time == 1
+    assert player.droppedFrames == 1
+
+
+def test_playback_without_loop_stops_at_last_frame(player, posModel, scene):
+    player.loop = False
+    posModel.time = 3
+    player.play()
+    assert scene.streamed == ([4], None)
+
+    scene.ready = {4}
+    player._onTick()
+    assert posModel.time == 4
+    player._onTick()
+    assert not player.isPlaying()
+
+
+def test_dropped_frames_leave_out_expensive_layers(player, posModel, scene):
+    player.play()
+    for _ in range(player.LOD_WINDOW):
+        player._onTick()
+    assert player.levelOfDetail == 1
+    # the layer that takes longest to fetch is left out
+    assert scene.streamed == ([1, 2, 3], [0, 2])
+
+    for _ in range(player.LOD_WINDOW):
+        player._onTick()
+    assert player.levelOfDetail == 2
+    assert scene.streamed == ([1, 2, 3], [0])
+
+    # at least one layer is kept
+    for _ in range(player.LOD_WINDOW):
+        player._onTick()
+    assert player.levelOfDetail == 2
+
+    # full detail again once playback keeps up
+    scene.ready = set(range(5))
+    for _ in range(2 * player.LOD_WINDOW):
+        player._onTick()
+    assert player.levelOfDetail == 0
+    assert scene.streamed[1] is None
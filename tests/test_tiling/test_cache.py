@@ -65,6 +65,17 @@ class TestMultiCache:
 
         assert ["mytestid1", "mytestid2"] == keys
 
+    def test_pinned_items_are_not_evicted(self, cache, policy):
+        policy.set_pinned(["pinned"])
+        cache.add("pinned")
+        for i in range(4):
+            cache.add(i)
+
+        assert ["pinned", 1, 2, 3] == list(cache)
+
+        policy.set_pinned([])
+        assert [1, 2, 3] == list(cache)
+
 
 class TestCachePolicy:
     @pytest.fixture
@@ -0,0 +1,71 @@
+import pytest
+
+from volumina.tiling.prefetch import ScrollPredictor
+
+
+def scroll(predictor, axis, positions, interval, start=0.0):
+    for i, position in enumerate(positions):
+        predictor.observe(axis, position, start + i * interval)
+
+
+def test_steady_scrolling_velocity():
+    predictor = ScrollPredictor()
+    scroll(predictor, 1, range(10, 30), 0.05)
+    assert predictor.motion(1).velocity == pytest.approx(20.0, rel=0.01)
+    assert predictor.displacement(1, 0.5) == pytest.approx(10.0, rel=0.05)
+
+
+def test_first_step_gives_direction_only():
+    predictor = ScrollPredictor()
+    predictor.observe(1, 10, 0.0)
+    assert predictor.displacement(1, 1.0) == 0.0
+
+    predictor.observe(1, 9, 5.0)
+    assert predictor.displacement(1, 1.0) < 0
+    assert predictor.offsets(1, 1.0, 4) == [-1, -2]
+
+
+def test_reversal_drops_old_direction():
+    predictor = ScrollPredictor()
+    scroll(predictor, 1, range(10, 20), 0.05)
+    predictor.observe(1, 18, 0.55)
+    assert predictor.motion(1).velocity < 0
+    assert all(offset < 0 for offset in predictor.offsets(1, 1.0, 8))
+
+
+def test_jump_resets_motion():
+    predictor = ScrollPredictor()
+    scroll(predictor, 1, range(10, 20), 0.05)
+    predictor.observe(1, 200, 0.55)
+    assert predictor.offsets(1, 1.0, 8) == []
+
+
+def test_deceleration_stops_prediction():
+    predictor = ScrollPredictor()
+    scroll(predictor, 1, [0, 4, 7, 9, 10], 0.1)
+    motion = predictor.motion(1)
+    assert motion.velocity > 0 > motion.acceleration
+    stop = -motion.velocity / motion.acceleration
+    assert predictor.displacement(1, 100.0) == pytest.approx(predictor.displacement(1, stop))
+
+
+def test_offsets_spread_over_predicted_distance():
+    predictor = ScrollPredictor()
+    scroll(predictor, 1, range(0, 100, 2), 0.02)
+    offsets = predictor.offsets(1, 1.0, 5)
+    assert len(offsets) == 5
+    assert offsets == sorted(offsets)
+    assert offsets[-1] == pytest.approx(100, rel=0.05)
+
+
+def test_upcoming_within_bounds_nearest_first():
+    predictor = ScrollPredictor()
+    scroll(predictor, 0, range(0, 5), 0.1)
+    scroll(predictor, 1, range(50, 40, -1), 0.05)
+    upcoming = predictor.upcoming((4, 41), (6, 100), 1.0, 4)
+    assert upcoming[:2] == [(5, 41), (4, 35)]
+    assert all(0 <= t < 6 and 0 <= z < 100 for t, z in upcoming)
+    assert all(t == 4 or z == 41 for t, z in upcoming)
+
+    # the predicted distance is clipped to the remaining slices
+    assert predictor.upcoming((4, 3), (6, 100), 1.0, 4) == [(5, 3), (4, 2), (4, 1), (4, 0)]
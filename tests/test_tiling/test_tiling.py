@@ -20,23 +20,28 @@
 # 		   http://ilastik.org/license/
 ###############################################################################
 # time to wait (in seconds) for rendering to finish
+import gc
+
 import pytest
 
 import unittest as ut
+from unittest import mock
 
 import numpy as np
 
-from qtpy.QtCore import QRectF, QPoint, QRect
-from qtpy.QtGui import QTransform
+from qtpy.QtCore import QCoreApplication, QRectF, QPoint, QPointF, QRect
+from qtpy.QtGui import QImage, QTransform
 from qimage2ndarray import byte_view
 
 from volumina.tiling import TileProvider, Tiling
+from volumina.tiling.tileprovider import FRAME_DEADLINE, RENDER_WORKERS, RING_PREFETCH, WARMUP_PREFETCH, LayerLatency
 from volumina.layerstack import LayerStackModel
 from volumina.layer import GrayscaleLayer
 from volumina.pixelpipeline.datasources import ConstantSource, ArraySource
 from volumina.pixelpipeline.slicesources import PlanarSliceSource
 from volumina.pixelpipeline.imagesources import GrayscaleImageSource
 from volumina.pixelpipeline.imagepump import StackedImageSources, ImagePump
+from volumina.pixelpipeline.tilecache import LAYER_TILE_CACHE
 from volumina.slicingtools import SliceProjection
 
 
@@ -162,6 +167,169 @@ class TileProviderTest(ut.TestCase):
             self.assertTrue(np.all(aimg[:, :, 0:3] == self.GRAY2))
             self.assertTrue(np.all(aimg[:, :, 3] == 255))
 
+    def testTileDistanceFromViewCenter(self):
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.sims)
+        assert tp.tileDistance(0) == 0
+
+        list(tp.getTiles(QRectF(0, 0, 300, 300), QRectF(0, 0, 300, 300)))
+        center_tile = tiling.intersected(QRectF(150, 150, 1, 1))[0]
+        corner_tile = tiling.intersected(QRectF(850, 350, 1, 1))[0]
+        assert tp.tileDistance(center_tile) == 0
+        assert tp.tileDistance(corner_tile) == 7
+        tp.waitForTiles()
+
+    def testPriorityOrder(self):
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.sims)
+        list(tp.getTiles(QRectF(0, 0, 300, 300), QRectF(0, 0, 300, 300)))
+        center_tile = tiling.intersected(QRectF(150, 150, 1, 1))[0]
+        far_tile = tiling.intersected(QRectF(850, 350, 1, 1))[0]
+
+        # expensive layer
+        tp._latency.record(self.ims3, 10 * FRAME_DEADLINE)
+
+        center_cheap = tp._priority(False, self.ims2, center_tile, 1)
+        far_cheap = tp._priority(False, self.ims2, far_tile, 2)
+        center_expensive = tp._priority(False, self.ims3, center_tile, 3)
+        prefetch = tp._priority(True, self.ims2, center_tile, 4)
+        assert sorted([prefetch, center_expensive, far_cheap, center_cheap]) == [
+            center_cheap,
+            far_cheap,
+            center_expensive,
+            prefetch,
+        ]
+
+        # panning re-evaluates the distance of queued tasks
+        list(tp.getTiles(QRectF(600, 100, 300, 300), QRectF(600, 100, 300, 300)))
+        assert tp._updatePriority(far_cheap, far_tile) < tp._updatePriority(center_cheap, center_tile)
+        tp.waitForTiles()
+
+    def testPrefetchAheadRequestsNewPredictionsOnly(self):
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.sims)
+        requested = []
+        tp.prefetch = lambda rectF, through, layer_indexes=None: requested.append(tuple(through))
+        tp._current_stack_id = (None, ((0, 0), (1, 0)))
+        rect = QRectF(0, 0, 300, 300)
+
+        tp.prefetchAhead(rect, [(0, 1), (0, 2)])
+        assert requested == [(0, 1), (0, 2)]
+        assert {through for _sources, through in tp._prefetch_stacks} == {((0, 0), (1, 1)), ((0, 0), (1, 2))}
+
+        # slices still predicted keep their tasks, the current slice is never prefetched
+        tp.prefetchAhead(rect, [(0, 2), (0, 3), (0, 0)])
+        assert requested == [(0, 1), (0, 2), (0, 3)]
+        assert {through for _sources, through in tp._prefetch_stacks} == {((0, 0), (1, 2)), ((0, 0), (1, 3))}
+
+        tp.prefetchAhead(rect, [])
+        assert tp._prefetch_stacks == frozenset()
+
+    def testPrefetchRingAroundViewport(self):
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.sims)
+        requested = []
+        tp._refreshTile = lambda stack_id, tile_no, prefetch=False, layer_indexes=None: requested.append(
+            (tile_no, prefetch)
+        )
+        viewport = QRectF(300, 100, 200, 200)
+        visible = set(tiling.intersected(viewport))
+
+        tp.prefetchRing(viewport)
+        ring = set(tiling.intersected(QRectF(200, 0, 400, 400))) - visible
+        assert {tile_no for tile_no, _prefetch in requested} == ring
+        assert all(prefetch == RING_PREFETCH for _tile_no, prefetch in requested)
+
+        # panning to the right widens the ring on the right, known tiles are not requested again
+        requested.clear()
+        tp.prefetchRing(viewport, QPointF(5, 0))
+        assert {tile_no for tile_no, _prefetch in requested} == set(tiling.intersected(QRectF(600, 0, 100, 400)))
+        assert tp._ring_tiles == frozenset(tiling.intersected(QRectF(200, 0, 500, 400))) - visible
+
+        tp.prefetchRing(QRectF())
+        assert tp._ring_tiles == frozenset()
+
+    def testRingPrefetchAfterSlicePrefetch(self):
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.sims)
+        center_tile = tiling.intersected(QRectF(150, 150, 1, 1))[0]
+        assert tp._priority(True, self.ims2, center_tile, 1) < tp._priority(RING_PREFETCH, self.ims3, center_tile, 2)
+
+    def testWarmUpAfterAllOtherTasks(self):
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.sims)
+        requested = []
+        tp.prefetch = lambda rectF, through, layer_indexes=None, level=True: requested.append((tuple(through), level))
+        rect = QRectF(0, 0, 300, 300)
+
+        tp.warmUp(rect, [(0, 1), (0, 2)])
+        assert requested == [((0, 1), WARMUP_PREFETCH), ((0, 2), WARMUP_PREFETCH)]
+        tp.warmUp(rect, [(0, 2), (0, 3)])
+        assert requested[2:] == [((0, 3), WARMUP_PREFETCH)]
+        tp.warmUp(rect, [])
+        assert tp._warmup_stacks == frozenset()
+
+        center_tile = tiling.intersected(QRectF(150, 150, 1, 1))[0]
+        ring = tp._priority(RING_PREFETCH, self.ims3, center_tile, 1)
+        assert ring < tp._priority(WARMUP_PREFETCH, self.ims2, center_tile, 2)
+
+    def testSliceBytes(self):
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.sims)
+        # layer3 is opaque, the layers below are not fetched
+        assert tp.sliceBytes(QRectF(0, 0, 200, 200)) == 4 * 200 * 200
+        self.layer3.opacity = 0.5
+        assert tp.sliceBytes(QRectF(0, 0, 200, 200)) == 2 * 4 * 200 * 200
+
+    def testSliceFetchSeconds(self):
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.sims)
+        rect = QRectF(0, 0, 200, 200)
+        assert tp.sliceFetchSeconds(rect) is None
+
+        tp._latency.record(self.ims2, 0.01)
+        tp._latency.record(self.ims3, 0.02)
+        # layer3 is opaque, the layers below are not fetched
+        assert tp.sliceFetchSeconds(rect) == pytest.approx(4 * 0.02 / RENDER_WORKERS)
+
+        self.layer3.opacity = 0.5
+        assert tp.sliceFetchSeconds(rect) == pytest.approx(4 * 0.03 / RENDER_WORKERS)
+
+    def testStackProgress(self):
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.sims)
+        rect = QRectF(0, 0, 200, 200)
+        stack_id = (tp._current_stack_id[0], ((0, 1), (1, 0)))
+        assert tp.stackProgress(rect, (1, 0)) == 0.0
+
+        with tp._cache:
+            tp._cache.addStack(stack_id)
+            for tile_no in tiling.intersected(rect)[:2]:
+                tp._cache.updateTileIfNecessary(stack_id, self.ims3, tile_no, 1, QImage())
+        # layer3 is opaque, the layers below are not fetched
+        assert tp.stackProgress(rect, (1, 0)) == 0.5
+
+        self.layer3.opacity = 0.5
+        assert tp.stackProgress(rect, (1, 0)) == 0.25
+        assert tp.stackProgress(rect, (1, 0), layer_indexes=[0]) == 0.5
+        assert tp.stackProgress(rect, (1, 0), layer_indexes=[1]) == 0.0
+
+
+def test_layer_latency_cost_class():
+    latency = LayerLatency(deadline=0.1)
+    assert latency.estimate("ims") is None
+    assert latency.cost_class("ims") == 0
+
+    latency.record("ims", 0.05)
+    assert latency.cost_class("ims") == 0
+
+    latency.record("slow", 0.45)
+    assert latency.cost_class("slow") == 3
+
+    # estimates are smoothed
+    latency.record("slow", 0.0)
+    assert 0.0 < latency.estimate("slow") < 0.45
+
 
 @pytest.mark.usefixtures("qapp", "patch_threadpool")
 class DirtyPropagationTest(ut.TestCase):
@@ -181,6 +349,13 @@ class DirtyPropagationTest(ut.TestCase):
         self.lsm = LayerStackModel()
         self.pump = ImagePump(self.lsm, SliceProjection(), sync_along=(0, 1, 2))
 
+    def tearDown(self):
+        # The layers start timers from the render threads (see MinMaxSource). Collect them
+        # here, in the main thread, instead of in whatever thread next triggers the garbage collector.
+        QCoreApplication.processEvents()
+        del self.ds1, self.ds2, self.layer1, self.layer2, self.lsm, self.pump
+        gc.collect()
+
     def testEverythingDirtyPropagation(self):
         self.lsm.append(self.layer2)
         tiling = Tiling((900, 400), blockSize=100)
@@ -204,6 +379,97 @@ class DirtyPropagationTest(ut.TestCase):
             self.assertTrue(np.all(aimg[:, :, 0:3] == NEW_CONSTANT))
             self.assertTrue(np.all(aimg[:, :, 3] == 255))
 
+    def testScrolledPastSlicesShowNearestCachedSlice(self):
+        self.lsm.append(self.layer1)
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.pump.stackedImageSources, cache_size=3)
+        rect = QRectF(100, 100, 200, 200)
+
+        for z in (1, 4):
+            self.pump.syncedSliceSources.through = [0, z, 0]
+            tp.waitForTiles(rect)
+
+        # slices passed without fetching are not cached, and don't evict cached ones
+        for z in range(5, 9):
+            self.pump.syncedSliceSources.through = [0, z, 0]
+            tiles = list(tp.getTiles(rect, rect, fetch=False))
+        with tp._cache:
+            assert [through[1] for _sources, through in tp._cache.stacks()] == [(1, 0), (1, 1), (1, 4)]
+            assert tp._current_stack_id not in tp._cache
+        for tile in tiles:
+            assert tile.progress == 0.0
+            self.assertTrue(np.all(byte_view(tile.qimg)[:, :, 0:3] == 4))
+
+        tp.waitForTiles(rect)
+        for tile in tp.getTiles(rect, QRectF()):
+            self.assertTrue(np.all(byte_view(tile.qimg)[:, :, 0:3] == 8))
+
+    def testSecondViewReusesRenderedLayerTiles(self):
+        self.lsm.append(self.layer1)
+        other_pump = ImagePump(self.lsm, SliceProjection(), sync_along=(0, 1, 2))
+        for pump in (self.pump, other_pump):
+            pump.syncedSliceSources.through = [0, 3, 0]
+        tiling = Tiling((900, 400), blockSize=100)
+        rect = QRectF(100, 100, 200, 200)
+
+        with mock.patch.object(self.ds1, "request", wraps=self.ds1.request) as request:
+            TileProvider(tiling, self.pump.stackedImageSources).waitForTiles(rect)
+            fetched = request.call_count
+            tp = TileProvider(tiling, other_pump.stackedImageSources)
+            tp.waitForTiles(rect)
+
+        assert fetched > 0
+        assert request.call_count == fetched
+        for tile in tp.getTiles(rect, QRectF()):
+            self.assertTrue(np.all(byte_view(tile.qimg)[:, :, 0:3] == 3))
+
+    def testRotationReblendsFromCachedLayerTiles(self):
+        data = np.random.default_rng(0).integers(0, 255, (1, 250, 150, 1, 1), dtype=np.uint8)
+        ds = ArraySource(data)
+        self.lsm.append(GrayscaleLayer(ds, normalize=False))
+        tiling = Tiling((250, 150), blockSize=100)
+        tp = TileProvider(tiling, self.pump.stackedImageSources)
+        tp.waitForTiles()
+
+        # data (x, y) is shown at scene (150 - y, x)
+        rotated = QTransform().rotate(90) * QTransform.fromTranslate(150, 0)
+        with mock.patch.object(ds, "request", wraps=ds.request) as request:
+            tiling.data2scene = rotated
+            tp.onOrientationChanged()
+            tp.waitForTiles()
+        assert request.call_count == 0
+
+        (tile,) = [tile for tile in tp.getTiles(QRectF(), QRectF()) if tile.rectF.contains(QPointF(129.5, 10.5))]
+        pixel = tile.qimg.pixel(129 - int(tile.rectF.left()), 10 - int(tile.rectF.top()))
+        assert pixel & 0xFF == data[0, 10, 20, 0, 0]
+
+        LAYER_TILE_CACHE.clear()
+        reference = TileProvider(Tiling((250, 150), rotated, blockSize=100), self.pump.stackedImageSources)
+        reference.waitForTiles()
+        for tile, expected in zip(tp.getTiles(QRectF(), QRectF()), reference.getTiles(QRectF(), QRectF())):
+            assert tile.qimg == expected.qimg
+
+    def testRemovingLayerKeepsTilesOfOtherLayers(self):
+        self.lsm.append(self.layer1)
+        self.lsm.append(self.layer2)
+        self.layer2.opacity = 0.5  # layer1 is not occluded
+        tiling = Tiling((900, 400), blockSize=100)
+        tp = TileProvider(tiling, self.pump.stackedImageSources)
+        rect = QRectF(100, 100, 200, 200)
+        tp.waitForTiles(rect)
+
+        with mock.patch.object(self.ds1, "request", wraps=self.ds1.request) as request:
+            self.lsm.selectRow(self.lsm.layerIndex(self.layer2))
+            self.lsm.deleteSelected()
+            tp.waitForTiles(rect)
+        assert request.call_count == 0
+        with tp._cache:
+            assert {ims for ims, _tile_no in tp._cache._layerCache[tp._current_stack_id]} == set(
+                self.pump.stackedImageSources.viewImageSources()
+            )
+        for tile in tp.getTiles(rect, QRectF()):
+            self.assertTrue(np.all(byte_view(tile.qimg)[:, :, 0:3] == 0))
+
     def testOutOfViewDirtyPropagation(self):
         self.lsm.append(self.layer1)
         tiling = Tiling((900, 400), blockSize=100)
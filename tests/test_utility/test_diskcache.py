@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from volumina.utility.diskcache import DiskCache
+
+
+class TestDiskCache:
+    @pytest.fixture
+    def cache(self, tmp_path):
+        return DiskCache(str(tmp_path), 64 * 1024)
+
+    def files(self, cache):
+        return sorted(f for f in os.listdir(cache._directory) if f.endswith(DiskCache.SUFFIX))
+
+    def test_roundtrip(self, cache):
+        arr = np.arange(100, dtype=np.uint16).reshape(10, 10)
+        cache.put("source", "0:10::0:10", arr)
+        res = cache.get("source", "0:10::0:10")
+        assert res.dtype == np.uint16
+        assert_array_equal(arr, res)
+        assert cache.get("source", "0:5::0:10") is None
+        assert cache.get("other", "0:10::0:10") is None
+
+    def test_entries_survive_the_session(self, cache):
+        arr = np.ones((3, 4), dtype=np.float32)
+        cache.put("source", "key", arr)
+        reopened = DiskCache(cache._directory, cache.maxsize)
+        assert reopened.currsize == cache.currsize
+        assert_array_equal(arr, reopened.get("source", "key"))
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        rng = np.random.default_rng(0)
+        # random data doesn't compress, so every entry takes ~4kB on disk
+        cache = DiskCache(str(tmp_path), 10 * 1024)
+        for key in "abc":
+            cache.put("source", key, rng.integers(0, 255, 4000, dtype=np.uint8))
+            cache.get("source", "a")
+        assert cache.currsize <= cache.maxsize
+        assert cache.get("source", "a") is not None
+        assert cache.get("source", "b") is None
+        assert cache.get("source", "c") is not None
+        assert len(self.files(cache)) == 2
+
+    def test_discard_removes_entries_of_fingerprint(self, cache):
+        cache.put("source", "a", np.zeros(3))
+        cache.put("source", "b", np.zeros(3))
+        cache.put("other", "a", np.zeros(3))
+        cache.discard("source")
+        assert cache.get("source", "a") is None
+        assert cache.get("other", "a") is not None
+        cache.flush()
+        assert len(self.files(cache)) == 1
+
+    def test_discard_removes_pending_entries(self, cache):
+        cache.put_async("source", "a", np.zeros(3))
+        cache.discard("source")
+        cache.put_async("source", "b", np.ones(3))
+        cache.flush()
+        assert cache.get("source", "a") is None
+        assert_array_equal(np.ones(3), cache.get("source", "b"))
+        assert len(self.files(cache)) == 1
+
+    def test_corrupt_entries_are_dropped(self, cache):
+        cache.put("source", "a", np.arange(1000))
+        [name] = self.files(cache)
+        path = os.path.join(cache._directory, name)
+        with open(path, "r+b") as f:
+            f.seek(100)
+            f.write(b"garbage")
+        assert cache.get("source", "a") is None
+        assert not os.path.exists(path)
+        assert cache.currsize == 0
+
+    def test_object_arrays_are_not_stored(self, cache):
+        cache.put("source", "a", np.array([None, "x"], dtype=object))
+        assert len(cache) == 0
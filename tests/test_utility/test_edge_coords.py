@@ -0,0 +1,28 @@
+import numpy as np
+
+from volumina.utility.edge_coords import edge_coords_along_axis, group_by_edge_ids
+
+
+def test_group_by_edge_ids_keeps_row_order_within_edges():
+    edge_ids = np.array([[1, 2], [0, 3], [1, 2], [0, 1], [0, 3]], dtype=np.uint32)
+    values = np.arange(5)
+
+    grouped = group_by_edge_ids(edge_ids, values)
+
+    assert list(grouped) == [(0, 1), (0, 3), (1, 2)]
+    np.testing.assert_array_equal(grouped[(0, 3)], [1, 4])
+    np.testing.assert_array_equal(grouped[(1, 2)], [0, 2])
+    assert all(group.flags.c_contiguous for group in grouped.values())
+
+
+def test_edge_coords_along_axis():
+    labels = np.array([[0, 0, 1], [2, 2, 1], [2, 2, 1]], dtype=np.uint32)
+
+    vertical = edge_coords_along_axis(labels, 0)
+    horizontal = edge_coords_along_axis(labels, 1)
+
+    assert set(vertical) == {(0, 2)}
+    np.testing.assert_array_equal(vertical[(0, 2)], [[0, 0], [0, 1]])
+    assert set(horizontal) == {(0, 1), (1, 2)}
+    np.testing.assert_array_equal(horizontal[(1, 2)], [[1, 1], [2, 1]])
+    assert edge_coords_along_axis(labels[:1], 0) == {}
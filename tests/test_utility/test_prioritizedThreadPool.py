@@ -0,0 +1,49 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+from volumina.utility.prioritizedThreadPool import PrioritizedThreadPoolExecutor
+
+
+@pytest.fixture
+def blocked_executor():
+    """Single worker executor, blocked until the returned event is set"""
+    executor = PrioritizedThreadPoolExecutor(1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait()
+
+    executor.submit(block, priority=(0,))
+    started.wait(1)
+    yield executor, release
+    release.set()
+    executor.shutdown()
+
+
+def test_tasks_run_in_priority_order(blocked_executor):
+    executor, release = blocked_executor
+    order = []
+    futures = [executor.submit(lambda prio=prio: order.append(prio), priority=(prio,)) for prio in (3, 1, 2)]
+
+    release.set()
+    concurrent.futures.wait(futures)
+    assert order == [1, 2, 3]
+
+
+def test_reprioritize(blocked_executor):
+    executor, release = blocked_executor
+    order = []
+    futures = [
+        executor.submit(lambda prio=prio: order.append(prio), priority=(prio,), context=prio) for prio in (1, 2, 3)
+    ]
+
+    # reverse the order of the queued tasks
+    executor.reprioritize(lambda priority, context: (-context,))
+
+    release.set()
+    concurrent.futures.wait(futures)
+    assert order == [3, 2, 1]
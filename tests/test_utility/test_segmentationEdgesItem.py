@@ -0,0 +1,229 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pytest
+from qtpy.QtCore import QPointF, Qt
+from qtpy.QtGui import QColor, QImage, QPainter, QPen
+
+import volumina.utility.segmentationEdgesItem as edges_module
+from volumina.layer import LabelableSegmentationEdgesLayer, SegmentationEdgesLayer
+from volumina.pixelpipeline.datasources.arraysource import ArrayRequest
+from volumina.pixelpipeline.imagesources.segmentationedges import SegmentationEdgesItemRequest
+from volumina.pixelpipeline.interface import DataSourceABC
+from volumina.utility import SignalingDict, execute_in_main_thread_batched
+from volumina.utility.segmentationEdgesItem import (
+    SegmentationEdgesItem,
+    TileEdges,
+    line_segments_for_labels_PURE_PYTHON,
+    pack_id_pairs,
+)
+
+
+@pytest.fixture
+def labels():
+    labels = np.zeros((6, 4), dtype=np.uint32)
+    labels[3:, :] = 1
+    labels[3:, 2:] = 2
+    return labels
+
+
+def test_line_segments_for_labels(labels):
+    segments = line_segments_for_labels_PURE_PYTHON(labels)
+
+    assert set(segments) == {(0, 1), (0, 2), (1, 2)}
+    np.testing.assert_array_equal(np.unique(segments[(0, 1)][:, :, 0]), [3])
+    np.testing.assert_array_equal(segments[(1, 2)][:, :, 1].min(axis=1), [2, 2, 2])
+
+
+def test_tile_edges_hit_testing(labels):
+    edges = TileEdges.from_labels(labels)
+
+    def id_pair_at(x, y, tolerance=0.5):
+        edge = edges.edge_at(x, y, tolerance)
+        return None if edge is None else edges.id_pairs[edge]
+
+    assert id_pair_at(3.2, 1.0) == (0, 1)
+    assert id_pair_at(4.5, 2.1) == (1, 2)
+    assert id_pair_at(3.1, 3.5) == (0, 2)
+    assert id_pair_at(1.0, 1.0) is None
+    assert id_pair_at(1.0, 1.0, tolerance=2.5) == (0, 1)
+    assert [edges.id_pairs[e] for e in edges.edges_along((2.0, 1.0), (5.0, 3.0), 0.5)] == [(0, 1), (1, 2)]
+
+
+def test_tile_edges_without_edges():
+    edges = TileEdges.from_labels(np.ones((4, 4), dtype=np.uint32))
+
+    assert len(edges) == 0
+    assert edges.bounds() is None
+    assert edges.edge_at(1, 1, 10) is None
+
+
+@pytest.fixture
+def edges_item(qapp, labels):
+    pen_table = SignalingDict(None)
+    default_pen = QPen(QColor(255, 0, 0))
+    return SegmentationEdgesItem(TileEdges.from_labels(labels), pen_table, default_pen, isClickable=True)
+
+
+def _paint(item):
+    img = QImage(8, 8, QImage.Format_ARGB32_Premultiplied)
+    img.fill(0)
+    painter = QPainter(img)
+    item.paint(painter, None)
+    painter.end()
+    return img
+
+
+def test_edges_item_paints_with_pen_table(edges_item):
+    edges_item.edge_pen_table[(1, 2)] = QPen(QColor(0, 0, 255))
+    img = _paint(edges_item)
+
+    assert img.pixelColor(3, 1) == QColor(255, 0, 0)
+    assert img.pixelColor(5, 2) == QColor(0, 0, 255)
+    assert len(edges_item._pen_groups) == 2
+
+
+def test_edges_item_ignores_unrelated_pen_updates(edges_item):
+    _paint(edges_item)
+    pen_groups = edges_item._pen_groups
+    edges_item.edge_pen_table[(7, 8)] = QPen(QColor(0, 255, 0))
+    assert edges_item._pen_groups is pen_groups
+
+    edges_item.edge_pen_table[(0, 1)] = QPen(QColor(0, 255, 0))
+    assert edges_item._pen_groups is None
+    assert _paint(edges_item).pixelColor(3, 1) == QColor(0, 255, 0)
+
+
+def test_edges_item_forgets_pens_no_longer_used(edges_item):
+    for color in range(10):
+        edges_item.edge_pen_table[(1, 2)] = QPen(QColor(0, 0, color))
+        _paint(edges_item)
+
+    assert len(edges_item._pens) == 2
+    assert _paint(edges_item).pixelColor(5, 2) == QColor(0, 0, 9)
+    assert _paint(edges_item).pixelColor(3, 1) == QColor(255, 0, 0)
+
+
+def test_pen_table_updates_reach_only_affected_items(qapp):
+    pen_table = SignalingDict(None)
+    default_pen = QPen(QColor(255, 0, 0))
+    segments = [[[0, 0], [1, 0]], [[0, 1], [1, 1]]]
+    items = [
+        SegmentationEdgesItem(TileEdges(id_pairs, segments, [0, 1]), pen_table, default_pen)
+        for id_pairs in ([(1, 2), (2, 3)], [(2, 3), (3, 4)], [(5, 6), (6, 7)])
+    ]
+    for item in items:
+        item.handle_updated_edges = mock.Mock()
+
+    wide_pen = QPen(QColor(0, 0, 255))
+    wide_pen.setWidth(5)
+    pen_table.update({(2, 3): wide_pen, (3, 4): wide_pen, (8, 9): wide_pen})
+
+    (edges0, width0), _ = items[0].handle_updated_edges.call_args
+    np.testing.assert_array_equal(edges0, [1])
+    (edges1, width1), _ = items[1].handle_updated_edges.call_args
+    np.testing.assert_array_equal(sorted(edges1), [0, 1])
+    assert width0 == width1 == 5
+    items[2].handle_updated_edges.assert_not_called()
+
+
+def test_pen_table_updates_distinguish_large_ids(qapp):
+    pen_table = SignalingDict(None)
+    segments = [[[0, 0], [1, 0]], [[0, 1], [1, 1]]]
+    item = SegmentationEdgesItem(TileEdges([(1, 2**32 + 2), (2**32 + 1, 2)], segments, [0, 1]), pen_table, QPen())
+    item.handle_updated_edges = mock.Mock()
+
+    pen_table.update({(1, 2): QPen(), (2**64 - 1, 2**63): QPen()})
+    item.handle_updated_edges.assert_not_called()
+
+    pen_table.update({(2**32 + 1, 2): QPen()})
+    (edges, _width), _ = item.handle_updated_edges.call_args
+    np.testing.assert_array_equal(edges, [1])
+
+
+def test_negative_edge_ids_are_rejected():
+    with pytest.raises(ValueError):
+        pack_id_pairs([(1, 2), (-1, 3)])
+
+
+def test_overwrite_edge_labels_updates_only_changed_pens(qapp):
+    pens = [QPen(QColor(c)) for c in ("white", "green", "red")]
+    layer = LabelableSegmentationEdgesLayer(
+        mock.Mock(spec=DataSourceABC, numberOfChannels=1), pens, initial_labels={(1, 2): 1, (2, 3): 2, (3, 4): 1}
+    )
+    updates = []
+    layer.pen_table.updated.connect(updates.append)
+
+    layer.overwrite_edge_labels({(1, 2): 1, (2, 3): 1, (4, 5): 0})
+
+    assert updates == [{(2, 3)}, {(3, 4)}]
+    assert dict(layer.pen_table.items()) == {(1, 2): pens[1], (2, 3): pens[1]}
+
+    updates.clear()
+    layer.update_edge_labels({(1, 2): 0, (2, 3): 1, (5, 6): 2})
+    assert updates == [{(5, 6)}, {(1, 2)}]
+    assert dict(layer.pen_table.items()) == {(2, 3): pens[1], (5, 6): pens[2]}
+
+
+def test_edges_item_click(edges_item):
+    clicked = []
+    edges_item.edgeClicked.connect(lambda id_pair, _event: clicked.append(id_pair))
+
+    for pos in [QPointF(3.2, 1.0), QPointF(1.0, 1.0)]:
+        event = mock.Mock(scenePos=mock.Mock(return_value=pos))
+        edges_item.mousePressEvent(event)
+
+    assert clicked == [(0, 1)]
+    event.ignore.assert_called_once_with()
+
+
+@pytest.mark.usefixtures("qapp")
+def test_batched_main_thread_calls_run_in_one_event(qtbot):
+    threads = []
+    with ThreadPoolExecutor(3) as pool:
+        futures = [
+            pool.submit(execute_in_main_thread_batched, lambda i=i: threads.append(threading.current_thread()) or i)
+            for i in range(3)
+        ]
+        qtbot.waitUntil(lambda: all(f.done() for f in futures))
+
+    assert [f.result() for f in futures] == [0, 1, 2]
+    assert threads == [threading.main_thread()] * 3
+
+
+@pytest.mark.usefixtures("qapp")
+def test_batched_main_thread_call_reraises(qtbot):
+    def fail():
+        raise ValueError("in main thread")
+
+    with ThreadPoolExecutor(1) as pool:
+        future = pool.submit(execute_in_main_thread_batched, fail)
+        qtbot.waitUntil(future.done)
+
+    with pytest.raises(ValueError):
+        future.result()
+
+
+@pytest.mark.usefixtures("qapp")
+def test_edges_are_found_in_the_worker_thread(qtbot, labels):
+    layer = SegmentationEdgesLayer(mock.Mock(spec=DataSourceABC, numberOfChannels=1))
+    request = SegmentationEdgesItemRequest(ArrayRequest(labels, np.s_[:, :]), layer, None, None)
+
+    worker_threads = []
+    line_segments = edges_module.line_segments_for_labels
+
+    def recording_line_segments(label_img, *args):
+        worker_threads.append(threading.current_thread())
+        return line_segments(label_img, *args)
+
+    with mock.patch.object(edges_module, "line_segments_for_labels", recording_line_segments):
+        with ThreadPoolExecutor(1) as pool:
+            future = pool.submit(request.wait)
+            qtbot.waitUntil(future.done)
+
+    item = future.result()
+    assert isinstance(item, SegmentationEdgesItem)
+    assert set(item.edges.id_pairs) == {(0, 1), (0, 2), (1, 2)}
+    assert worker_threads and threading.main_thread() not in worker_threads
@@ -0,0 +1,91 @@
+import pytest
+from qtpy.QtCore import QRectF
+
+from volumina.warmUpController import WarmUpController
+
+
+class FakeScene:
+    """Stands in for an ImageScene2D: slices in 'ready' are completely fetched"""
+
+    def __init__(self, n_slices=5, slice_bytes=100):
+        self.n_slices = n_slices
+        self.slice_bytes = slice_bytes
+        self.pinned = []
+        self.ready = set()
+        self.warming = []
+
+    def roiSlices(self, start, stop):
+        return QRectF(0, 0, 10, 10), [(0, s) for s in range(self.n_slices)]
+
+    def sliceBytes(self, rectF, layer_indexes=None):
+        return self.slice_bytes
+
+    def sliceProgress(self, rectF, through, layer_indexes=None):
+        return 1.0 if through in self.ready else 0.0
+
+    def warmUp(self, rectF, throughs, layer_indexes=None):
+        self.warming = list(throughs)
+
+    def pinSlices(self, throughs):
+        self.pinned = list(throughs)
+
+
+@pytest.fixture
+def scene():
+    return FakeScene()
+
+
+@pytest.fixture
+def warmUp(qapp, scene):
+    warmUp = WarmUpController([scene])
+    yield warmUp
+    warmUp.cancel()
+
+
+def test_warm_up_fetches_a_few_slices_at_a_time(warmUp, scene):
+    finished = []
+    warmUp.finished.connect(finished.append)
+    warmUp.start((0, 0, 0, 0), (1, 10, 10, 5))
+    assert warmUp.isRunning()
+    assert scene.warming == [(0, 0), (0, 1)]
+    assert scene.pinned == [(0, s) for s in range(5)]
+    assert warmUp.progress == 0.0
+    assert warmUp.eta is None
+
+    scene.ready = {(0, 0)}
+    warmUp._poll()
+    assert scene.warming == [(0, 1), (0, 2)]
+    assert warmUp.progress == pytest.approx(0.2)
+    assert warmUp.eta > 0
+
+    scene.ready = {(0, s) for s in range(5)}
+    warmUp._poll()
+    warmUp._poll()
+    assert warmUp.progress == 1.0
+    assert not warmUp.isRunning()
+    assert scene.warming == []
+    assert scene.pinned == [(0, s) for s in range(5)]
+    assert finished == [True]
+
+
+def test_slices_beyond_memory_budget_are_skipped(warmUp, scene):
+    warmUp.start((0, 0, 0, 0), (1, 10, 10, 5), memory_budget=3 * scene.slice_bytes)
+    assert warmUp.skippedSlices == 2
+    assert scene.pinned == [(0, 0), (0, 1), (0, 2)]
+
+    scene.ready = {(0, 0), (0, 1), (0, 2)}
+    warmUp._poll()
+    warmUp._poll()
+    assert not warmUp.isRunning()
+    assert (0, 3) not in scene.warming
+
+
+def test_cancel_stops_warm_up(warmUp, scene):
+    finished = []
+    warmUp.finished.connect(finished.append)
+    warmUp.start((0, 0, 0, 0), (1, 10, 10, 5))
+    warmUp.cancel()
+    assert not warmUp.isRunning()
+    assert scene.warming == []
+    assert scene.pinned == []
+    assert finished == [False]
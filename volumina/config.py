@@ -37,7 +37,10 @@ userConfig = os.path.expanduser("~/.voluminarc")
 if os.path.exists(userConfig):
     _cfg.read(userConfig)
 
+_64MB = 64 * 1024 * 1024
+_128MB = 128 * 1024 * 1024
 _256MB = 256 * 1024 * 1024
+_4GB = 4 * 1024 * 1024 * 1024
 
 
 class _Config:
@@ -61,6 +64,34 @@ class _Config:
     def cache_size(self):
         return self._cfg.getint("volumina", "cache_size", fallback=_256MB)
 
+    @cached_property
+    def layer_tile_cache_size(self):
+        """Bytes of rendered layer tiles shared by all views, see LayerTileCache"""
+        return self._cfg.getint("volumina", "layer_tile_cache_size", fallback=_128MB)
+
+    @cached_property
+    def raw_array_cache_size(self):
+        """Bytes of raw tiles kept by all image sources together, see RawArrayCache"""
+        return self._cfg.getint("volumina", "raw_array_cache_size", fallback=_64MB)
+
+    @cached_property
+    def cold_tile_cache_size(self):
+        """Bytes of compressed layer tiles kept after their eviction from memory, 0 (the default) disables it"""
+        return self._cfg.getint("volumina", "cold_tile_cache_size", fallback=0)
+
+    @cached_property
+    def disk_cache_dir(self):
+        """
+        Directory of the persistent data cache; not set disables it.
+
+        Only sources with a fingerprint are persisted, e.g. createDataSource(slot, fingerprint=...) for a lazyflow slot.
+        """
+        return self._cfg.get("volumina", "disk_cache_dir", fallback=None)
+
+    @cached_property
+    def disk_cache_size(self):
+        return self._cfg.getint("volumina", "disk_cache_size", fallback=_4GB)
+
     def _get_boolean(self, section: str, option: str) -> bool:
         val = self._env.get(f"{section.upper()}_{option.upper()}")
         if val is None:
@@ -39,12 +39,16 @@ from qtpy.QtGui import QTransform, QPen, QColor, QBrush, QPolygonF, QPainter, QP
 
 from volumina.positionModel import PositionModel
 from volumina.tiling import Tiling, TileProvider
+from volumina.tiling.prefetch import PREFETCH_HORIZON, ScrollPredictor
+from volumina.tiling.tileprovider import renderer_idle, set_active_viewport
 from volumina.layerstack import LayerStackModel
 from volumina.pixelpipeline.imagepump import StackedImageSources
 
 import datetime
 import threading
+import time
 from collections import defaultdict
+from typing import List, Optional, Sequence, Tuple
 
 
 # *******************************************************************************
@@ -128,6 +132,16 @@ class ImageScene2D(QGraphicsScene):
     axesChanged = Signal(int, bool)
     dirtyChanged = Signal()
 
+    # ms to wait after a viewport change, or between checks whether the renderer is idle,
+    # before prefetching the tiles around the viewport
+    RING_PREFETCH_DELAY = 100
+    # seconds during which a pan biases the ring prefetch in its direction
+    RECENT_PAN = 2.0
+    # Slice changes less than SLICE_SETTLE seconds apart are scrolling: the slices
+    # passed are not fetched, except for one keyframe every KEYFRAME_INTERVAL seconds.
+    SLICE_SETTLE = 0.05
+    KEYFRAME_INTERVAL = 0.25
+
     @property
     def is_swapped(self):
         """
@@ -237,7 +251,7 @@ class ImageScene2D(QGraphicsScene):
         self.scene2data, isInvertible = self.data2scene.inverted()
         self._setSceneRect()
         self._tiling.data2scene = self.data2scene
-        self._tileProvider._onSizeChanged()
+        self._tileProvider.onOrientationChanged()
         QGraphicsScene.invalidate(self, self.sceneRect())
 
     @property
@@ -300,6 +314,12 @@ class ImageScene2D(QGraphicsScene):
 
     def setPrefetchingEnabled(self, enable):
         self._prefetching_enabled = enable
+        if not enable and self._tileProvider is not None:
+            # drop the current prediction and ring
+            self._tileProvider.prefetchAhead(QRectF(), [])
+            self._tileProvider.prefetchRing(QRectF())
+        elif enable:
+            self._ringTimer.start()
 
     def setPreemptiveFetchNumber(self, n):
         if n > self.cacheSize() - 1:
@@ -316,6 +336,15 @@ class ImageScene2D(QGraphicsScene):
         for view in self.views():
             QGraphicsScene.invalidate(self, sceneRectF.intersected(view.viewportRect()))
 
+    def setActive(self, active: bool):
+        """Mark this scene as the one the user is working in.
+
+        Tiles of the active scene are guaranteed a share of the rendering threads.
+        """
+        self._active = active
+        if active and self._tileProvider is not None:
+            set_active_viewport(self._tileProvider)
+
     def reset(self):
         """Reset rotations, tiling, etc. Called when first initialized
         and when the underlying data changes.
@@ -327,6 +356,8 @@ class ImageScene2D(QGraphicsScene):
 
         self._tileProvider = TileProvider(self._tiling, self._stackedImageSources)
         self._tileProvider.sceneRectChanged.connect(self.invalidateViewports)
+        if self._active:
+            set_active_viewport(self._tileProvider)
 
         if self._dirtyIndicator:
             self.removeItem(self._dirtyIndicator)
@@ -385,7 +416,7 @@ class ImageScene2D(QGraphicsScene):
         swapped_default=False,
     ):
         """
-        * preemptive_fetch_number -- number of prefetched slices; 0 turns the feature off
+        * preemptive_fetch_number -- maximal number of slices prefetched ahead of scrolling; 0 turns the feature off
         * swapped_default -- whether axes should be swapped by default.
 
         """
@@ -413,21 +444,51 @@ class ImageScene2D(QGraphicsScene):
         self._showTileProgress = False
 
         self._tileProvider = None
+        self._active = False
         self._dirtyIndicator = None
-        self._prefetching_enabled = False
+        self._prefetching_enabled = True
 
         self._swappedDefault = swapped_default
         self.reset()
 
-        # BowWave preemptive caching
+        # Predictive prefetching of the slices the user is scrolling towards.
+        # The prediction is updated once per event loop iteration, after the stack id has followed the position.
         self.setPreemptiveFetchNumber(preemptive_fetch_number)
-        self._course = (1, 1)  # (along, pos or neg direction)
-        self._time = self._posModel.time
-        self._channel = self._posModel.channel
+        self._scrollPredictor = ScrollPredictor()
+        self._prefetchTimer = QTimer(self)
+        self._prefetchTimer.setSingleShot(True)
+        self._prefetchTimer.setInterval(0)
+        self._prefetchTimer.timeout.connect(self._prefetchAhead)
         self._posModel.timeChanged.connect(self._onTimeChanged)
-        self._posModel.channelChanged.connect(self._onChannelChanged)
         self._posModel.slicingPositionChanged.connect(self._onSlicingPositionChanged)
 
+        # Prefetching of the tiles around the viewport, once the slicing position
+        # has settled and all other tiles are fetched. Polls until the renderer is idle.
+        self._slicingSettled = True
+        self._panDirection = QPointF()
+        self._panTime = 0.0
+        self._ringRectF = QRectF()
+        self._ringTimer = QTimer(self)
+        self._ringTimer.setSingleShot(True)
+        self._ringTimer.setInterval(self.RING_PREFETCH_DELAY)
+        self._ringTimer.timeout.connect(self._prefetchRing)
+        self._posModel.slicingPositionSettled.connect(self._onSlicingPositionSettled)
+
+        # Coalescing of slice changes while scrolling fast, see _coalesceSliceChange
+        self._fetchSlice = True
+        self._lastSliceChange = 0.0
+        self._lastKeyframe = 0.0
+        self._sliceSettleTimer = QTimer(self)
+        self._sliceSettleTimer.setSingleShot(True)
+        self._sliceSettleTimer.setInterval(int(self.SLICE_SETTLE * 1000))
+        self._sliceSettleTimer.timeout.connect(self._onSliceSettled)
+
+        # Frames streamed ahead of a time series playback (see prefetchFrames)
+        self._playbackTimes = ()
+        self._playbackLayers = None
+        # cache size to restore when the playback ends, None if it wasn't grown for the playback
+        self._cacheSizeBeforePlayback = None
+
         self._allTilesCompleteEvent = threading.Event()
         self.dirty = False
 
@@ -487,7 +548,10 @@ class ImageScene2D(QGraphicsScene):
         if not sceneRectF.isValid():
             return
 
-        tiles = self._tileProvider.getTiles(sceneRectF, vp_rectF)
+        tiles = self._tileProvider.getTiles(sceneRectF, vp_rectF, self._fetchSlice, self._playbackLayers)
+        if vp_rectF != self._ringRectF:
+            self._ringRectF = vp_rectF
+            self._ringTimer.start()
         allComplete = True
         for tile in tiles:
             # We always draw the tile, even though it might not be up-to-date
@@ -524,12 +588,6 @@ class ImageScene2D(QGraphicsScene):
                 self.dirtyChanged.emit()
             self._allTilesCompleteEvent.clear()
 
-        # preemptive fetching
-        if self._prefetching_enabled:
-            upcoming_through_slices = self._bowWave(self._n_preemptive)
-            for through in upcoming_through_slices:
-                self._tileProvider.prefetch(sceneRectF, through, layer_indexes=None)
-
     def triggerPrefetch(self, layer_indexes, time_range="current", spatial_axis_range="current", sceneRectF=None):
         """
         Trigger a one-time prefetch for the given set of layers.
@@ -580,6 +638,63 @@ class ImageScene2D(QGraphicsScene):
         for through in through_list:
             self._tileProvider.prefetch(sceneRectF, through, layer_indexes)
 
+    def roiSlices(self, start: Sequence[int], stop: Sequence[int]) -> Tuple[QRectF, List[Tuple[int, int]]]:
+        """
+        The part of the scene and the 'through' positions (t, slice) of a region of interest.
+
+        start, stop: (t, x, y, z) corners of the region, e.g. of a CropExtentsModel.
+        The slices are ordered by their distance from the current slice.
+        """
+        spatial_axis = self._along[1]
+        plane = [axis for axis in (1, 2, 3) if axis != spatial_axis]
+        dataRect = QRect(
+            start[plane[0]],
+            start[plane[1]],
+            stop[plane[0]] - start[plane[0]],
+            stop[plane[1]] - start[plane[1]],
+        )
+        sceneRectF = self.data2scene.mapRect(QRectF(dataRect))
+
+        current = (self._posModel.slicingPos5D[0], self._posModel.slicingPos5D[spatial_axis])
+        throughs = [(t, s) for t in range(start[0], stop[0]) for s in range(start[spatial_axis], stop[spatial_axis])]
+        throughs.sort(key=lambda through: abs(through[0] - current[0]) + abs(through[1] - current[1]))
+        return sceneRectF, throughs
+
+    def warmUp(self, sceneRectF: QRectF, throughs: Sequence[Sequence[int]], layer_indexes=None):
+        """
+        Fetch the tiles in sceneRectF of the slices at the given 'through' positions in the background.
+
+        Used by the WarmUpController, which passes a few slices at a time.
+        The slices are fetched after all other tiles and replace the slices
+        of the previous call; an empty sequence ends the warm-up.
+        """
+        if self._tileProvider is None:
+            return
+        self._tileProvider.warmUp(sceneRectF, throughs, layer_indexes)
+
+    def pinSlices(self, throughs: Sequence[Sequence[int]]):
+        """
+        Keep the slices at the given 'through' positions in the tile cache, besides the cacheSize() others.
+
+        Used by the WarmUpController for the slices of the warmed up region.
+        Replaces the previously pinned slices; an empty sequence releases them.
+        """
+        if self._tileProvider is None:
+            return
+        self._tileProvider.pinStacks(throughs)
+
+    def sliceProgress(self, sceneRectF: QRectF, through: Sequence[int], layer_indexes=None) -> float:
+        """Fraction of the tiles in sceneRectF of the slice at 'through' that are fetched"""
+        if self._tileProvider is None:
+            return 1.0
+        return self._tileProvider.stackProgress(sceneRectF, through, layer_indexes)
+
+    def sliceBytes(self, sceneRectF: QRectF, layer_indexes=None) -> int:
+        """Memory taken by the cached tiles in sceneRectF of one slice"""
+        if self._tileProvider is None:
+            return 0
+        return self._tileProvider.sliceBytes(sceneRectF, layer_indexes)
+
     def joinRenderingAllTiles(self, viewport_only=True, rect=None):
         """
         Wait until all tiles in the scene have been 100% rendered.
@@ -600,37 +715,138 @@ class ImageScene2D(QGraphicsScene):
         else:
             self._allTilesCompleteEvent.wait()
 
-    def _bowWave(self, n):
+    def prefetchFrames(self, times: Sequence[int], layer_indexes=None):
+        """
+        Stream the frames at the given times (of the current slice) into the tile cache, nearest first.
+
+        Used by the time series playback (see PlaybackController), replaces the
+        slices prefetched ahead of scrolling. While streaming, only the layers of
+        layer_indexes (all if None) are fetched, also for the frame shown.
+        An empty sequence of times ends the streaming, and shrinks the tile cache
+        back to the size it had before.
+        """
+        if self._tileProvider is None:
+            return
+        self._playbackTimes = tuple(times)
+        layers = list(layer_indexes) if self._playbackTimes and layer_indexes is not None else None
+        reblend = self._playbackLayers is not None and layers != self._playbackLayers
+        self._playbackLayers = layers
+        if reblend:
+            # show the layers that were left out
+            self._tileProvider.setAllTilesDirty()
+
+        if not self._playbackTimes and self._cacheSizeBeforePlayback is not None:
+            self.setCacheSize(self._cacheSizeBeforePlayback)
+            self._cacheSizeBeforePlayback = None
+        elif self.cacheSize() < len(self._playbackTimes) + 1:
+            if self._cacheSizeBeforePlayback is None:
+                self._cacheSizeBeforePlayback = self.cacheSize()
+            self.setCacheSize(len(self._playbackTimes) + 1)
+        throughs = [self._through(t) for t in self._playbackTimes]
+        self._tileProvider.prefetchAhead(self._viewportRectF(), throughs, layer_indexes)
+
+    def frameProgress(self, t: int, layer_indexes=None) -> float:
+        """Fraction of the visible tiles of the frame at time t (of the current slice) that are fetched"""
+        if self._tileProvider is None:
+            return 1.0
+        return self._tileProvider.stackProgress(self._viewportRectF(), self._through(t), layer_indexes)
+
+    def frameFetchSeconds(self, layer_indexes=None) -> Optional[float]:
+        """Estimated seconds to fetch the visible tiles of one frame, None until the layers were measured"""
+        if self._tileProvider is None:
+            return None
+        return self._tileProvider.sliceFetchSeconds(self._viewportRectF(), layer_indexes)
+
+    def _through(self, t: int) -> List[int]:
+        """'through' position of the frame at time t of the current slice"""
+        through = [self._posModel.slicingPos5D[axis] for axis in self._along[:-1]]
+        through[0] = t
+        return through
+
+    def _viewportRectF(self) -> QRectF:
+        return self.views()[0].viewportRect() if self.views() else self.sceneRect()
+
+    def _prefetchAhead(self):
+        """Prefetch the slices predicted from the recent scrolling along our 'through' axes (time and slice)"""
+        if not self._prefetching_enabled or self._tileProvider is None or self._playbackTimes:
+            return
+
+        rectF = self._viewportRectF()
         through = [self._posModel.slicingPos5D[axis] for axis in self._along[:-1]]
-        t_max = [self._posModel.shape5D[axis] for axis in self._along[:-1]]
+        shape = [self._posModel.shape5D[axis] for axis in self._along[:-1]]
 
-        BowWave = []
+        # Don't prefetch more slices than the cache holds besides the current one,
+        # nor more than can be fetched within the prediction horizon.
+        max_depth = min(self._n_preemptive, self.cacheSize() - 1)
+        slice_seconds = self._tileProvider.sliceFetchSeconds(rectF)
+        if slice_seconds:
+            max_depth = min(max_depth, max(1, int(PREFETCH_HORIZON / slice_seconds)))
 
-        a = self._course[0]
-        for d in range(1, n + 1):
-            m = through[a] + d * self._course[1]
-            if m < t_max[a] and m >= 0:
-                t = list(through)
-                t[a] = m
-                BowWave.append(tuple(t))
-        return BowWave
+        upcoming = self._scrollPredictor.upcoming(through, shape, PREFETCH_HORIZON, max_depth)
+        self._tileProvider.prefetchAhead(rectF, upcoming)
 
     def _onSlicingPositionChanged(self, new, old):
-        if (new[self._along[1] - 1] - old[self._along[1] - 1]) < 0:
-            self._course = (1, -1)
-        else:
-            self._course = (1, 1)
+        axis = self._along[1] - 1
+        if new[axis] != old[axis]:
+            now = time.perf_counter()
+            self._scrollPredictor.observe(1, new[axis], now)
+            self._coalesceSliceChange(now)
+            if self._fetchSlice:
+                self._prefetchTimer.start()
 
-    def _onChannelChanged(self, new):
-        if (new - self._channel) < 0:
-            self._course = (2, -1)
+    def _onTimeChanged(self, new):
+        now = time.perf_counter()
+        self._scrollPredictor.observe(0, new, now)
+        if self._playbackTimes:
+            # the frames of a playback are streamed ahead, every one is shown
+            self._fetchSlice = True
         else:
-            self._course = (2, 1)
-        self._channel = new
+            self._coalesceSliceChange(now)
+        if self._fetchSlice:
+            self._prefetchTimer.start()
+        self._ringTimer.start()
 
-    def _onTimeChanged(self, new):
-        if (new - self._time) < 0:
-            self._course = (0, -1)
+    def _coalesceSliceChange(self, now):
+        """
+        While the user scrolls fast, only keyframes are fetched (and the slices
+        ahead of them prefetched), the slices in between show the nearest cached
+        slice. The slice the user stops at is fetched once there was no change
+        for SLICE_SETTLE seconds.
+        """
+        scrolling = now - self._lastSliceChange < self.SLICE_SETTLE
+        self._lastSliceChange = now
+        if not scrolling or now - self._lastKeyframe >= self.KEYFRAME_INTERVAL:
+            self._fetchSlice = True
+            self._lastKeyframe = now
         else:
-            self._course = (0, 1)
-        self._time = new
+            self._fetchSlice = False
+        self._sliceSettleTimer.start()
+
+    def _onSliceSettled(self):
+        if not self._fetchSlice:
+            self._fetchSlice = True
+            self.invalidateViewports(QRectF())
+
+    def _onSlicingPositionSettled(self, settled):
+        self._slicingSettled = settled
+        if settled:
+            self._ringTimer.start()
+
+    def notifyPanned(self, delta: QPointF):
+        """The view was panned by delta (in scene coordinates), tiles in that direction are prefetched first"""
+        if not delta.isNull():
+            self._panDirection = delta
+            self._panTime = time.perf_counter()
+
+    def _prefetchRing(self):
+        """Prefetch the tiles around the viewport once nothing else is being fetched"""
+        if not self._prefetching_enabled or self._tileProvider is None or not self._slicingSettled:
+            return
+        if not renderer_idle():
+            self._ringTimer.start()
+            return
+
+        direction = self._panDirection
+        if time.perf_counter() - self._panTime > self.RECENT_PAN:
+            direction = QPointF()
+        self._tileProvider.prefetchRing(self._ringRectF, direction)
@@ -216,6 +216,7 @@ class ImageView2D(QGraphicsView):
         return self.mapScene2Data(self.mapToScene(pos))
 
     def _panning(self):
+        center = self.viewportRect().center()
         hBar = self.horizontalScrollBar()
         vBar = self.verticalScrollBar()
         vBar.setValue(vBar.value() - int(self._deltaPan.y()))
@@ -223,6 +224,7 @@ class ImageView2D(QGraphicsView):
             hBar.setValue(hBar.value() + int(self._deltaPan.x()))
         else:
             hBar.setValue(hBar.value() - int(self._deltaPan.x()))
+        self.scene().notifyPanned(self.viewportRect().center() - center)
 
     def _deaccelerate(self, speed, a=1, maxVal=64):
         x = self._qBound(-maxVal, speed.x(), maxVal)
@@ -428,6 +428,88 @@ class AlphaModulatedLayer(NormalizableLayer):
         return src
 
 
+class MultiChannelCompositeLayer(Layer):
+    """Additive composite of all channels of a single data source
+
+    Each channel is scaled by its own (min, max) range and blended in its
+    tint color, channels can be hidden individually. All channels of a tile
+    are fetched with one request; changing the channel settings does not
+    fetch the data again.
+    """
+
+    channelSettingsChanged = Signal()
+
+    DEFAULT_TINT_COLORS = (
+        QColor(255, 0, 0),
+        QColor(0, 255, 0),
+        QColor(0, 0, 255),
+        QColor(255, 0, 255),
+        QColor(0, 255, 255),
+        QColor(255, 255, 0),
+    )
+
+    @property
+    def tintColors(self) -> List[QColor]:
+        return [self._tintColors.get(c, self._defaultTintColor(c)) for c in range(self.numberOfChannels)]
+
+    @property
+    def normalize(self) -> List[Tuple[Number, Number]]:
+        return [self._normalize.get(c, self._defaultRange) for c in range(self.numberOfChannels)]
+
+    @property
+    def channelVisible(self) -> List[bool]:
+        return [self._channelVisible.get(c, True) for c in range(self.numberOfChannels)]
+
+    def setTintColor(self, channel: int, color: QColor):
+        if self.tintColors[channel] != color:
+            self._tintColors[channel] = color
+            self.channelSettingsChanged.emit()
+
+    def setNormalize(self, channel: int, value: Tuple[Number, Number]):
+        """value -- (nmin, nmax), the data range mapped to the full intensity of the channel"""
+        if self.normalize[channel] != value:
+            self._normalize[channel] = value
+            self.channelSettingsChanged.emit()
+
+    def setChannelVisible(self, channel: int, visible: bool):
+        if self.channelVisible[channel] != visible:
+            self._channelVisible[channel] = visible
+            self.channelSettingsChanged.emit()
+
+    def _defaultTintColor(self, channel: int) -> QColor:
+        return self.DEFAULT_TINT_COLORS[channel % len(self.DEFAULT_TINT_COLORS)]
+
+    def __init__(self, datasource, tintColors=None, normalize=None, direct=False, priority: int = 0):
+        """
+        tintColors - a QColor per channel, channels without a color cycle through DEFAULT_TINT_COLORS
+        normalize - a (dmin, dmax) range per channel, or a single range used for all channels;
+                    by default the range of the data type for integers, (0, 255) otherwise
+        """
+        assert isinstance(datasource, DataSourceABC)
+        super().__init__([datasource], direct=direct, priority=priority)
+
+        dtype = numpy.dtype(datasource.dtype())
+        if normalize is None and dtype.kind in "iu":
+            normalize = (numpy.iinfo(dtype).min, numpy.iinfo(dtype).max)
+        self._defaultRange = (0, 255)
+        if normalize is not None and isinstance(normalize[0], Number):
+            self._defaultRange, normalize = tuple(normalize), None
+
+        self._tintColors = dict(enumerate(tintColors or []))
+        self._normalize = dict(enumerate(normalize or []))
+        self._channelVisible = {}
+        self.channelSettingsChanged.connect(self.changed)
+
+    def createImageSource(self, data_sources):
+        if len(data_sources) != 1:
+            raise ValueError("Expected 1 data source got %s" % len(data_sources))
+
+        src = imsrc.MultiChannelCompositeImageSource(data_sources[0], self)
+        src.setObjectName(self.name)
+        self.nameChanged.connect(lambda x: src.setObjectName(str(x)))
+        return src
+
+
 def generateRandomColors(M=256, colormodel="hsv", clamp=None, zeroIsTransparent=False):
     """Generate a colortable with M entries.
     colormodel: currently only 'hsv' is supported
@@ -715,6 +797,7 @@ class LabelableSegmentationEdgesLayer(SegmentationEdgesLayer):
         )
         self._delay_ms = delay_ms
         self._label_class_pens = label_class_pens
+        self._edge_labels = defaultdict(lambda: 0)
 
         # Initialize the labels and pens
         self.overwrite_edge_labels(initial_labels)
@@ -729,16 +812,41 @@ class LabelableSegmentationEdgesLayer(SegmentationEdgesLayer):
         self._timer.timeout.connect(self._signal_buffered_updates)
 
     def overwrite_edge_labels(self, new_edge_labels):
+        """
+        Replace all edge labels with new_edge_labels { id_pair : label_class }.
+        Only the pens of edges whose label actually changes are updated.
+        """
+        old_edge_labels = self._edge_labels
+        changes = {
+            id_pair: label_class
+            for id_pair, label_class in new_edge_labels.items()
+            if old_edge_labels.get(id_pair, 0) != label_class
+        }
+        changes.update(dict.fromkeys(old_edge_labels.keys() - new_edge_labels.keys(), 0))
         self._edge_labels = defaultdict(lambda: 0, new_edge_labels)
+        self._update_pens(changes)
 
-        # Change the pens accordingly
-        pen_table = {}
-        for id_pair, label_class in list(self._edge_labels.items()):
-            # Omit unlabeled edges; there are usually a lot of them
-            # and the default is class 0 anyway.
-            if label_class != 0:
-                pen_table[id_pair] = self._label_class_pens[label_class]
-        self.pen_table.overwrite(pen_table)
+    def update_edge_labels(self, edge_labels):
+        """
+        Change the labels of the given edges { id_pair : label_class }, keeping all other labels.
+        """
+        changes = {
+            id_pair: label_class
+            for id_pair, label_class in edge_labels.items()
+            if self._edge_labels.get(id_pair, 0) != label_class
+        }
+        self._edge_labels.update(changes)
+        self._update_pens(changes)
+
+    def _update_pens(self, changes):
+        # Omit unlabeled edges; there are usually a lot of them
+        # and the default is class 0 anyway.
+        # Each call below notifies the pen table listeners once, for all changed edges.
+        pens = self._label_class_pens
+        self.pen_table.update(
+            {id_pair: pens[label_class] for id_pair, label_class in changes.items() if label_class != 0}
+        )
+        self.pen_table.discard([id_pair for id_pair, label_class in changes.items() if label_class == 0])
 
     def handle_edge_clicked(self, id_pair, event):
         """
@@ -20,7 +20,7 @@ class ArrayRequest(RequestABC):
         pass
 
     def submit(self):
-        pass
+        return self
 
 
 class ArraySource(QObject, DataSourceABC):
@@ -6,55 +6,112 @@ from typing import Union
 
 from qtpy.QtCore import QObject, Signal
 
-from volumina.pixelpipeline.interface import DataSourceABC
+from volumina.pixelpipeline.interface import DataSourceABC, RequestABC
 from volumina.slicingtools import is_pure_slicing
 from volumina.utility.cache import KVCache
+from volumina.utility.diskcache import DiskCache
 from volumina.config import CONFIG
 
 logger = logging.getLogger(__name__)
 
 
 ARRAY_CACHE = KVCache(CONFIG.cache_size, getsizeof=sys.getsizeof)
+DISK_CACHE = DiskCache(CONFIG.disk_cache_dir, CONFIG.disk_cache_size) if CONFIG.disk_cache_dir else None
 
 
-class _Request:
-    def __init__(self, cached_source: "CacheSource", slicing, key):
+class _Request(RequestABC):
+    """
+    Pending request for a slicing that is not cached yet.
+
+    The same object is handed out to everybody requesting the same slicing
+    while it is pending, so it keeps count of its requesters (see `acquire`)
+    and only cancels the underlying request once all of them have cancelled.
+
+    If the source has a fingerprint, the result is looked up in the disk cache
+    before the underlying request is started, and written to it in the
+    background once it is computed.
+    """
+
+    def __init__(self, cached_source: "CacheSource", slicing, key, disk_key=None):
         self._cached_source = cached_source
         self._slicing = slicing
         self._key = key
+        self._disk_key = disk_key
         self._result = None
+        self._refcount = 0
         self._rq = self._cached_source._source.request(self._slicing)
 
+    def acquire(self) -> "_Request":
+        """register another requester; must be called with the cache source lock held"""
+        self._refcount += 1
+        return self
+
+    def _loadPersisted(self) -> bool:
+        """take the result from the disk cache if it is there; returns whether a result is available"""
+        if self._result is None and self._disk_key is not None:
+            fingerprint, key = self._disk_key
+            persisted = self._cached_source._disk_cache.get(fingerprint, key)
+            if persisted is not None:
+                persisted.setflags(write=False)
+                self._store(persisted)
+        return self._result is not None
+
+    def _store(self, cached_copy):
+        self._result = cached_copy
+        with self._cached_source._lock:
+            try:
+                self._cached_source._cache[self._key] = cached_copy
+            except ValueError:
+                logger.warning(
+                    "Value too large, skipping cache; cache_size: %s, value size: %s",
+                    self._cached_source._cache.maxsize,
+                    self._cached_source._cache.getsizeof(cached_copy),
+                )
+
     def wait(self):
         if self._result is not None:
             return self._result
 
         try:
+            if self._loadPersisted():
+                return self._result
+
             res = self._rq.wait()
 
-            self._result = cached_copy = res.copy()
+            cached_copy = res.copy()
             cached_copy.setflags(write=False)
+            self._store(cached_copy)
 
-            with self._cached_source._lock:
-                try:
-                    self._cached_source._cache[self._key] = cached_copy
-                except ValueError:
-                    logger.warning(
-                        "Value too large, skipping cache; cache_size: %s, value size: %s",
-                        self._cached_source._cache.maxsize,
-                        self._cached_source._cache.getsizeof(cached_copy),
-                    )
+            if self._disk_key is not None:
+                self._cached_source._persist(self._disk_key, cached_copy)
         finally:
             self._cached_source._req.pop(self._key, None)
 
         return self._result
 
+    def submit(self):
+        if not self._loadPersisted():
+            self._rq.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        if self._result is not None:
+            fn(self)
+            return
+        # wait() does not block once the underlying request is done; it stores the result in the cache.
+        self._rq.add_done_callback(lambda _req: fn(self))
+
     def cancel(self):
+        with self._cached_source._lock:
+            self._refcount -= 1
+            if self._refcount > 0:
+                return
+            if self._cached_source._req.get(self._key) is self:
+                del self._cached_source._req[self._key]
         self._rq.cancel()
-        self._cached_source._req.pop(self._key, None)
 
 
-class _CachedRequest:
+class _CachedRequest(RequestABC):
     def __init__(self, result):
         self._result = result
 
@@ -69,14 +126,17 @@ class CacheSource(QObject, DataSourceABC):
     isDirty = Signal(object)
     numberOfChannelsChanged = Signal(int)
 
-    def __init__(self, source: "LazyflowSource", cache=ARRAY_CACHE):
+    def __init__(self, source: "LazyflowSource", cache=ARRAY_CACHE, disk_cache=DISK_CACHE):
         super().__init__()
         self._lock = threading.Lock()
 
         self._uniqueid = uuid.uuid4()  # id(self) wasn't unique enough
         self._source = source
         self._cache = cache
+        self._disk_cache = disk_cache
         self._req = {}
+        # the fingerprint of the last persisted data that became dirty; it isn't persisted again
+        self._discarded = None
         self._source.isDirty.connect(self.isDirty)
         self._source.numberOfChannelsChanged.connect(self.numberOfChannelsChanged)
         self._source.isDirty.connect(self.clear)
@@ -85,9 +145,25 @@ class CacheSource(QObject, DataSourceABC):
     def clear(self, *args):
         self._cache.clear()
         self._req.clear()
+        with self._lock:
+            if self._persisted:
+                self._discarded = self.fingerprint
+                self._disk_cache.discard(self.fingerprint)
 
-    def __cache_key(self, slicing):
-        parts = [self._uniqueid]
+    @property
+    def _persisted(self) -> bool:
+        fingerprint = self.fingerprint
+        return self._disk_cache is not None and isinstance(fingerprint, str) and fingerprint != self._discarded
+
+    def _persist(self, disk_key, array):
+        """store array in the background, unless the source became dirty since it was requested"""
+        with self._lock:
+            if self._persisted and disk_key[0] == self.fingerprint:
+                self._disk_cache.put_async(*disk_key, array)
+
+    @staticmethod
+    def __slicing_key(slicing):
+        parts = []
 
         for el in slicing:
             _, key_part = el.__reduce__()
@@ -95,6 +171,9 @@ class CacheSource(QObject, DataSourceABC):
 
         return "::".join(str(p) for p in parts)
 
+    def __cache_key(self, slicing):
+        return f"{self._uniqueid}::{self.__slicing_key(slicing)}"
+
     def request(self, slicing) -> Union[_CachedRequest, _Request]:
         key = self.__cache_key(slicing)
 
@@ -105,9 +184,10 @@ class CacheSource(QObject, DataSourceABC):
 
             else:
                 if key not in self._req:
-                    self._req[key] = _Request(self, slicing, key)
+                    disk_key = (self.fingerprint, self.__slicing_key(slicing)) if self._persisted else None
+                    self._req[key] = _Request(self, slicing, key, disk_key)
 
-                return self._req[key]
+                return self._req[key].acquire()
 
     def __getattr__(self, attr):
         return getattr(self._source, attr)
@@ -121,6 +201,10 @@ class CacheSource(QObject, DataSourceABC):
     def numberOfChannels(self):
         return self._source.numberOfChannels
 
+    @property
+    def fingerprint(self):
+        return getattr(self._source, "fingerprint", None)
+
     def __repr__(self):
         return f"<CachedSource(id:{id(self)}, source:{self._source!r})>"
 
@@ -16,7 +16,7 @@ class ConstantRequest(RequestABC):
         pass
 
     def submit(self):
-        pass
+        return self
 
     def adjustPriority(self, delta):
         pass
@@ -106,9 +106,11 @@ def _numpy_ds(source, withShape=False):
 
 if hasLazyflow:
 
-    def _createDataSourceLazyflow(slot, withShape) -> Union[Tuple[LazyflowSource, Tuple[int, ...]], LazyflowSource]:
+    def _createDataSourceLazyflow(
+        slot, withShape, fingerprint=None
+    ) -> Union[Tuple[LazyflowSource, Tuple[int, ...]], LazyflowSource]:
         # has to handle Lazyflow source
-        src = LazyflowSource(slot)
+        src = LazyflowSource(slot, fingerprint=fingerprint)
         shape = src._op5.Output.meta.shape
         if withShape:
             return src, shape
@@ -116,12 +118,15 @@ if hasLazyflow:
             return src
 
     @createDataSource.register(lazyflow.graph.OutputSlot)
-    def _lazyflow_out(slot, withShape=False) -> Union[Tuple[CacheSource, Tuple[int, ...]], CacheSource]:
+    def _lazyflow_out(
+        slot, withShape=False, fingerprint=None
+    ) -> Union[Tuple[CacheSource, Tuple[int, ...]], CacheSource]:
+        # with a fingerprint, the CacheSource keeps the data of the slot in the disk cache
         if withShape:
-            src, shape = _createDataSourceLazyflow(slot, withShape)
+            src, shape = _createDataSourceLazyflow(slot, withShape, fingerprint)
             return CacheSource(src), shape
         else:
-            src = _createDataSourceLazyflow(slot, withShape)
+            src = _createDataSourceLazyflow(slot, withShape, fingerprint)
             return CacheSource(src)
 
     @createDataSource.register(lazyflow.graph.InputSlot)
@@ -8,9 +8,15 @@ from qtpy.QtCore import QObject, Signal
 from future.utils import raise_with_traceback
 from lazyflow.graph import Slot
 from lazyflow.operators import opReorderAxes
+from lazyflow.request import Request
 from lazyflow.roi import sliceToRoi, roiToSlice
 
-from volumina.pixelpipeline.interface import DataSourceABC, RequestABC, IndeterminateRequestError
+from volumina.pixelpipeline.interface import (
+    DataSourceABC,
+    RequestABC,
+    IndeterminateRequestError,
+    RequestCancelledError,
+)
 from volumina.slicingtools import is_pure_slicing, slicing2shape, make_bounded
 from volumina.config import CONFIG
 
@@ -37,7 +43,7 @@ def translate_lf_exceptions(func):
     """
     Decorator.
     Since volumina doesn't know about lazyflow, this datasource is responsible
-    for translating SlotNotReady errors into the volumina equivalent.
+    for translating SlotNotReady and cancellation errors into the volumina equivalents.
     """
 
     @wraps(func)
@@ -47,6 +53,8 @@ def translate_lf_exceptions(func):
         except Slot.SlotNotReadyError as ex:
             # Translate lazyflow not-ready errors into the volumina equivalent.
             raise IndeterminateRequestError() from ex
+        except Request.CancellationException as ex:
+            raise RequestCancelledError() from ex
 
     wrapper.__wrapped__ = func  # Emulate python 3 behavior of @functools.wraps
     return wrapper
@@ -80,6 +88,16 @@ class LazyflowRequest(RequestABC):
     def cancel(self):
         self._req.cancel()
 
+    @translate_lf_exceptions
+    def submit(self):
+        self._req.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        # lazyflow also invokes the callback for failed and cancelled requests;
+        # wait() re-raises the error in that case.
+        self._req.add_done_callback(lambda _req: fn(self))
+
 
 def weakref_setDirtyLF(wref, *args, **kwargs):
     """
@@ -97,7 +115,7 @@ class LazyflowSource(QObject, DataSourceABC):
     def dataSlot(self):
         return self._orig_outslot
 
-    def __init__(self, outslot, priority=0):
+    def __init__(self, outslot, priority=0, fingerprint=None):
         super(LazyflowSource, self).__init__()
 
         self._orig_outslot = outslot
@@ -111,6 +129,7 @@ class LazyflowSource(QObject, DataSourceABC):
         self._op5.name = "reorder_lazyflow_source_to_volumina"
 
         self._priority = priority
+        self.fingerprint = fingerprint
         self._dirtyCallback = partial(weakref_setDirtyLF, weakref.ref(self))
         self._op5.Output.notifyDirty(self._dirtyCallback)
         self._op5.externally_managed = True
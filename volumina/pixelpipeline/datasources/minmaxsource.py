@@ -22,6 +22,16 @@ class MinMaxUpdateRequest(RequestABC):
 
         return self._result
 
+    def submit(self):
+        self._rawRequest.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        self._rawRequest.add_done_callback(lambda _req: fn(self))
+
+    def cancel(self):
+        self._rawRequest.cancel()
+
 
 class MinMaxSource(QObject, DataSourceABC):
     """
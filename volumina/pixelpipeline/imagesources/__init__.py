@@ -2,6 +2,7 @@ from .alphamodulated import AlphaModulatedImageSource
 from .colortable import ColortableImageSource
 from .dummy import DummyItemSource, DummyRasterItemSource
 from .grayscale import GrayscaleImageSource
+from .multichannel import MultiChannelCompositeImageSource
 from .random import RandomImageSource
 from .rgba import RGBAImageSource
 from .segmentationedges import SegmentationEdgesItemSource
@@ -12,6 +13,7 @@ __all__ = [
     "DummyItemSource",
     "DummyRasterItemSource",
     "GrayscaleImageSource",
+    "MultiChannelCompositeImageSource",
     "RGBAImageSource",
     "RandomImageSource",
     "SegmentationEdgesItemSource",
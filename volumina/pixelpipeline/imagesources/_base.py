@@ -1,11 +1,16 @@
 import functools
+import threading
+import weakref
+from typing import Dict, Optional
 
+import numpy as np
+from cachetools import LRUCache
 from qtpy.QtCore import QObject, QRect, Signal
 from qtpy.QtGui import QImage
 
 from volumina import config
-from volumina.pixelpipeline.interface import ImageSourceABC
-from volumina.slicingtools import is_bounded, is_pure_slicing, slicing2rect
+from volumina.pixelpipeline.interface import ImageSourceABC, PlanarSliceSourceABC, RequestABC
+from volumina.slicingtools import is_bounded, is_pure_slicing, rect2slicing, slicing2rect
 
 
 class ImageSource(QObject, ImageSourceABC):
@@ -50,6 +55,15 @@ class ImageSource(QObject, ImageSourceABC):
     def request(self, rect, along_through=None):
         raise NotImplementedError
 
+    def tileKey(self, rect, along_through=None):
+        """Hashable key of everything the tile rect depends on, None if unknown
+
+        Tiles with a key are rendered once and shared by all views, see
+        `volumina.pixelpipeline.tilecache`. Implementations build the key with
+        `LAYER_TILE_CACHE.key` from their slice sources and render parameters.
+        """
+        return None
+
     def setDirty(self, slicing):
         """Mark a region of the image as dirty.
 
@@ -79,6 +93,166 @@ class ImageSource(QObject, ImageSourceABC):
         return self._opaque
 
 
+class CachedArrayRequest(RequestABC):
+    """Request for an array that is already in memory"""
+
+    def __init__(self, array: np.ndarray):
+        self._array = array
+
+    def wait(self):
+        return self._array
+
+
+class _RecordingRequest(RequestABC):
+    """Forwards a slice request and stores its result in a RawArrayCache"""
+
+    def __init__(self, request: RequestABC, cache: "RawArrayCache", key, generation: int):
+        self._request = request
+        self._cache = cache
+        self._key = key
+        self._generation = generation
+
+    def wait(self):
+        array = self._request.wait()
+        self._cache._store(self._key, array, self._generation)
+        return array
+
+    def submit(self):
+        self._request.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        self._request.add_done_callback(lambda _req: fn(self))
+
+    def cancel(self):
+        self._request.cancel()
+
+
+class _SliceSourceToken:
+    """Stands in for a slice source in RawArrayCache keys, without keeping the slice source alive"""
+
+    __slots__ = ("generation", "__weakref__")
+
+    def __init__(self):
+        # bumped on every invalidation, arrays requested before must not be stored
+        self.generation = 0
+
+
+class RawArrayCache:
+    """Raw 2D tiles image sources fetched most recently, bounded by their total size in bytes
+
+    Display-only changes (normalization, colortable, tint) mark the image source
+    dirty while the data stays the same; the tiles are then rendered again from
+    these arrays instead of being fetched through the slice source once more.
+    Image sources `register` their slice sources, which drops arrays whose data
+    has changed when the slice source reports it.
+
+    All image sources share RAW_ARRAY_CACHE, so the arrays held by all layers
+    in all views are bounded together.
+    """
+
+    def __init__(self, maxbytes: int):
+        self._arrays = LRUCache(maxbytes, getsizeof=lambda a: a.nbytes)
+        self._lock = threading.Lock()
+        # id(slice source) -> token, entries are removed when the slice source is collected
+        self._tokens: Dict[int, _SliceSourceToken] = {}
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._arrays.clear()
+
+    def register(self, source: PlanarSliceSourceABC) -> None:
+        """Drop the arrays of source whenever it becomes dirty
+
+        Call this before connecting anything else to source.isDirty, so that
+        nobody re-requests an outdated array in response to the notification.
+        """
+        with self._lock:
+            if id(source) in self._tokens:
+                return
+        token = _SliceSourceToken()
+        try:
+            weakref.finalize(source, self._forget, id(source), token)
+        except TypeError:
+            return
+        with self._lock:
+            if self._tokens.setdefault(id(source), token) is not token:
+                return
+        source.isDirty.connect(lambda slicing=None: self._invalidate(token, slicing))
+
+    def _forget(self, source_id: int, token: _SliceSourceToken) -> None:
+        with self._lock:
+            if self._tokens.get(source_id) is token:
+                del self._tokens[source_id]
+
+    def _token(self, source) -> Optional[_SliceSourceToken]:
+        with self._lock:
+            return self._tokens.get(id(source))
+
+    @staticmethod
+    def _through(source: PlanarSliceSourceABC, along_through):
+        through = getattr(source, "through", None)
+        if through is None:
+            return None
+        for axis, value in along_through or ():
+            through[axis] = value
+        return tuple(through)
+
+    def request(
+        self, source: PlanarSliceSourceABC, qrect: QRect, along_through=None, channels: bool = False
+    ) -> RequestABC:
+        """Request the tile qrect of source, from memory if it has been fetched before
+
+        channels: request all channels at once, see PlanarSliceSource.requestChannels
+        """
+        slicing = rect2slicing(qrect)
+        request = source.requestChannels if channels else source.request
+        through = self._through(source, along_through)
+        token = self._token(source)
+        if through is None or token is None:
+            # slice position unknown or source not registered, can't tell which arrays are valid
+            return request(slicing, along_through)
+
+        key = (token, through, (qrect.x(), qrect.y(), qrect.width(), qrect.height()), channels)
+        with self._lock:
+            array = self._arrays.get(key)
+            generation = token.generation
+        if array is not None:
+            return CachedArrayRequest(array)
+        return _RecordingRequest(request(slicing, along_through), self, key, generation)
+
+    def _store(self, key, array, generation: int) -> None:
+        if not isinstance(array, np.ndarray) or array.nbytes > self._arrays.maxsize:
+            return
+        with self._lock:
+            if generation == key[0].generation:
+                self._arrays[key] = array
+
+    def invalidate(self, source: PlanarSliceSourceABC, slicing=None) -> None:
+        """Drop arrays of source intersecting the 2D slicing, all its arrays if it is None or unbounded"""
+        token = self._token(source)
+        if token is not None:
+            self._invalidate(token, slicing)
+
+    def _invalidate(self, token: _SliceSourceToken, slicing=None) -> None:
+        with self._lock:
+            token.generation += 1
+            if slicing is None or not is_bounded(slicing):
+                dirty = None
+            else:
+                dirty = slicing2rect(slicing)
+            for key in [
+                key for key in self._arrays if key[0] is token and (dirty is None or QRect(*key[2]).intersects(dirty))
+            ]:
+                del self._arrays[key]
+
+
+RAW_ARRAY_CACHE = RawArrayCache(config.CONFIG.raw_array_cache_size)
+
+
 def log_request(logger):
     def _log_request(func):
         @functools.wraps(func)
@@ -0,0 +1,215 @@
+"""NumPy kernels that render arrays directly into the pixel buffer of a QImage
+
+A kernel has the signature ``kernel(data, out)``: it maps an unmasked array
+to ARGB32 values written to the uint32 array ``out`` of the same shape.
+`render` runs a kernel over a (masked) tile, through a lookup table for 8 and
+16 bit integer data.
+"""
+
+import threading
+from typing import Callable, Hashable, Optional
+
+import numpy as np
+from cachetools import LRUCache
+from qimage2ndarray import byte_view
+from qtpy.QtGui import QColor, QImage
+
+Kernel = Callable[[np.ndarray, np.ndarray], None]
+
+
+def argb32_view(img: QImage) -> np.ndarray:
+    """(height, width) uint32 view on the pixels of a 32 bit QImage, one 0xAARRGGBB value per pixel"""
+    return byte_view(img).view(np.uint32)[..., 0]
+
+
+def has_lookup_table(dtype: np.dtype) -> bool:
+    """Whether data of dtype is rendered through a lookup table"""
+    return dtype.kind in "iub" and dtype.itemsize <= 2
+
+
+def lookup_table(dtype: np.dtype, kernel: Kernel) -> np.ndarray:
+    """Results of kernel for all values of an 8 or 16 bit integer dtype
+
+    The table is indexed with the data viewed as unsigned integers of the same size.
+    """
+    codes = np.arange(2 ** (8 * dtype.itemsize), dtype=f"u{dtype.itemsize}")
+    lut = np.empty(len(codes), dtype=np.uint32)
+    kernel(codes.view(dtype), lut)
+    return lut
+
+
+class LookupTables:
+    """Recently used lookup tables of an image source, keyed by dtype and render parameters
+
+    Changing the parameters (e.g. window/level) only requires building a new
+    table once, each tile is then rendered with a single gather.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self._tables = LRUCache(maxsize)
+        self._lock = threading.Lock()
+
+    def get(self, dtype: np.dtype, params: Hashable, kernel: Kernel) -> np.ndarray:
+        key = (dtype.str, params)
+        with self._lock:
+            lut = self._tables.get(key)
+        if lut is None:
+            lut = lookup_table(dtype, kernel)
+            with self._lock:
+                self._tables[key] = lut
+        return lut
+
+
+def render(
+    data: np.ndarray, out: np.ndarray, kernel: Kernel, luts: Optional[LookupTables] = None, params: Hashable = None
+) -> None:
+    """Render data with kernel to out, masked values become transparent
+
+    8 and 16 bit integers are mapped through a lookup table of kernel
+    results, taken from luts with key params if given. Any (strided) 2D
+    array is accepted without copying.
+    """
+    mask = np.ma.getmask(data)
+    data = np.ma.getdata(data)
+    if data.dtype == np.bool_:
+        data = data.view(np.uint8)
+
+    if has_lookup_table(data.dtype):
+        lut = luts.get(data.dtype, params, kernel) if luts is not None else lookup_table(data.dtype, kernel)
+        np.take(lut, data.view(f"u{data.dtype.itemsize}"), out=out, mode="clip")
+    else:
+        kernel(data, out)
+
+    if mask is not np.ma.nomask:
+        np.copyto(out, 0, where=mask)
+
+
+def palette_from_colortable(colortable: np.ndarray) -> np.ndarray:
+    """ARGB32 palette from a (N, 4) uint8 colortable in B, G, R, A memory order"""
+    return np.ascontiguousarray(colortable, dtype=np.uint8).view(np.uint32).ravel()
+
+
+def apply_colortable(labels: np.ndarray, palette: np.ndarray, out: np.ndarray) -> None:
+    """Write ``palette[labels % len(palette)]`` to out
+
+    Masked labels are made transparent. Labels of any integer type are
+    supported, including 64 bit ids, which are wrapped into the palette.
+    """
+    mask = np.ma.getmask(labels)
+    labels = np.ma.getdata(labels)
+    if labels.dtype == np.bool_:
+        labels = labels.view(np.uint8)
+
+    if not len(palette):
+        out[...] = 0
+        return
+
+    if labels.dtype.kind == "u" and labels.dtype.itemsize <= 2:
+        # repeat the palette over the whole label range instead of wrapping each label
+        n_labels = 2 ** (8 * labels.dtype.itemsize)
+        if len(palette) < n_labels:
+            palette = np.resize(palette, n_labels)
+    else:
+        # take(mode="wrap") loops once per wrap-around, so wrap large label ids in a separate pass
+        index = np.empty(labels.shape, dtype=np.intp)
+        np.remainder(labels, len(palette), out=index, casting="unsafe")
+        labels = index
+
+    # all indices are in range now, "clip" skips buffering out that "raise" would need
+    np.take(palette, labels, out=out, mode="clip")
+    if mask is not np.ma.nomask:
+        out[mask] = 0
+
+
+def normalization(normalize) -> tuple:
+    """(min, max) of the data range mapped to 0..255, [0, 255] unless a valid range is given"""
+    if not normalize or normalize[0] >= normalize[1]:
+        return 0.0, 255.0
+    return float(normalize[0]), float(normalize[1])
+
+
+def _scaled(data: np.ndarray, normalize) -> np.ndarray:
+    """data linearly mapped from the normalize range to 0..255 (clipped) as float32"""
+    nmin, nmax = normalization(normalize)
+    scaled = np.subtract(data, nmin, dtype=np.float32)
+    scaled *= 255.0 / (nmax - nmin)
+    if data.dtype.kind == "f":
+        np.nan_to_num(scaled, copy=False)
+    np.clip(scaled, 0, 255, out=scaled)
+    return scaled
+
+
+def normalize_to_argb32(data: np.ndarray, out: np.ndarray, normalize) -> None:
+    """Kernel: opaque gray levels for data in the normalize range, values outside are clipped"""
+    np.copyto(out, _scaled(data, normalize), casting="unsafe")
+    out *= 0x010101
+    out |= 0xFF000000
+
+
+def alpha_modulated_to_argb32(data: np.ndarray, out: np.ndarray, normalize, tint: QColor) -> None:
+    """Kernel: premultiplied tint color with alpha given by data in the normalize range"""
+    scaled = _scaled(data, normalize)
+    np.copyto(out, scaled, casting="unsafe")
+    out <<= 24
+    channel = np.empty(out.shape, dtype=np.uint32)
+    for shift, factor in ((16, tint.redF()), (8, tint.greenF()), (0, tint.blueF())):
+        np.multiply(scaled, factor, out=channel, casting="unsafe")
+        channel <<= shift
+        out |= channel
+
+
+def premultiply(color, alpha, out: np.ndarray) -> np.ndarray:
+    """Write color * alpha / 255 to out, rounded like Qt's qPremultiply
+
+    color and alpha hold 8 bit values (arrays or scalars), out is a uint32 array.
+    """
+    np.multiply(color, alpha, out=out, casting="unsafe")
+    out += out >> 8
+    out += 0x80
+    out >>= 8
+    return out
+
+
+def channel_to_uint8(data: np.ndarray, out: np.ndarray, normalize, alpha: int = 255) -> None:
+    """Kernel: 8 bit channel values premultiplied with alpha
+
+    Data in a valid normalize range is scaled to 0..255 (clipped), other
+    data is cast to uint8 directly.
+    """
+    if normalize and normalize[0] < normalize[1]:
+        np.copyto(out, _scaled(data, normalize), casting="unsafe")
+    else:
+        np.copyto(out, data, casting="unsafe")
+        out &= 0xFF
+    if alpha != 255:
+        premultiply(out, alpha, out)
+
+
+def additive_composite(stack: np.ndarray, out: np.ndarray, ranges, colors) -> None:
+    """Blend the channels of a (height, width, n) stack additively into the ARGB32 array out
+
+    Each channel is scaled from its (min, max) range in ranges to 0..255 and
+    contributes its tint color (r, g, b floats in 0..1, one row per channel
+    in colors) premultiplied with that intensity; alpha is the sum of the
+    intensities. Pixels masked in any channel become transparent.
+    """
+    mask = np.ma.getmask(stack)
+    stack = np.ma.getdata(stack)
+    height, width, n = stack.shape
+
+    ranges = np.asarray(ranges, dtype=np.float32).reshape(n, 2)
+    scaled = np.subtract(stack, ranges[:, 0], dtype=np.float32)
+    scaled *= 255.0 / np.maximum(ranges[:, 1] - ranges[:, 0], 1e-35)
+    if stack.dtype.kind == "f":
+        np.nan_to_num(scaled, copy=False)
+    np.clip(scaled, 0, 255, out=scaled)
+
+    # columns in memory order of the pixels: B, G, R, A
+    weights = np.ones((n, 4), dtype=np.float32)
+    weights[:, :3] = np.asarray(colors, dtype=np.float32).reshape(n, 3)[:, ::-1]
+    blended = scaled.reshape(-1, n) @ weights
+    np.clip(blended, 0, 255, out=blended)
+
+    np.copyto(out.view(np.uint8).reshape(height, width, 4), blended.reshape(height, width, 4), casting="unsafe")
+    if mask is not np.ma.nomask:
+        out[mask.any(axis=-1)] = 0
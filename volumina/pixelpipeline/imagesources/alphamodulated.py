@@ -1,16 +1,18 @@
 import logging
 import time
-from typing import TYPE_CHECKING
+from functools import partial
+from typing import TYPE_CHECKING, Optional
 
 import numpy as np
 from qtpy.QtCore import QRect
 from qtpy.QtGui import QImage
-from qimage2ndarray import array2qimage, byte_view
+from qimage2ndarray import byte_view
 
 from volumina.pixelpipeline.interface import PlanarSliceSourceABC, RequestABC
-from volumina.slicingtools import rect2slicing
+from volumina.pixelpipeline.tilecache import LAYER_TILE_CACHE, hashable
 
-from ._base import ImageSource, log_request
+from ._base import ImageSource, RAW_ARRAY_CACHE, log_request
+from ._render import LookupTables, alpha_modulated_to_argb32, argb32_view, has_lookup_table, normalization, render
 
 _has_vigra = True
 try:
@@ -31,29 +33,46 @@ class AlphaModulatedImageSource(ImageSource):
         super(AlphaModulatedImageSource, self).__init__(layer.name, priority=layer.priority)
         self._arraySource2D = arraySource2D
         self._layer = layer
+        self._luts = LookupTables()
 
+        self._rawArrays = RAW_ARRAY_CACHE
+        self._rawArrays.register(self._arraySource2D)
         self._arraySource2D.isDirty.connect(self.setDirty)
 
     @log_request(logger)
     def request(self, qrect, along_through=None):
         assert isinstance(qrect, QRect)
-        s = rect2slicing(qrect)
-        req = self._arraySource2D.request(s, along_through)
-        return AlphaModulatedImageRequest(req, self._layer.tintColor, self._layer.normalize[0])
+        req = self._rawArrays.request(self._arraySource2D, qrect, along_through)
+        return AlphaModulatedImageRequest(req, self._layer.tintColor, self._layer.normalize[0], luts=self._luts)
+
+    def tileKey(self, qrect, along_through=None):
+        params = (type(self), self._layer.tintColor.rgba(), hashable(self._layer.normalize[0]))
+        return LAYER_TILE_CACHE.key([self._arraySource2D], qrect, along_through, params)
 
 
 class AlphaModulatedImageRequest(RequestABC):
     loggingName = __name__ + ".AlphaModulatedImageRequest"
     logger = logging.getLogger(loggingName)
 
-    def __init__(self, arrayrequest, tintColor, normalize=(0, 255)):
+    def __init__(self, arrayrequest, tintColor, normalize=(0, 255), luts: Optional[LookupTables] = None):
         self._arrayreq = arrayrequest
         self._normalize = normalize
         self._tintColor = tintColor
+        self._luts = luts
 
     def wait(self):
         return self.toImage()
 
+    def submit(self):
+        self._arrayreq.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        self._arrayreq.add_done_callback(lambda _req: fn(self))
+
+    def cancel(self):
+        self._arrayreq.cancel()
+
     def toImage(self):
         t = time.time()
 
@@ -61,35 +80,27 @@ class AlphaModulatedImageRequest(RequestABC):
         a = self._arrayreq.wait()
         tWAIT = 1000.0 * (time.time() - tWAIT)
 
-        has_no_mask = not np.ma.is_masked(a)
-
-        tImg = None
-        if has_no_mask and _has_vigra and hasattr(vigra.colors, "gray2qimage_ARGB32Premultiplied"):
-            if not a.flags.contiguous:
-                a = a.copy()
-            tImg = time.time()
-            img = QImage(a.shape[1], a.shape[0], QImage.Format_ARGB32_Premultiplied)
+        normalize = normalization(self._normalize)
+
+        tImg = time.time()
+        img = QImage(a.shape[1], a.shape[0], QImage.Format_ARGB32_Premultiplied)
+        # vigra needs contiguous arrays without a mask; 8 and 16 bit data is mapped through a lookup table instead
+        if (
+            _has_vigra
+            and hasattr(vigra.colors, "alphamodulated2qimage_ARGB32Premultiplied")
+            and not np.ma.is_masked(a)
+            and a.flags["C_CONTIGUOUS"]
+            and not has_lookup_table(a.dtype)
+        ):
             tintColor = np.asarray(
                 [self._tintColor.redF(), self._tintColor.greenF(), self._tintColor.blueF()], dtype=np.float32
             )
-            normalize = np.asarray(self._normalize, dtype=np.float32)
-            if normalize[0] > normalize[1]:
-                normalize = np.array((0.0, 255.0)).astype(np.float32)
-            vigra.colors.alphamodulated2qimage_ARGB32Premultiplied(a, byte_view(img), tintColor, normalize)
-            tImg = 1000.0 * (time.time() - tImg)
+            n = np.asarray(normalize, dtype=np.float32)
+            vigra.colors.alphamodulated2qimage_ARGB32Premultiplied(np.ma.getdata(a), byte_view(img), tintColor, n)
         else:
-            if has_no_mask:
-                self.logger.warning("using unoptimized conversion functions")
-            tImg = time.time()
-            d = a[..., None].repeat(4, axis=-1)
-            d[:, :, 0] = d[:, :, 0] * self._tintColor.redF()
-            d[:, :, 1] = d[:, :, 1] * self._tintColor.greenF()
-            d[:, :, 2] = d[:, :, 2] * self._tintColor.blueF()
-
-            normalize = self._normalize
-            img = array2qimage(d, normalize)
-            img = img.convertToFormat(QImage.Format_ARGB32_Premultiplied)
-            tImg = 1000.0 * (time.time() - tImg)
+            kernel = partial(alpha_modulated_to_argb32, normalize=normalize, tint=self._tintColor)
+            render(a, argb32_view(img), kernel, self._luts, (normalize, self._tintColor.rgba()))
+        tImg = 1000.0 * (time.time() - tImg)
 
         if self.logger.isEnabledFor(logging.DEBUG):
             tTOT = 1000.0 * (time.time() - t)
@@ -1,18 +1,18 @@
 import logging
 import time
-from typing import TYPE_CHECKING
-import warnings
+from typing import TYPE_CHECKING, Optional
 
 import numpy as np
 from past.utils import old_div
 from qtpy.QtCore import QRect
 from qtpy.QtGui import QColor, QImage
-from qimage2ndarray import array2qimage, byte_view
+from qimage2ndarray import byte_view
 
 from volumina.pixelpipeline.interface import PlanarSliceSourceABC, RequestABC
-from volumina.slicingtools import rect2slicing
+from volumina.pixelpipeline.tilecache import LAYER_TILE_CACHE, hashable
 
-from ._base import ImageSource, log_request
+from ._base import ImageSource, RAW_ARRAY_CACHE, log_request
+from ._render import LookupTables, apply_colortable, argb32_view, has_lookup_table, palette_from_colortable, render
 
 _has_vigra = True
 try:
@@ -37,6 +37,8 @@ class ColortableImageSource(ImageSource):
         assert isinstance(arraySource2D, PlanarSliceSourceABC), "wrong type: %s" % str(type(arraySource2D))
         super(ColortableImageSource, self).__init__(layer.name, direct=layer.direct, priority=layer.priority)
         self._arraySource2D = arraySource2D
+        self._rawArrays = RAW_ARRAY_CACHE
+        self._rawArrays.register(self._arraySource2D)
         self._arraySource2D.isDirty.connect(self.setDirty)
 
         self._layer = layer
@@ -61,43 +63,50 @@ class ColortableImageSource(ImageSource):
             self._colorTable[i, 1] = color.green()
             self._colorTable[i, 2] = color.red()
             self._colorTable[i, 3] = color.alpha()
+        self._luts = LookupTables()
+        self._colorTableKey = self._colorTable.tobytes()
 
         self.isDirty.emit(QRect())  # empty rect == everything is dirty
 
     @log_request(logger)
     def request(self, qrect, along_through=None):
         assert isinstance(qrect, QRect)
-        s = rect2slicing(qrect)
-        req = self._arraySource2D.request(s, along_through)
-        return ColortableImageRequest(req, self._colorTable, self._layer.normalize[0], self.direct)
+        req = self._rawArrays.request(self._arraySource2D, qrect, along_through)
+        return ColortableImageRequest(req, self._colorTable, self._layer.normalize[0], self.direct, luts=self._luts)
+
+    def tileKey(self, qrect, along_through=None):
+        params = (type(self), self._colorTableKey, hashable(self._layer.normalize[0]))
+        return LAYER_TILE_CACHE.key([self._arraySource2D], qrect, along_through, params)
 
 
 class ColortableImageRequest(RequestABC):
     loggingName = __name__ + ".ColortableImageRequest"
     logger = logging.getLogger(loggingName)
 
-    def __init__(self, arrayrequest, colorTable, normalize, direct=False):
+    def __init__(self, arrayrequest, colorTable, normalize, direct=False, luts: Optional[LookupTables] = None):
+        """luts: cache for lookup tables, only valid for this colorTable"""
         self._arrayreq = arrayrequest
         self._colorTable = colorTable
         self.direct = direct
         self._normalize = normalize
+        self._luts = luts
         assert not normalize or len(normalize) == 2
 
     def wait(self):
         return self.toImage()
 
-    def toImage(self):
-        t = time.time()
-
-        tWAIT = time.time()
-        a = self._arrayreq.wait()
-        tWAIT = 1000.0 * (time.time() - tWAIT)
+    def submit(self):
+        self._arrayreq.submit()
+        return self
 
-        assert a.ndim == 2
+    def add_done_callback(self, fn):
+        self._arrayreq.add_done_callback(lambda _req: fn(self))
 
-        if a.dtype == np.bool_:
-            a = a.view(np.uint8)
+    def cancel(self):
+        self._arrayreq.cancel()
 
+    def _normalized(self, a):
+        """Map the normalize range of a to the colortable"""
         if self._normalize and self._normalize[0] < self._normalize[1]:
             nmin, nmax = self._normalize
             if nmin:
@@ -111,75 +120,79 @@ class ColortableImageRequest(RequestABC):
                 a = np.asanyarray(a, dtype=np.uint16)
             elif len(self._colorTable) <= 2**32:
                 a = np.asanyarray(a, dtype=np.uint32)
+        return a
+
+    def _applyColortableVigra(self, a, img):
+        # If we have a masked array with a non-trivial mask, ensure that mask is made transparent.
+        _colorTable = self._colorTable
+        if np.ma.is_masked(a):
+            # labels are shifted in place below, keep the array of the request intact
+            a = a.copy()
+            # Add transparent color at the beginning of the colortable as needed.
+            if _colorTable[0, 3] != 0:
+                # If label 0 is unused, it can be transparent. Otherwise, the transparent color must be inserted.
+                if a.min() == 0:
+                    # If it will overflow simply promote the type. Unless we have reached the max VIGRA type.
+                    if a.max() == np.iinfo(a.dtype).max:
+                        a_new_dtype = np.min_scalar_type(np.iinfo(a.dtype).max + 1)
+                        if a_new_dtype <= np.dtype(np.uint32):
+                            a = np.asanyarray(a, dtype=a_new_dtype)
+                        else:
+                            assert np.iinfo(a.dtype).max >= len(_colorTable), (
+                                "This is a very large colortable. If it is indeed needed, add a transparent"
+                                + " color at the beginning of the colortable for displaying masked arrays."
+                            )
+
+                            # Try to wrap the max value to a smaller value of the same color.
+                            a[a == np.iinfo(a.dtype).max] %= len(_colorTable)
+
+                    # Insert space for transparent color and shift labels up.
+                    _colorTable = np.insert(_colorTable, 0, 0, axis=0)
+                    a[:] = a + 1
+                else:
+                    # Make sure the first color is transparent.
+                    _colorTable = _colorTable.copy()
+                    _colorTable[0] = 0
+
+            # Make masked values transparent.
+            a = np.ma.filled(a, 0)
+
+        a = vigra.taggedView(a, "xy")
+        vigra.colors.applyColortable(a, _colorTable, byte_view(img))
+
+    def toImage(self):
+        t = time.time()
+
+        tWAIT = time.time()
+        a = self._arrayreq.wait()
+        tWAIT = 1000.0 * (time.time() - tWAIT)
+
+        assert a.ndim == 2
+
+        if a.dtype == np.bool_:
+            a = a.view(np.uint8)
 
-        # Use vigra if possible (much faster)
-        tImg = None
-        if _has_vigra and hasattr(vigra.colors, "applyColortable"):
-            tImg = time.time()
-            img = QImage(a.shape[1], a.shape[0], QImage.Format_ARGB32)
+        tImg = time.time()
+        img = QImage(a.shape[1], a.shape[0], QImage.Format_ARGB32)
+        palette = palette_from_colortable(self._colorTable)
+        if has_lookup_table(a.dtype):
+            # the lookup table covers both normalization and colortable
+            kernel = lambda data, out: apply_colortable(self._normalized(data), palette, out)
+            params = tuple(self._normalize) if self._normalize else None
+            render(a, argb32_view(img), kernel, self._luts, params)
+        else:
+            a = self._normalized(a)
             if not issubclass(a.dtype.type, np.integer):
-                raise NotImplementedError()
                 # FIXME: maybe this should be done in a better way using an operator before the colortable request which properly handles
                 # this problem
-                warnings.warn("Data for colortable layers cannot be float, casting", RuntimeWarning)
-                a = np.asanyarray(a, dtype=np.uint32)
+                raise NotImplementedError()
 
-            # If we have a masked array with a non-trivial mask, ensure that mask is made transparent.
-            _colorTable = self._colorTable
-            if np.ma.is_masked(a):
-                # Add transparent color at the beginning of the colortable as needed.
-                if _colorTable[0, 3] != 0:
-                    # If label 0 is unused, it can be transparent. Otherwise, the transparent color must be inserted.
-                    if a.min() == 0:
-                        # If it will overflow simply promote the type. Unless we have reached the max VIGRA type.
-                        if a.max() == np.iinfo(a.dtype).max:
-                            a_new_dtype = np.min_scalar_type(np.iinfo(a.dtype).max + 1)
-                            if a_new_dtype <= np.dtype(np.uint32):
-                                a = np.asanyarray(a, dtype=a_new_dtype)
-                            else:
-                                assert np.iinfo(a.dtype).max >= len(_colorTable), (
-                                    "This is a very large colortable. If it is indeed needed, add a transparent"
-                                    + " color at the beginning of the colortable for displaying masked arrays."
-                                )
-
-                                # Try to wrap the max value to a smaller value of the same color.
-                                a[a == np.iinfo(a.dtype).max] %= len(_colorTable)
-
-                        # Insert space for transparent color and shift labels up.
-                        _colorTable = np.insert(_colorTable, 0, 0, axis=0)
-                        a[:] = a + 1
-                    else:
-                        # Make sure the first color is transparent.
-                        _colorTable = _colorTable.copy()
-                        _colorTable[0] = 0
-
-                # Make masked values transparent.
-                a = np.ma.filled(a, 0)
-
-            if a.dtype in (np.uint64, np.int64):
-                # FIXME: applyColortable() doesn't support 64-bit, so just truncate
-                a = a.astype(np.uint32)
-
-            a = vigra.taggedView(a, "xy")
-            vigra.colors.applyColortable(a, _colorTable, byte_view(img))
-            tImg = 1000.0 * (time.time() - tImg)
-
-        # Without vigra, do it the slow way
-        else:
-            raise NotImplementedError()
-            if _has_vigra:
-                # If this warning is annoying you, try this:
-                # warnings.filterwarnings("once")
-                warnings.warn("Using slow colortable images.  Upgrade to VIGRA > 1.9 to use faster implementation.")
-
-            # make sure that a has values in range [0, colortable_length)
-            a = np.remainder(a, len(self._colorTable))
-            # apply colortable
-            colortable = np.roll(
-                np.fliplr(self._colorTable), -1, 1
-            )  # self._colorTable is BGRA, but array2qimage wants RGBA
-            img = colortable[a]
-            img = array2qimage(img)
+            # applyColortable() doesn't support 64-bit labels, these are wrapped into the colortable by numpy
+            if _has_vigra and hasattr(vigra.colors, "applyColortable") and a.dtype.itemsize <= 4:
+                self._applyColortableVigra(a, img)
+            else:
+                apply_colortable(a, palette, argb32_view(img))
+        tImg = 1000.0 * (time.time() - tImg)
 
         if self.logger.isEnabledFor(logging.DEBUG):
             tTOT = 1000.0 * (time.time() - t)
@@ -1,17 +1,18 @@
 import logging
 import time
-from typing import TYPE_CHECKING
-import warnings
+from functools import partial
+from typing import TYPE_CHECKING, Optional
 
 import numpy as np
 from qtpy.QtCore import QRect
 from qtpy.QtGui import QImage
-from qimage2ndarray import byte_view, gray2qimage
+from qimage2ndarray import byte_view
 
 from volumina.pixelpipeline.interface import PlanarSliceSourceABC, RequestABC
-from volumina.slicingtools import rect2slicing
+from volumina.pixelpipeline.tilecache import LAYER_TILE_CACHE, hashable
 
-from ._base import ImageSource, log_request
+from ._base import ImageSource, RAW_ARRAY_CACHE, log_request
+from ._render import LookupTables, argb32_view, has_lookup_table, normalization, normalize_to_argb32, render
 
 _has_vigra = True
 try:
@@ -38,7 +39,10 @@ class GrayscaleImageSource(ImageSource):
         self._arraySource2D = arraySource2D
 
         self._layer = layer
+        self._luts = LookupTables()
 
+        self._rawArrays = RAW_ARRAY_CACHE
+        self._rawArrays.register(self._arraySource2D)
         self._arraySource2D.isDirty.connect(self.setDirty)
         if hasattr(self._layer, "normalizeChanged"):
             self._layer.normalizeChanged.connect(lambda: self.setDirty((slice(None, None), slice(None, None))))
@@ -46,23 +50,37 @@ class GrayscaleImageSource(ImageSource):
     @log_request(logger)
     def request(self, qrect, along_through=None):
         assert isinstance(qrect, QRect)
-        s = rect2slicing(qrect)
-        req = self._arraySource2D.request(s, along_through)
-        return GrayscaleImageRequest(req, self._layer.normalize[0], direct=self.direct)
+        req = self._rawArrays.request(self._arraySource2D, qrect, along_through)
+        return GrayscaleImageRequest(req, self._layer.normalize[0], direct=self.direct, luts=self._luts)
+
+    def tileKey(self, qrect, along_through=None):
+        params = (type(self), hashable(self._layer.normalize[0]))
+        return LAYER_TILE_CACHE.key([self._arraySource2D], qrect, along_through, params)
 
 
 class GrayscaleImageRequest(RequestABC):
     loggingName = __name__ + ".GrayscaleImageRequest"
     logger = logging.getLogger(loggingName)
 
-    def __init__(self, arrayrequest, normalize=None, direct=False):
+    def __init__(self, arrayrequest, normalize=None, direct=False, luts: Optional[LookupTables] = None):
         self._arrayreq = arrayrequest
         self._normalize = normalize
         self.direct = direct
+        self._luts = luts
 
     def wait(self):
         return self.toImage()
 
+    def submit(self):
+        self._arrayreq.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        self._arrayreq.add_done_callback(lambda _req: fn(self))
+
+    def cancel(self):
+        self._arrayreq.cancel()
+
     def toImage(self):
         t = time.time()
 
@@ -72,52 +90,25 @@ class GrayscaleImageRequest(RequestABC):
 
         assert a.ndim == 2, "GrayscaleImageRequest.toImage(): result has shape %r, which is not 2-D" % (a.shape,)
 
-        normalize = self._normalize
-        if not normalize:
-            normalize = [0, 255]
-
-        # FIXME: It is obviously wrong to truncate like this (right?)
-        if a.dtype == np.uint64 or a.dtype == np.int64:
-            warnings.warn("Truncating 64-bit pixels for display")
-            if a.dtype == np.uint64:
-                a = np.asanyarray(a, np.uint32)
-            elif a.dtype == np.int64:
-                a = np.asanyarray(a, np.int32)
-
-        if a.dtype == np.bool_:
-            a = a.view(np.uint8)
-
-        has_no_mask = not np.ma.is_masked(a)
-
-        #
-        # new conversion
-        #
-        tImg = None
-        if has_no_mask and _has_vigra and hasattr(vigra.colors, "gray2qimage_ARGB32Premultiplied"):
-            if (
-                not self._normalize or self._normalize[0] >= self._normalize[1] or self._normalize == [0, 0]
-            ):  # FIXME: fix volumina conventions
-                n = np.asarray([0, 255], dtype=np.float32)
-            else:
-                n = np.asarray(self._normalize, dtype=np.float32)
-            tImg = time.time()
-            img = QImage(a.shape[1], a.shape[0], QImage.Format_ARGB32_Premultiplied)
-            if not a.flags["C_CONTIGUOUS"]:
-                a = a.copy()
-            vigra.colors.gray2qimage_ARGB32Premultiplied(a, byte_view(img), n)
-            tImg = 1000.0 * (time.time() - tImg)
+        # FIXME: fix volumina conventions
+        normalize = normalization(self._normalize)
+
+        tImg = time.time()
+        img = QImage(a.shape[1], a.shape[0], QImage.Format_ARGB32_Premultiplied)
+        # vigra needs contiguous arrays without a mask; 8 and 16 bit data is mapped through a lookup table instead
+        if (
+            _has_vigra
+            and hasattr(vigra.colors, "gray2qimage_ARGB32Premultiplied")
+            and not np.ma.is_masked(a)
+            and a.flags["C_CONTIGUOUS"]
+            and not has_lookup_table(a.dtype)
+            and a.dtype.itemsize <= 4
+        ):
+            n = np.asarray(normalize, dtype=np.float32)
+            vigra.colors.gray2qimage_ARGB32Premultiplied(np.ma.getdata(a), byte_view(img), n)
         else:
-            if has_no_mask:
-                self.logger.warning("using slow image creation function")
-            tImg = time.time()
-            if self._normalize:
-                # clipping has been implemented in this commit,
-                # but it is not yet available in the packages obtained via easy_install
-                # http://www.informatik.uni-hamburg.de/~meine/hg/qimage2ndarray/diff/fcddc70a6dea/qimage2ndarray/__init__.py
-                a = np.clip(a, *self._normalize)
-            img = gray2qimage(a, self._normalize)
-            ret = img.convertToFormat(QImage.Format_ARGB32_Premultiplied)
-            tImg = 1000.0 * (time.time() - tImg)
+            render(a, argb32_view(img), partial(normalize_to_argb32, normalize=normalize), self._luts, normalize)
+        tImg = 1000.0 * (time.time() - tImg)
 
         if self.logger.isEnabledFor(logging.DEBUG):
             tTOT = 1000.0 * (time.time() - t)
@@ -0,0 +1,118 @@
+import logging
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+from qtpy.QtCore import QRect
+from qtpy.QtGui import QImage
+
+from volumina.pixelpipeline.interface import PlanarSliceSourceABC, RequestABC
+
+from volumina.pixelpipeline.tilecache import LAYER_TILE_CACHE, hashable
+
+from ._base import ImageSource, RAW_ARRAY_CACHE, log_request
+from ._render import additive_composite, argb32_view, normalization
+
+if TYPE_CHECKING:
+    from volumina.layer import MultiChannelCompositeLayer
+
+
+logger = logging.getLogger(__name__)
+
+
+class MultiChannelCompositeImageSource(ImageSource):
+    """Renders all channels of a slice source in one image
+
+    The channels of a tile are fetched together; changing the per-channel
+    display settings of the layer renders them again without fetching.
+    """
+
+    def __init__(self, arraySource2D, layer: "MultiChannelCompositeLayer"):
+        assert isinstance(arraySource2D, PlanarSliceSourceABC), "wrong type: %s" % str(type(arraySource2D))
+        super().__init__(layer.name, direct=layer.direct, priority=layer.priority)
+        self._arraySource2D = arraySource2D
+        self._layer = layer
+
+        self._rawArrays = RAW_ARRAY_CACHE
+        self._rawArrays.register(self._arraySource2D)
+        self._arraySource2D.isDirty.connect(self.setDirty)
+        self._layer.channelSettingsChanged.connect(lambda: self.setDirty((slice(None, None), slice(None, None))))
+
+    @log_request(logger)
+    def request(self, qrect, along_through=None):
+        assert isinstance(qrect, QRect)
+        req = self._rawArrays.request(self._arraySource2D, qrect, along_through, channels=True)
+        layer = self._layer
+        channels = [c for c in range(layer.numberOfChannels) if layer.channelVisible[c]]
+        ranges = [normalization(layer.normalize[c]) for c in channels]
+        colors = [layer.tintColors[c].getRgbF()[:3] for c in channels]
+        return MultiChannelCompositeImageRequest(req, channels, ranges, colors, direct=self.direct)
+
+    def tileKey(self, qrect, along_through=None):
+        layer = self._layer
+        channels = tuple(c for c in range(layer.numberOfChannels) if layer.channelVisible[c])
+        params = (
+            type(self),
+            channels,
+            tuple(normalization(layer.normalize[c]) for c in channels),
+            tuple(layer.tintColors[c].rgba() for c in channels),
+        )
+        return LAYER_TILE_CACHE.key([self._arraySource2D], qrect, along_through, params)
+
+
+class MultiChannelCompositeImageRequest(RequestABC):
+    loggingName = __name__ + ".MultiChannelCompositeImageRequest"
+    logger = logging.getLogger(loggingName)
+
+    def __init__(self, arrayrequest, channels, ranges, colors, direct=False):
+        """arrayrequest: request for a (x, y, channel) array
+
+        channels: indices of the channels that are blended
+        ranges: (min, max) mapped to the full intensity, per blended channel
+        colors: (r, g, b) tint in 0..1, per blended channel
+        """
+        self._arrayreq = arrayrequest
+        self._channels = list(channels)
+        self._ranges = ranges
+        self._colors = colors
+        self.direct = direct
+
+    def wait(self):
+        return self.toImage()
+
+    def submit(self):
+        self._arrayreq.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        self._arrayreq.add_done_callback(lambda _req: fn(self))
+
+    def cancel(self):
+        self._arrayreq.cancel()
+
+    def toImage(self):
+        t = time.time()
+
+        tWAIT = time.time()
+        a = self._arrayreq.wait()
+        tWAIT = 1000.0 * (time.time() - tWAIT)
+
+        assert a.ndim == 3, "MultiChannelCompositeImageRequest.toImage(): result has shape %r, which is not 3-D" % (
+            a.shape,
+        )
+
+        tImg = time.time()
+        img = QImage(a.shape[1], a.shape[0], QImage.Format_ARGB32_Premultiplied)
+        if self._channels != list(range(a.shape[-1])):
+            a = a[..., self._channels]
+        additive_composite(a, argb32_view(img), self._ranges, self._colors)
+        tImg = 1000.0 * (time.time() - tImg)
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            tTOT = 1000.0 * (time.time() - t)
+            self.logger.debug(
+                "toImage (%dx%d, %d channels) took %f msec. (array wait: %f, img: %f)"
+                % (img.width(), img.height(), len(self._channels), tTOT, tWAIT, tImg)
+            )
+
+        return img
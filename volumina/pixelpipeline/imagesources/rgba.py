@@ -1,15 +1,19 @@
 import logging
+import threading
+from functools import partial
 from typing import TYPE_CHECKING
 
 import numpy as np
 from qtpy.QtCore import QRect
 from qtpy.QtGui import QImage
-from qimage2ndarray import array2qimage
 
+from volumina.pixelpipeline.datasources.constantsource import ConstantSource
 from volumina.pixelpipeline.interface import PlanarSliceSourceABC, RequestABC
+from volumina.pixelpipeline.tilecache import LAYER_TILE_CACHE, hashable
 from volumina.slicingtools import rect2slicing, slicing2shape
 
-from ._base import ImageSource, log_request
+from ._base import ImageSource, RAW_ARRAY_CACHE, log_request
+from ._render import LookupTables, argb32_view, channel_to_uint8, premultiply, render
 
 _has_vigra = True
 try:
@@ -42,46 +46,128 @@ class RGBAImageSource(ImageSource):
             layer.name, guarantees_opaqueness=guarantees_opaqueness, priority=layer.priority
         )
         self._channels = channels
+        self._rawArrays = RAW_ARRAY_CACHE
+        self._luts = LookupTables(maxsize=16)
         for arraySource in self._channels:
+            self._rawArrays.register(arraySource)
             arraySource.isDirty.connect(self.setDirty)
 
     @log_request(logger)
     def request(self, qrect, along_through=None):
         assert isinstance(qrect, QRect)
         s = rect2slicing(qrect)
-        r = self._channels[0].request(s, along_through)
-        g = self._channels[1].request(s, along_through)
-        b = self._channels[2].request(s, along_through)
-        a = self._channels[3].request(s, along_through)
         shape = list(slicing2shape(s))
         assert len(shape) == 2
         assert all([x > 0 for x in shape])
-        return RGBAImageRequest(r, g, b, a, shape, *self._layer._normalize)
+        r, g, b, a = (self._channelRequest(channel, qrect, along_through) for channel in self._channels)
+        return RGBAImageRequest(r, g, b, a, shape, *self._layer._normalize, luts=self._luts)
+
+    def tileKey(self, qrect, along_through=None):
+        # missing channels are keyed by their constant, they are made for each view
+        fetched = []
+        constants = []
+        for channel in self._channels:
+            datasource = getattr(channel, "datasource", None)
+            if isinstance(datasource, ConstantSource):
+                constants.append((datasource.constant, np.dtype(datasource.dtype()).str))
+            else:
+                fetched.append(channel)
+                constants.append(None)
+        params = (type(self), tuple(constants), hashable(self._layer._normalize))
+        return LAYER_TILE_CACHE.key(fetched, qrect, along_through, params)
+
+    def _channelRequest(self, channel, qrect, along_through):
+        datasource = getattr(channel, "datasource", None)
+        if isinstance(datasource, ConstantSource):
+            # missing channels are filled with a constant, there is nothing to fetch
+            return np.asarray(datasource.constant, dtype=datasource.dtype())
+        return self._rawArrays.request(channel, qrect, along_through)
 
 
 class RGBAImageRequest(RequestABC):
-    def __init__(self, r, g, b, a, shape, normalizeR=None, normalizeG=None, normalizeB=None, normalizeA=None):
-        self._requests = r, g, b, a
+    def __init__(
+        self, r, g, b, a, shape, normalizeR=None, normalizeG=None, normalizeB=None, normalizeA=None, luts=None
+    ):
+        """r, g, b, a: array requests, or 0-d arrays for channels that are constant
+
+        luts: cache for the lookup tables of 8 and 16 bit channels
+        """
+        self._channels = r, g, b, a
+        self._requests = [c for c in self._channels if isinstance(c, RequestABC)]
         self._normalize = [n or None for n in [normalizeR, normalizeG, normalizeB, normalizeA]]
-        shape.append(4)
-        self._data = np.empty(shape, dtype=np.uint8)
-        self._requestsFinished = 4 * [False]
+        self._shape = tuple(shape[:2])
+        self._luts = luts
 
     def wait(self):
         for req in self._requests:
             req.wait()
         return self.toImage()
 
+    def submit(self):
+        for req in self._requests:
+            req.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        if not self._requests:
+            fn(self)
+            return
+
+        # fn is called once, after the last of the channel requests has finished
+        pending = [len(self._requests)]
+        lock = threading.Lock()
+
+        def _on_channel_done(_req):
+            with lock:
+                pending[0] -= 1
+                done = pending[0] == 0
+            if done:
+                fn(self)
+
+        for req in self._requests:
+            req.add_done_callback(_on_channel_done)
+
+    def cancel(self):
+        for req in self._requests:
+            req.cancel()
+
+    def _channel(self, i, alpha=255):
+        """8 bit values of channel i premultiplied with a constant alpha, an int for constant channels"""
+        kernel = partial(channel_to_uint8, normalize=self._normalize[i], alpha=alpha)
+        channel = self._channels[i]
+        if not isinstance(channel, RequestABC):
+            value = np.empty(1, dtype=np.uint32)
+            kernel(np.reshape(channel, 1), value)
+            return int(value[0])
+
+        data = channel.wait()
+        assert data.shape == self._shape, "channel %d has shape %r, expected %r" % (i, data.shape, self._shape)
+        out = np.empty(self._shape, dtype=np.uint32)
+        normalize = tuple(self._normalize[i]) if self._normalize[i] is not None else None
+        if data.dtype == np.uint8 and normalize is None and alpha == 255 and not np.ma.is_masked(data):
+            # identity lookup table
+            np.copyto(out, np.ma.getdata(data))
+        else:
+            render(data, out, kernel, self._luts, (normalize, alpha))
+        return out
+
     def toImage(self):
-        for i, req in enumerate(self._requests):
-            a = req.wait()
-            normalize = self._normalize[i]
-            if normalize is not None and normalize[0] < normalize[1]:
-                a = a.astype(np.float32)
-                a = (a - normalize[0]) * 255.0 / (normalize[1] - normalize[0])
-                a[a > 255] = 255
-                a[a < 0] = 0
-                a = a.astype(np.uint8)
-            self._data[:, :, i] = a
-        img = array2qimage(self._data)
-        return img.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        img = QImage(self._shape[1], self._shape[0], QImage.Format_ARGB32_Premultiplied)
+        out = argb32_view(img)
+
+        alpha = self._channel(3)
+        np.left_shift(alpha, 24, out=out, casting="unsafe")
+        if isinstance(alpha, int):
+            # constant alpha is folded into the lookup tables of the color channels
+            colors = [self._channel(i, alpha) for i in range(3)]
+        else:
+            colors = [self._channel(i) for i in range(3)]
+            colors = [premultiply(c, alpha, np.empty(self._shape, dtype=np.uint32)) for c in colors]
+
+        for color, shift in zip(colors, (16, 8, 0)):
+            if isinstance(color, int):
+                out |= color << shift
+            else:
+                color <<= shift
+                out |= color
+        return img
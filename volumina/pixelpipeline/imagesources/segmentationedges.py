@@ -26,8 +26,8 @@ from qtpy.QtCore import QRect
 
 from volumina.pixelpipeline.interface import RequestABC
 from volumina.slicingtools import rect2slicing
-from volumina.utility import execute_in_main_thread
-from volumina.utility.segmentationEdgesItem import SegmentationEdgesItem, generate_path_items_for_labels
+from volumina.utility import execute_in_main_thread_batched
+from volumina.utility.segmentationEdgesItem import SegmentationEdgesItem, TileEdges
 
 from ._base import ImageSource
 
@@ -68,6 +68,16 @@ class SegmentationEdgesItemRequest(RequestABC):
         self._layer = layer
         self._hoverIdChanged = hoverIdChanged
 
+    def submit(self):
+        self._arrayreq.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        self._arrayreq.add_done_callback(lambda _req: fn(self))
+
+    def cancel(self):
+        self._arrayreq.cancel()
+
     def wait(self):
         array_data = self._arrayreq.wait()
 
@@ -75,19 +85,15 @@ class SegmentationEdgesItemRequest(RequestABC):
         # with a halo so that the QGraphicsItem can display edges on tile borders.
         # assert array_data.shape == (self.rect.width(), self.rect.height())
 
-        def create():
-            # Construct the path items
-            # This *could* be done outside of this create() function (and thus outside of the main thread),
-            # but (1) that seems to cause crashes on shutdown,
-            # and (2) performance gets worse, not better.
-            path_items = generate_path_items_for_labels(
-                self._layer.pen_table, self._layer.default_pen, array_data, None, isClickable=self._layer._isClickable
-            )
+        # The expensive part, finding the edges and sorting their segments for painting and
+        # hit testing, only involves numpy and is done here in the worker thread.
+        tile_edges = TileEdges.from_labels(array_data)
 
+        def create():
             # All SegmentationEdgesItem(s) associated with this layer will share a common pen table.
             # They react immediately when the pen table is updated.
             graphics_item = SegmentationEdgesItem(
-                path_items,
+                tile_edges,
                 self._layer.pen_table,
                 self._layer.default_pen,
                 hoverIdChanged=self._hoverIdChanged,
@@ -101,5 +107,5 @@ class SegmentationEdgesItemRequest(RequestABC):
 
         # We're probably running in a non-main thread right now,
         # but we're only allowed to create QGraphicsItemObjects in the main thread.
-
-        return execute_in_main_thread(create)
+        # Tiles finishing at about the same time are wrapped in a single event.
+        return execute_in_main_thread_batched(create)
@@ -21,19 +21,61 @@
 ###############################################################################
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from typing import Callable, Optional
 
 
 from volumina.utility.qabc import QABC, abstractsignal
 
 
-__all__ = ["DataSourceABC", "RequestABC", "ImageSourceABC", "PlanarSliceSourceABC", "IndeterminateRequestError"]
+__all__ = [
+    "DataSourceABC",
+    "RequestABC",
+    "ImageSourceABC",
+    "PlanarSliceSourceABC",
+    "IndeterminateRequestError",
+    "RequestCancelledError",
+]
 
 
 class RequestABC(ABC):
+    """
+    A (possibly lazy) computation of a result.
+
+    Besides the blocking wait(), requests support a non-blocking protocol:
+    submit() starts the computation, and callbacks registered with
+    add_done_callback() are invoked once wait() will return without blocking.
+
+    The default implementations below are suitable for requests that compute
+    their result synchronously. Requests wrapping other requests should
+    forward submit() and add_done_callback() to them.
+    """
+
     @abstractmethod
     def wait(self):
         """waits until completion and returns result"""
 
+    def submit(self) -> "RequestABC":
+        """starts computation without blocking; returns self"""
+        return self
+
+    def add_done_callback(self, fn: Callable[["RequestABC"], None]) -> None:
+        """
+        Calls fn(self) once the request has finished (successfully or not).
+
+        fn is called from whichever thread finishes the request. For synchronous
+        requests this is the calling thread, i.e. fn is called immediately.
+        """
+        fn(self)
+
+    def cancel(self) -> None:
+        """
+        Cancels computation, if possible.
+
+        Requests wrapping other requests forward the cancellation. Requests that
+        may be shared between several requesters only cancel their underlying
+        computation once every requester has cancelled.
+        """
+
 
 class ImageSourceABC(QABC):
     """
@@ -84,10 +126,25 @@ class IndeterminateRequestError(Exception):
     pass
 
 
+class RequestCancelledError(Exception):
+    """
+    Raised by wait() of a request whose computation has been cancelled.
+    The requester is expected to ignore the error; whoever cancelled the
+    request is responsible for re-requesting the data if it is still needed.
+    """
+
+    pass
+
+
 class DataSourceABC(QABC):
     isDirty = abstractsignal(object)
     numberOfChannelsChanged = abstractsignal(int)
 
+    # Identifies the content of the source across sessions, e.g. a hash of the computation
+    # producing it; CacheSource keeps the data of sources with a fingerprint in the disk cache
+    # until the source becomes dirty; it is persisted again once the fingerprint has changed
+    fingerprint: Optional[str] = None
+
     @property
     @abstractmethod
     def numberOfChannels(self) -> int: ...
@@ -40,11 +40,15 @@ logger = logging.getLogger(__name__)
 
 
 class PlanarSliceRequest(RequestABC):
-    def __init__(self, domainArrayRequest, sliceProjection):
+    def __init__(self, domainArrayRequest, sliceProjection, stackAxis=None):
+        """stackAxis: along axis that is kept as the last axis of the result, see SliceProjection.stack"""
         self._ar = domainArrayRequest
         self._sp = sliceProjection
+        self._stackAxis = stackAxis
 
     def wait(self):
+        if self._stackAxis is not None:
+            return self._sp.stack(self._ar.wait(), self._stackAxis)
         return self._sp(self._ar.wait())
 
     def cancel(self):
@@ -54,6 +58,9 @@ class PlanarSliceRequest(RequestABC):
         self._ar.submit()
         return self
 
+    def add_done_callback(self, fn):
+        self._ar.add_done_callback(lambda _req: fn(self))
+
     def adjustPriority(self, delta):
         self._ar.adjustPriority(delta)
         return self
@@ -76,6 +83,10 @@ class PlanarSliceSource(QObject, PlanarSliceSourceABC):
     def id(self):
         return (self, tuple(self._through))
 
+    @property
+    def datasource(self) -> DataSourceABC:
+        return self._datasource
+
     @property
     def through(self):
         return list(self._through)  # make a copy
@@ -126,6 +137,35 @@ class PlanarSliceSource(QObject, PlanarSliceSourceABC):
         Returns: a SliceRequest for a 2d array
 
         """
+        slicing = self._domainSlicing(slicing2D, along_through)
+
+        if CONFIG.verbose_pixelpipeline:
+            logger.info(
+                "PlanarSliceSource requests '%r' from data source '%s'", slicing, type(self._datasource).__qualname__
+            )
+
+        return PlanarSliceRequest(self._datasource.request(slicing), self.sliceProjection)
+
+    def requestChannels(self, slicing2D, along_through=None):
+        """Return a request for all channels of a subregion of the slice at once.
+
+        Like request(), but the result is a 3d array with the channels along
+        the last axis. The channel axis is the last along axis (tzyxc order).
+
+        """
+        channelAxis = self.sliceProjection.along[-1]
+        slicing = list(self._domainSlicing(slicing2D, along_through))
+        slicing[channelAxis] = slice(0, self._datasource.numberOfChannels)
+        slicing = tuple(slicing)
+
+        if CONFIG.verbose_pixelpipeline:
+            logger.info(
+                "PlanarSliceSource requests '%r' from data source '%s'", slicing, type(self._datasource).__qualname__
+            )
+
+        return PlanarSliceRequest(self._datasource.request(slicing), self.sliceProjection, stackAxis=channelAxis)
+
+    def _domainSlicing(self, slicing2D, along_through=None):
         assert len(slicing2D) == 2
         # override through with caller values
         if along_through:
@@ -135,14 +175,7 @@ class PlanarSliceSource(QObject, PlanarSliceSourceABC):
         else:
             through = tuple(self._through)
 
-        slicing = self.sliceProjection.domain(through, slicing2D[0], slicing2D[1])
-
-        if CONFIG.verbose_pixelpipeline:
-            logger.info(
-                "PlanarSliceSource requests '%r' from data source '%s'", slicing, type(self._datasource).__qualname__
-            )
-
-        return PlanarSliceRequest(self._datasource.request(slicing), self.sliceProjection)
+        return self.sliceProjection.domain(through, slicing2D[0], slicing2D[1])
 
     def setDirty(self, slicing):
         assert isinstance(slicing, tuple)
@@ -0,0 +1,367 @@
+"""Rendered layer tiles shared by all tile providers of the process
+
+Synchronized editors (e.g. the three orthogonal views, or several viewers of
+the same data) render the same layer tiles over and over. Image sources that
+can tell what a tile depends on (see `ImageSource.tileKey`) have their
+rendered tiles stored here, so a tile is fetched and rendered once and then
+reused by every view showing it.
+
+A tile key identifies the data sources by object, never by value, and
+includes a generation of each data source that is bumped whenever the data
+source reports a change; tiles rendered from outdated data can't be found
+anymore and are evicted as the cache fills up.
+
+Optionally, tiles evicted from the cache are kept compressed in a second,
+cold tier (see `CompressedTile`). Label and grayscale tiles shrink by an
+order of magnitude there, at the cost of decompressing them on the render
+threads when they are needed again; `LayerTileCache.stats` tells both.
+"""
+
+import threading
+import time
+import weakref
+import zlib
+from typing import Dict, Hashable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from qimage2ndarray import raw_view
+from qtpy.QtCore import QRect
+from qtpy.QtGui import QImage
+
+from volumina.config import CONFIG
+from volumina.pixelpipeline.interface import RequestABC
+from volumina.utility.cache import KVCache
+
+
+class _SourceToken:
+    """Stands in for a data source in tile keys, without keeping the data source alive"""
+
+    __slots__ = ("generation", "__weakref__")
+
+    def __init__(self):
+        self.generation = 0
+
+
+class TileKey(NamedTuple):
+    # (token, generation) of every data source the tile is rendered from
+    sources: Tuple[Tuple[_SourceToken, int], ...]
+    # everything else the rendered tile depends on: slices, tile rect, render parameters
+    rest: Hashable
+
+
+def hashable(value) -> Hashable:
+    """value with lists (e.g. normalization ranges) turned into tuples, recursively"""
+    if isinstance(value, (list, tuple)):
+        return tuple(hashable(v) for v in value)
+    return value
+
+
+class CachedTileRequest(RequestABC):
+    """Request for a tile that has been rendered before"""
+
+    def __init__(self, img: QImage):
+        self._img = img
+
+    def wait(self):
+        return self._img
+
+
+class CompressedTile:
+    """
+    A 32 bit QImage, stored compactly:
+
+    * tiles of a single gray value per pixel (and a constant alpha) as one byte per pixel,
+    * tiles with at most 256 colors (e.g. of colortable layers) as one palette index per pixel,
+    * other tiles as they are,
+
+    deflated at the fastest compression level.
+    """
+
+    GRAY, PALETTE, ARGB = range(3)
+
+    __slots__ = ("width", "height", "format", "kind", "palette", "data")
+
+    def __init__(self, width, height, format, kind, palette, data):
+        self.width = width
+        self.height = height
+        self.format = format
+        self.kind = kind
+        self.palette = palette
+        self.data = data
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.palette.nbytes
+
+    @property
+    def rawBytes(self) -> int:
+        """bytes taken by the uncompressed image"""
+        return self.width * self.height * 4
+
+    @classmethod
+    def compress(cls, img: QImage) -> Optional["CompressedTile"]:
+        """None for images that are not 32 bit"""
+        if img.isNull() or img.depth() != 32:
+            return None
+
+        pixels = raw_view(img)
+        alpha = pixels[0, 0] & np.uint32(0xFF000000)
+        gray = (pixels & np.uint32(0xFF)).astype(np.uint8)
+        if np.array_equal(pixels, alpha | gray * np.uint32(0x010101)):
+            kind, palette, plane = cls.GRAY, np.array([alpha], dtype=np.uint32), gray
+        else:
+            palette = None
+            # every 8th row tells most tiles with too many colors, without sorting all pixels
+            if len(np.unique(pixels[::8])) <= 256:
+                palette, indices = np.unique(pixels, return_inverse=True)
+            if palette is not None and len(palette) <= 256:
+                kind, plane = cls.PALETTE, indices.astype(np.uint8).reshape(pixels.shape)
+            else:
+                kind, palette, plane = cls.ARGB, np.empty(0, dtype=np.uint32), pixels
+
+        data = zlib.compress(np.ascontiguousarray(plane).tobytes(), 1)
+        return cls(img.width(), img.height(), img.format(), kind, palette, data)
+
+    def decompress(self) -> QImage:
+        img = QImage(self.width, self.height, self.format)
+        pixels = raw_view(img)
+        dtype = np.uint32 if self.kind == self.ARGB else np.uint8
+        plane = np.frombuffer(zlib.decompress(self.data), dtype=dtype).reshape(self.height, self.width)
+        if self.kind == self.GRAY:
+            pixels[:] = self.palette[0] | plane * np.uint32(0x010101)
+        elif self.kind == self.PALETTE:
+            pixels[:] = self.palette[plane]
+        else:
+            pixels[:] = plane
+        return img
+
+
+class CompressedTileRequest(RequestABC):
+    """Request for a tile that has been rendered before and is stored compressed
+
+    Decompresses the tile in wait(), i.e. on the thread fetching the tile.
+    """
+
+    def __init__(self, tile: CompressedTile, cache: "LayerTileCache", key: "TileKey"):
+        self._tile = tile
+        self._cache = cache
+        self._key = key
+
+    def wait(self):
+        return self._cache._thaw(self._key, self._tile)
+
+
+class TileCacheStats(NamedTuple):
+    """Memory taken by the tiers of a LayerTileCache and what finding tiles in them has cost"""
+
+    tiles: int
+    nbytes: int
+    cold_tiles: int
+    cold_nbytes: int
+    # what the cold tiles would take uncompressed
+    cold_raw_nbytes: int
+    hits: int
+    cold_hits: int
+    misses: int
+    # total time spent compressing evicted tiles and decompressing cold hits
+    compress_seconds: float
+    decompress_seconds: float
+
+    @property
+    def compression_ratio(self) -> float:
+        return self.cold_raw_nbytes / self.cold_nbytes if self.cold_nbytes else 1.0
+
+    @property
+    def cold_hit_latency(self) -> float:
+        """mean seconds it took to decompress a cold tile"""
+        return self.decompress_seconds / self.cold_hits if self.cold_hits else 0.0
+
+
+class _RecordingTileRequest(RequestABC):
+    """Forwards an image source request and stores the rendered tile in a LayerTileCache"""
+
+    def __init__(self, request: RequestABC, cache: "LayerTileCache", key: TileKey):
+        self._request = request
+        self._cache = cache
+        self._key = key
+
+    def wait(self):
+        img = self._request.wait()
+        self._cache.put(self._key, img)
+        return img
+
+    def submit(self):
+        self._request.submit()
+        return self
+
+    def add_done_callback(self, fn):
+        self._request.add_done_callback(lambda _req: fn(self))
+
+    def cancel(self):
+        self._request.cancel()
+
+
+class LayerTileCache:
+    """Rendered layer tiles (QImages) by tile key, bounded by their total size in bytes
+
+    With coldbytes, tiles evicted from the cache are compressed (on the thread
+    storing the new tile) and kept in a cold tier of that size.
+    """
+
+    def __init__(self, maxbytes: int, coldbytes: int = 0):
+        self._tiles = KVCache(maxbytes, getsizeof=lambda img: img.sizeInBytes())
+        self._cold = KVCache(coldbytes, getsizeof=lambda tile: tile.nbytes) if coldbytes > 0 else None
+        self._lock = threading.Lock()
+        # id(datasource) -> token, entries are removed when the data source is collected
+        self._tokens: Dict[int, _SourceToken] = {}
+        self._hits = self._cold_hits = self._misses = 0
+        self._compress_seconds = self._decompress_seconds = 0.0
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tiles.clear()
+            if self._cold is not None:
+                self._cold.clear()
+
+    def stats(self) -> TileCacheStats:
+        with self._lock:
+            cold = list(self._cold.values()) if self._cold is not None else []
+            return TileCacheStats(
+                tiles=len(self._tiles),
+                nbytes=self._tiles.currsize,
+                cold_tiles=len(cold),
+                cold_nbytes=sum(tile.nbytes for tile in cold),
+                cold_raw_nbytes=sum(tile.rawBytes for tile in cold),
+                hits=self._hits,
+                cold_hits=self._cold_hits,
+                misses=self._misses,
+                compress_seconds=self._compress_seconds,
+                decompress_seconds=self._decompress_seconds,
+            )
+
+    def sourceKey(self, datasource) -> Optional[Tuple[_SourceToken, int]]:
+        """(token, generation) standing for the current data of datasource, None if it can't be tracked"""
+        with self._lock:
+            token = self._tokens.get(id(datasource))
+            if token is not None:
+                return token, token.generation
+
+        token = _SourceToken()
+        try:
+            weakref.finalize(datasource, self._forget, id(datasource), token)
+            datasource.isDirty.connect(lambda *args: self._bump(token))
+        except (AttributeError, TypeError):
+            return None
+        with self._lock:
+            token = self._tokens.setdefault(id(datasource), token)
+            return token, token.generation
+
+    def _forget(self, source_id: int, token: _SourceToken) -> None:
+        with self._lock:
+            if self._tokens.get(source_id) is token:
+                del self._tokens[source_id]
+
+    def _bump(self, token: _SourceToken) -> None:
+        with self._lock:
+            token.generation += 1
+
+    def key(
+        self, sliceSources: Sequence, qrect: QRect, along_through=None, params: Hashable = None
+    ) -> Optional[TileKey]:
+        """Key of the tile qrect rendered with params from the slices of sliceSources
+
+        Returns None if one of the slice sources does not tell its data source
+        or position, such tiles are not shared.
+        """
+        sources = []
+        slices = []
+        for sliceSource in sliceSources:
+            datasource = getattr(sliceSource, "datasource", None)
+            projection = getattr(sliceSource, "sliceProjection", None)
+            through = getattr(sliceSource, "through", None)
+            if datasource is None or projection is None or through is None:
+                return None
+            source = self.sourceKey(datasource)
+            if source is None:
+                return None
+            for axis, value in along_through or ():
+                through[axis] = value
+            sources.append(source)
+            slices.append((projection.abscissa, projection.ordinate, tuple(projection.along), tuple(through)))
+        rect = (qrect.x(), qrect.y(), qrect.width(), qrect.height())
+        return TileKey(tuple(sources), (tuple(slices), rect, params))
+
+    def get(self, key: TileKey) -> Optional[QImage]:
+        with self._lock:
+            return self._tiles.get(key)
+
+    @staticmethod
+    def _current(key: TileKey) -> bool:
+        """Whether none of the data sources of key has changed since the key was made"""
+        return all(token.generation == generation for token, generation in key.sources)
+
+    def put(self, key: TileKey, img) -> None:
+        """Store img unless one of the data sources of key has changed since the key was made"""
+        size = img.sizeInBytes() if isinstance(img, QImage) else None
+        if size is None or size > self._tiles.maxsize:
+            return
+        evicted = []
+        with self._lock:
+            if not self._current(key):
+                return
+            if self._cold is not None:
+                self._tiles.pop(key, None)
+                self._cold.pop(key, None)
+                while self._tiles.currsize + size > self._tiles.maxsize:
+                    evicted.append(self._tiles.popitem())
+            self._tiles[key] = img
+        self._freeze(evicted)
+
+    def _freeze(self, tiles) -> None:
+        """Move the evicted (key, img) tiles to the cold tier"""
+        for key, img in tiles:
+            if not self._current(key):
+                continue
+            started = time.perf_counter()
+            tile = CompressedTile.compress(img)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._compress_seconds += elapsed
+                if tile is not None and tile.nbytes <= self._cold.maxsize and self._current(key):
+                    self._cold[key] = tile
+
+    def _thaw(self, key: TileKey, tile: CompressedTile) -> QImage:
+        """Decompress a tile of the cold tier and move it back into the cache"""
+        started = time.perf_counter()
+        img = tile.decompress()
+        with self._lock:
+            self._decompress_seconds += time.perf_counter() - started
+        self.put(key, img)
+        return img
+
+    def request(self, ims, qrect: QRect, along_through=None) -> RequestABC:
+        """Request the tile qrect of the image source ims, from memory if any view has rendered it before"""
+        tileKey = getattr(ims, "tileKey", None)
+        key = tileKey(qrect, along_through) if tileKey is not None else None
+        if key is None:
+            return ims.request(qrect, along_through)
+        with self._lock:
+            img = self._tiles.get(key)
+            tile = self._cold.get(key) if img is None and self._cold is not None else None
+            if img is not None:
+                self._hits += 1
+            elif tile is not None:
+                self._cold_hits += 1
+            else:
+                self._misses += 1
+        if img is not None:
+            return CachedTileRequest(img)
+        if tile is not None:
+            return CompressedTileRequest(tile, self, key)
+        return _RecordingTileRequest(ims.request(qrect, along_through), self, key)
+
+
+LAYER_TILE_CACHE = LayerTileCache(CONFIG.layer_tile_cache_size, CONFIG.cold_tile_cache_size)
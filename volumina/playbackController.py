@@ -0,0 +1,200 @@
+###############################################################################
+#   volumina: volume slicing and editing library
+#
+#       Copyright (C) 2011-2025, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+#          http://ilastik.org/license/
+###############################################################################
+import collections
+import time
+from typing import List, Optional, Sequence
+
+from qtpy.QtCore import QObject, Qt, QTimer, Signal
+
+from volumina.imageScene2D import ImageScene2D
+from volumina.positionModel import PositionModel
+
+
+class PlaybackController(QObject):
+    """
+    Plays the time axis of a PositionModel at a target frame rate.
+
+    The frames after the one shown (up to lookahead of them) are streamed into
+    the tile caches of the image scenes (see ImageScene2D.prefetchFrames), which
+    hold them like a ring buffer. A frame is shown once it is completely fetched
+    in all scenes; a frame that is not complete when it is due is counted as
+    dropped and the current frame is held, no frame is skipped.
+
+    While frames are dropped, the level of detail is lowered: the layers that
+    take longest to fetch are no longer fetched during playback, one more per
+    step (at least one layer is kept). It is raised again while playback keeps up.
+    """
+
+    playingChanged = Signal(bool)
+    statsChanged = Signal(float, int)  # achieved frames per second, dropped frames
+
+    # number of recent frames that decide about the level of detail
+    LOD_WINDOW = 10
+    # fraction of dropped frames in LOD_WINDOW that lowers the level of detail
+    LOD_DROP_RATIO = 0.25
+    # seconds over which the achieved frame rate is measured
+    FPS_WINDOW = 2.0
+
+    def __init__(
+        self,
+        posModel: PositionModel,
+        imageScenes: Sequence[ImageScene2D],
+        fps: float = 10.0,
+        lookahead: int = 8,
+        loop: bool = True,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self._posModel = posModel
+        self._scenes = list(imageScenes)
+        self.lookahead = lookahead
+        self.loop = loop
+
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._onTick)
+        self.setFps(fps)
+
+        self._lod = 0
+        self._recent = collections.deque(maxlen=self.LOD_WINDOW)  # whether each recent frame was shown in time
+        self._shown = collections.deque()  # times at which frames were shown
+        self._started = 0.0
+        self._dropped = 0
+
+    def fps(self) -> float:
+        return self._fps
+
+    def setFps(self, fps: float):
+        assert fps > 0, "fps must be positive"
+        self._fps = fps
+        self._timer.setInterval(max(1, round(1000.0 / fps)))
+
+    def isPlaying(self) -> bool:
+        return self._timer.isActive()
+
+    @property
+    def achievedFps(self) -> float:
+        """Frames shown per second, over the last FPS_WINDOW seconds of the playback"""
+        now = time.perf_counter()
+        while self._shown and now - self._shown[0] > self.FPS_WINDOW:
+            self._shown.popleft()
+        window = min(self.FPS_WINDOW, now - self._started)
+        return len(self._shown) / window if window > 0 else 0.0
+
+    @property
+    def droppedFrames(self) -> int:
+        """Frames that were not fetched in time since the playback started"""
+        return self._dropped
+
+    @property
+    def levelOfDetail(self) -> int:
+        """Number of layers left out to keep up with the frame rate, 0 for full detail"""
+        return self._lod
+
+    def play(self):
+        if self.isPlaying() or self._posModel.shape5D[0] < 2:
+            return
+        self._lod = 0
+        self._recent.clear()
+        self._shown.clear()
+        self._started = time.perf_counter()
+        self._dropped = 0
+        self._stream(self._posModel.time)
+        self._timer.start()
+        self.playingChanged.emit(True)
+
+    def stop(self):
+        if not self.isPlaying():
+            return
+        self._timer.stop()
+        for scene in self._scenes:
+            scene.prefetchFrames([])
+        self.playingChanged.emit(False)
+
+    def setPlaying(self, playing: bool):
+        if playing:
+            self.play()
+        else:
+            self.stop()
+
+    def _nextTime(self, t: int) -> Optional[int]:
+        """Time of the frame after t, None at the end of a playback that doesn't loop"""
+        t += 1
+        if t < self._posModel.shape5D[0]:
+            return t
+        return 0 if self.loop else None
+
+    def _upcoming(self, t: int) -> List[int]:
+        """Times of the frames after t that are streamed ahead"""
+        times = []
+        for _ in range(min(self.lookahead, self._posModel.shape5D[0] - 1)):
+            t = self._nextTime(t)
+            if t is None:
+                break
+            times.append(t)
+        return times
+
+    def _streamedLayers(self) -> Optional[List[int]]:
+        """Indexes of the layers fetched at the current level of detail, None for all"""
+        if self._lod == 0 or not self._scenes:
+            return None
+        scene = self._scenes[0]
+        n_layers = len(scene.stackedImageSources)
+        costs = sorted((scene.frameFetchSeconds([i]) or 0.0, i) for i in range(n_layers))
+        return sorted(i for _, i in costs[: max(1, n_layers - self._lod)])
+
+    def _stream(self, t: int):
+        layers = self._streamedLayers()
+        times = self._upcoming(t)
+        for scene in self._scenes:
+            scene.prefetchFrames(times, layers)
+
+    def _onTick(self):
+        t = self._nextTime(self._posModel.time)
+        if t is None:
+            self.stop()
+            return
+
+        layers = self._streamedLayers()
+        if all(scene.frameProgress(t, layers) >= 1.0 for scene in self._scenes):
+            self._posModel.time = t
+            self._shown.append(time.perf_counter())
+            self._recent.append(True)
+        else:
+            self._dropped += 1
+            self._recent.append(False)
+
+        self._adaptLevelOfDetail()
+        self._stream(self._posModel.time)
+        self.statsChanged.emit(self.achievedFps, self._dropped)
+
+    def _adaptLevelOfDetail(self):
+        if len(self._recent) < self.LOD_WINDOW:
+            return
+        dropped = self._recent.count(False)
+        n_layers = len(self._scenes[0].stackedImageSources) if self._scenes else 0
+        if dropped >= self.LOD_DROP_RATIO * self.LOD_WINDOW and self._lod < n_layers - 1:
+            self._lod += 1
+            self._recent.clear()
+        elif dropped == 0 and self._lod > 0:
+            self._lod -= 1
+            self._recent.clear()
@@ -44,6 +44,7 @@ class PositionModel(QObject):
     cursorPositionChanged = Signal(object, object)
     slicingPositionChanged = Signal(object, object)
     slicingPositionSettled = Signal(bool)
+    activeViewChanged = Signal(int)
 
     # When the user does not scroll through the stack for more than 300 ms,
     # we call the position 'settled', and slicingPositionSettled will be
@@ -82,11 +83,7 @@ class PositionModel(QObject):
         self._channel = 0
         self._shape5D = [0, 0, 0, 0, 0]
 
-        """
-        Index of the currently active view in [0,1,2].
-        A view is active when the mouse cursor hovered over it last.
-        """
-        self.activeView = 0
+        self._activeView = 0
         self._scrollTimer = QTimer()
         self._scrollTimer.setInterval(self.scrollDelay)
         self._scrollTimer.setSingleShot(True)
@@ -124,6 +121,21 @@ class PositionModel(QObject):
             return None
         return self._shape5D[1:4]
 
+    @property
+    def activeView(self):
+        """
+        Index of the currently active view in [0,1,2].
+        A view is active when the mouse cursor hovered over it last.
+        """
+        return self._activeView
+
+    @activeView.setter
+    def activeView(self, axis):
+        if axis == self._activeView:
+            return
+        self._activeView = axis
+        self.activeViewChanged.emit(axis)
+
     @property
     def time(self):
         """
@@ -272,6 +272,21 @@ class SliceProjection(object):
             projectedArray = np.swapaxes(projectedArray, 0, 1)
         return projectedArray
 
+    def stack(self, domainArray, axis):
+        """Projects the n-d slicing 'domainArray' to a stack of 2d slices along 'axis'
+
+        'axis' is one of the along axes, it becomes the last axis of the result.
+        """
+        assert axis in self.along, "axis %d is not an along axis %r" % (axis, self.along)
+        assert domainArray.ndim == self.domainDim, "ndim %d != %d" % (domainArray.ndim, self.domainDim)
+        slicing = self.domainDim * [0]
+        slicing[self._abscissa], slicing[self._ordinate], slicing[axis] = slice(None), slice(None), slice(None)
+
+        projectedArray = domainArray[tuple(slicing)]
+        # the remaining axes keep their order in the domain
+        order = sorted((self._abscissa, self._ordinate, axis))
+        return np.transpose(projectedArray, [order.index(a) for a in (self._abscissa, self._ordinate, axis)])
+
 
 # *******************************************************************************
 # T e s t                                                                      *
@@ -321,6 +336,16 @@ class SliceProjectionTest(ut.TestCase):
         sl = sp(domainArray)
         self.assertTrue(np.all(sl == raw[7, :, 1:3, 3, 1].swapaxes(0, 1)))
 
+    def testStack(self):
+        sp = SliceProjection(2, 1, [3, 0, 4])
+        slicing = sp.domain([3, 7, 1], slice(1, 3), slice(0, None))
+        slicing = slicing[:4] + (slice(None),)
+        raw = np.random.randint(0, 100, (10, 3, 3, 128, 3))
+        stack = sp.stack(raw[slicing], 4)
+        self.assertEqual(stack.shape, (2, 3, 3))
+        for c in range(3):
+            self.assertTrue(np.all(stack[..., c] == raw[7, :, 1:3, 3, c].swapaxes(0, 1)))
+
 
 if __name__ == "__main__":
     ut.main()
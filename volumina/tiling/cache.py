@@ -19,12 +19,18 @@ class CachePolicy:
     def __init__(self, size):
         self._validate_size(size)
         self._size = size
+        self._pinned = frozenset()
         self._subsribers = []
 
     @property
     def size(self):
         return self._size
 
+    @property
+    def pinned(self):
+        """uids that are never evicted, and don't count towards size"""
+        return self._pinned
+
     def _validate_size(self, value):
         if not isinstance(value, int) or value <= 0:
             raise ValueError("size should non negative integer")
@@ -40,6 +46,16 @@ class CachePolicy:
         for sub in self._subsribers:
             sub()
 
+    def set_pinned(self, uids):
+        uids = frozenset(uids)
+        if self._pinned == uids:
+            return
+
+        self._pinned = uids
+
+        for sub in self._subsribers:
+            sub()
+
     def subscribe(self, fn):
         self._subsribers.append(fn)
 
@@ -97,12 +113,12 @@ class MultiCache:
     def maxsize(self):
         return self._policy.size
 
-    def _evict_one(self):
-        self._caches.popitem(last=False)  # removes item in FIFO order
-
     def _clean(self):
-        while len(self._caches) > self.maxsize:
-            self._evict_one()
+        pinned = self._policy.pinned
+        unpinned = [uid for uid in self._caches if uid not in pinned]
+        # removes items in FIFO order
+        for uid in unpinned[: max(0, len(unpinned) - self.maxsize)]:
+            del self._caches[uid]
 
 
 class TilesCache:
@@ -128,7 +144,6 @@ class TilesCache:
     def __init__(self, first_stack_id, sims: StackedImageSources, maxstacks):
         self._lock = threading.Lock()
         self._sims = sims
-        self._maxstacks = maxstacks
         self._policy = CachePolicy(maxstacks)
 
         kwargs = {"policy": self._policy}
@@ -155,11 +170,15 @@ class TilesCache:
 
     @property
     def maxstacks(self):
-        return self._maxstacks
+        return self._policy.size
 
     def set_maxstacks(self, maxstacks):
         self._policy.set_size(maxstacks)
 
+    def pinStacks(self, stack_ids):
+        """Keep the given stacks besides the maxstacks others, replaces the previously pinned stacks"""
+        self._policy.set_pinned(stack_ids)
+
     def __enter__(self):
         self._lock.acquire()
         return self
@@ -176,6 +195,11 @@ class TilesCache:
         assert self._lock.locked(), "You must claim the _TileCache via a context manager before calling this function."
         return len(self._tileCache)
 
+    def stacks(self):
+        """The cached stack ids, least recently used first"""
+        assert self._lock.locked(), "You must claim the _TileCache via a context manager before calling this function."
+        return list(self._tileCache)
+
     def tile(self, stack_id, tile_id):
         assert self._lock.locked(), "You must claim the _TileCache via a context manager before calling this function."
         return self._tileCache[stack_id][tile_id]
@@ -268,6 +292,18 @@ class TilesCache:
             for entry in dirty_entries:
                 del self._layerCacheDirty[stack_id][entry]
 
+    def removeLayers(self, keep_layer_ids):
+        """
+        Drop the tiles of all layers but keep_layer_ids in all stacks,
+        e.g. of layers that have been removed from the stack.
+        """
+        assert self._lock.locked(), "You must claim the _TileCache via a context manager before calling this function."
+        keep_layer_ids = set(keep_layer_ids)
+        for cache in (self._layerCache, self._layerCacheDirty, self._layerCacheTimestamp):
+            for stack_id in cache:
+                for entry in [entry for entry in cache[stack_id] if entry[0] not in keep_layer_ids]:
+                    del cache[stack_id][entry]
+
     def layerTileTimestamp(self, stack_id, layer_id, tile_id):
         assert self._lock.locked(), "You must claim the _TileCache via a context manager before calling this function."
         return self._layerCacheTimestamp[stack_id][(layer_id, tile_id)]
@@ -0,0 +1,133 @@
+###############################################################################
+#   volumina: volume slicing and editing library
+#
+#       Copyright (C) 2011-2025, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+#          http://ilastik.org/license/
+###############################################################################
+import math
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# Seconds of scrolling to prefetch ahead
+PREFETCH_HORIZON = 1.0
+
+
+class Motion(NamedTuple):
+    position: int
+    velocity: float  # slices per second
+    acceleration: float  # slices per second^2
+    timestamp: float  # seconds
+
+
+class ScrollPredictor:
+    """
+    Predicts which slices the user scrolls to next.
+
+    The position along each 'through' axis (e.g. time and the slicing axis of
+    a view) is observed with the time of each change. Velocity and
+    acceleration are exponential moving averages of the finite differences
+    between observations. After a pause, a jump or a change of direction the
+    motion of an axis starts over, so predictions in the old direction are
+    dropped.
+    """
+
+    # weight of a new observation in the moving averages
+    SMOOTHING = 0.5
+    # seconds without a change after which an axis is at rest
+    IDLE = 0.5
+    # position changes larger than this (in slices) are jumps, not scrolling
+    MAX_STEP = 16
+
+    def __init__(self):
+        self._motion: Dict[int, Motion] = {}
+
+    def motion(self, axis: int) -> Optional[Motion]:
+        return self._motion.get(axis)
+
+    def observe(self, axis: int, position: int, timestamp: float) -> None:
+        previous = self._motion.get(axis)
+        if previous is None or position == previous.position:
+            self._motion[axis] = Motion(position, 0.0, 0.0, timestamp)
+            return
+
+        step = position - previous.position
+        dt = timestamp - previous.timestamp
+        if abs(step) > self.MAX_STEP:
+            self._motion[axis] = Motion(position, 0.0, 0.0, timestamp)
+        elif dt > self.IDLE or previous.velocity * step < 0:
+            # Starting to move (again), or reversing: all we know is the direction
+            self._motion[axis] = Motion(position, step / self.IDLE, 0.0, timestamp)
+        else:
+            dt = max(dt, 1e-3)
+            velocity = previous.velocity + self.SMOOTHING * (step / dt - previous.velocity)
+            acceleration = previous.acceleration + self.SMOOTHING * (
+                (velocity - previous.velocity) / dt - previous.acceleration
+            )
+            self._motion[axis] = Motion(position, velocity, acceleration, timestamp)
+
+    def displacement(self, axis: int, seconds: float) -> float:
+        """Predicted change of position along axis in the given time from the last observation"""
+        motion = self._motion.get(axis)
+        if motion is None or motion.velocity == 0.0:
+            return 0.0
+        v, a = motion.velocity, motion.acceleration
+        if v * a < 0:
+            # Decelerating: scrolling stops when the velocity reaches zero
+            seconds = min(seconds, -v / a)
+        return v * seconds + 0.5 * a * seconds**2
+
+    def offsets(
+        self, axis: int, horizon: float, max_depth: int, limits: Tuple[int, int] = (-math.inf, math.inf)
+    ) -> List[int]:
+        """
+        Up to max_depth slice offsets along axis (nearest first) to prefetch for
+        the next horizon seconds.
+
+        When more slices are passed in that time than can be fetched, the
+        offsets are spread over the predicted distance, the user is shown
+        the nearest fetched slice anyway. The distance is clipped to the
+        (min, max) offsets in limits, e.g. the remaining slices of the axis.
+        """
+        distance = min(max(self.displacement(axis, horizon), limits[0]), limits[1])
+        if max_depth <= 0 or abs(distance) < 0.5:
+            return []
+        n = min(max_depth, math.ceil(abs(distance)))
+        direction = 1 if distance > 0 else -1
+        offsets = []
+        for k in range(1, n + 1):
+            offset = direction * max(1, math.ceil(abs(distance) * k / n - 1e-9))
+            if offset not in offsets:
+                offsets.append(offset)
+        return offsets
+
+    def upcoming(
+        self, through: Sequence[int], shape: Sequence[int], horizon: float, max_depth: int
+    ) -> List[Tuple[int, ...]]:
+        """
+        'through' positions to prefetch, nearest first.
+
+        through: current position along each through axis
+        shape: number of slices along each through axis
+        max_depth: maximal number of positions per axis
+        """
+        upcoming = []
+        for axis, (position, size) in enumerate(zip(through, shape)):
+            for offset in self.offsets(axis, horizon, max_depth, (-position, size - 1 - position)):
+                t = list(through)
+                t[axis] = position + offset
+                upcoming.append((abs(offset), tuple(t)))
+        return [t for _distance, t in sorted(upcoming, key=lambda d_t: d_t[0])]
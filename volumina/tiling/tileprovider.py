@@ -21,19 +21,21 @@
 ###############################################################################
 import collections
 import logging
-from threading import RLock
+import math
+from threading import Lock, RLock
 import time
 from contextlib import contextmanager
 from functools import partial
 
-from typing import Callable, Optional
-from qtpy.QtCore import QObject, QRect, QRectF, Signal
+from typing import Callable, Dict, FrozenSet, Iterable, Optional, Sequence
+from qtpy.QtCore import QObject, QPointF, QRect, QRectF, QSizeF, Signal
 from qtpy.QtGui import QImage, QPainter, QTransform
 from qtpy.QtWidgets import QGraphicsItem
 
 from volumina.pixelpipeline.imagepump import StackedImageSources
-from volumina.pixelpipeline.interface import IndeterminateRequestError
+from volumina.pixelpipeline.interface import IndeterminateRequestError, RequestABC, RequestCancelledError
 from volumina.pixelpipeline.slicesources import StackId
+from volumina.pixelpipeline.tilecache import LAYER_TILE_CACHE, CachedTileRequest, CompressedTileRequest
 from volumina.utility import PrioritizedThreadPoolExecutor
 from volumina import is_in_development_env
 
@@ -52,15 +54,38 @@ except ImportError:
     USE_LAZYFLOW_THREADPOOL = False
 
 
-Priority = tuple[bool, int, float]
+# (prefetch level, -layer priority, layer cost class, distance from view center, -timestamp)
+# Smaller values are processed first, see TileProvider._priority
+Priority = tuple[int, int, int, int, float]
+
+# Prefetch levels: tiles around the viewport are fetched after prefetched slices (prefetch=True),
+# slices warmed up in the background (see TileProvider.warmUp) after everything else
+RING_PREFETCH = 2
+WARMUP_PREFETCH = 3
+
+# Time budget (in seconds) for rendering a frame. Layers that are expected to
+# deliver a tile within this budget are scheduled before slower layers.
+FRAME_DEADLINE = 1.0 / 30
 
 if USE_LAZYFLOW_THREADPOOL:
     from volumina.utility.lazyflowRequestBuffer import LazyflowRequestBuffer
 
-    renderer_pool = LazyflowRequestBuffer(Request.global_thread_pool.num_workers)
+    RENDER_WORKERS = Request.global_thread_pool.num_workers
+    renderer_pool = LazyflowRequestBuffer(RENDER_WORKERS)
+
+    def clear_non_relevant_tasks_from_queue(
+        vp: "TileProvider", stack_id: StackId, keep_tiles: Iterable[int], keep_stacks: Iterable[StackId] = ()
+    ):
+        renderer_pool.clear_non_relevant_tasks_from_queue(vp, stack_id, keep_tiles, keep_stacks)
 
-    def clear_non_relevant_tasks_from_queue(vp: "TileProvider", stack_id: StackId, keep_tiles: list[int]):
-        renderer_pool.clear_non_relevant_tasks_from_queue(vp, stack_id, keep_tiles)
+    def reprioritize_tasks(vp: "TileProvider", update: Callable[[Priority, int], Priority]):
+        renderer_pool.reprioritize(vp, update)
+
+    def set_active_viewport(vp: Optional["TileProvider"]):
+        renderer_pool.set_active_viewport(vp)
+
+    def renderer_idle() -> bool:
+        return renderer_pool.idle()
 
     def submit_to_threadpool(
         fn: Callable[[], None],
@@ -68,27 +93,44 @@ if USE_LAZYFLOW_THREADPOOL:
         viewport: "TileProvider",
         stack_id: StackId,
         tile_no: int,
+        request: Optional[RequestABC] = None,
     ):
         # Tiling requests are less prioritized than most requests.
         # somehow this for the request thing
         assert isinstance(renderer_pool, LazyflowRequestBuffer)
-        renderer_pool.submit(fn, priority, viewport, stack_id, tile_no)
+        renderer_pool.submit(fn, priority, viewport, stack_id, tile_no, request)
 
 else:
-    renderer_pool = PrioritizedThreadPoolExecutor(6)
+    RENDER_WORKERS = 6
+    renderer_pool = PrioritizedThreadPoolExecutor(RENDER_WORKERS)
 
     def clear_non_relevant_tasks_from_queue(*args, **kwargs):
         pass
 
+    def set_active_viewport(*args, **kwargs):
+        pass
+
+    def renderer_idle() -> bool:
+        return renderer_pool.idle()
+
+    def reprioritize_tasks(vp: "TileProvider", update: Callable[[Priority, int], Priority]):
+        def _update(priority, context):
+            if context is None or context[0] is not vp:
+                return priority
+            return update(priority, context[1])
+
+        renderer_pool.reprioritize(_update)
+
     def submit_to_threadpool(
         fn: Callable[[], None],
         priority: Priority,
-        _viewport: "TileProvider",
+        viewport: "TileProvider",
         _stack_id: StackId,
-        _tile_no: int,
+        tile_no: int,
+        _request: Optional[RequestABC] = None,
     ):
         assert isinstance(renderer_pool, PrioritizedThreadPoolExecutor), type(renderer_pool)
-        renderer_pool.submit(fn, priority)
+        renderer_pool.submit(fn, priority, context=(viewport, tile_no))
 
 
 @contextmanager
@@ -118,6 +160,43 @@ class TrueInc:
 _Counter = TrueInc()
 
 
+class LayerLatency:
+    """
+    Keeps a running estimate of how long each layer (ImageSource) takes to deliver a tile.
+    """
+
+    # weight of a new measurement in the exponential moving average
+    SMOOTHING = 0.3
+
+    def __init__(self, deadline: float = FRAME_DEADLINE):
+        self._deadline = deadline
+        self._lock = Lock()
+        self._estimates: Dict[object, float] = {}
+
+    def record(self, ims, seconds: float) -> None:
+        with self._lock:
+            previous = self._estimates.get(ims)
+            if previous is None:
+                self._estimates[ims] = seconds
+            else:
+                self._estimates[ims] = previous + self.SMOOTHING * (seconds - previous)
+
+    def estimate(self, ims) -> Optional[float]:
+        """Estimated seconds per tile, None if the layer has not delivered any tile yet"""
+        return self._estimates.get(ims)
+
+    def cost_class(self, ims) -> int:
+        """
+        0 for layers expected to make the frame deadline (or not measured yet),
+        otherwise 1 + log2(estimated latency / deadline).
+        Coarse classes keep the order stable despite jitter in the measurements.
+        """
+        estimate = self._estimates.get(ims)
+        if estimate is None or estimate <= self._deadline:
+            return 0
+        return 1 + int(math.log2(estimate / self._deadline))
+
+
 class TileProvider(QObject):
     """
     Note: Throughout this class, the terms 'layer', 'ImageSource', and 'ims' are used interchangeably.
@@ -164,6 +243,17 @@ class TileProvider(QObject):
         self._current_stack_id = self._sims.stackId
         self._cache = TilesCache(self._current_stack_id, self._sims, maxstacks=cache_size)
 
+        self._latency = LayerLatency()
+        # center of the viewport in scene coordinates, see getTiles
+        self._view_center: Optional[QPointF] = None
+        self._view_center_tile: Optional[int] = None
+        # slices being prefetched ahead of the user, see prefetchAhead
+        self._prefetch_stacks: FrozenSet[StackId] = frozenset()
+        # tiles around the viewport being prefetched in the current slice, see prefetchRing
+        self._ring_tiles: FrozenSet[int] = frozenset()
+        # slices being warmed up in the background, see warmUp
+        self._warmup_stacks: FrozenSet[StackId] = frozenset()
+
         self._sims.layerDirty.connect(self._onLayerDirty)
         self._sims.visibleChanged.connect(self._onVisibleChanged)
         self._sims.opacityChanged.connect(self._onOpacityChanged)
@@ -178,7 +268,7 @@ class TileProvider(QObject):
     def set_cache_size(self, new_size):
         self._cache.set_maxstacks(new_size)
 
-    def getTiles(self, rectF: QRectF, vp_rectF: QRectF):
+    def getTiles(self, rectF: QRectF, vp_rectF: QRectF, fetch: bool = True, layer_indexes=None):
         """Get tiles in rect and request a refresh.
 
         Returns tiles intersecting with rectF immediately and requests
@@ -186,19 +276,84 @@ class TileProvider(QObject):
         tiles may be already (partially) updated. If you want to wait
         until the rendering is fully complete, call join().
 
+        With fetch=False nothing is requested, e.g. for slices the user
+        only scrolls past. If the current slice was never fetched, the
+        tiles of the nearest cached slice are returned instead (with
+        progress 0). With layer_indexes, only these layers are refreshed.
         """
         tile_nos = self.tiling.intersected(rectF)
         stack_id = self._current_stack_id
-        keep_tiles = self.tiling.intersected(vp_rectF)
-        clear_non_relevant_tasks_from_queue(self, stack_id, keep_tiles)
-        self.requestRefresh(rectF)
+        if fetch:
+            keep_tiles = self._ring_tiles.union(self.tiling.intersected(vp_rectF))
+            keep_stacks = self._prefetch_stacks.union(self._warmup_stacks)
+            clear_non_relevant_tasks_from_queue(self, stack_id, keep_tiles, keep_stacks)
+        if vp_rectF.isValid():
+            self._setViewCenter(vp_rectF.center())
+        if fetch:
+            self.requestRefresh(rectF, layer_indexes=layer_indexes)
 
+        with self._cache:
+            shown_id = stack_id if stack_id in self._cache else self._nearestCachedStack(stack_id)
         for tile_no in tile_nos:
-            with self._cache:
-                qimg, progress = self._cache.tile(stack_id, tile_no)
-                qgraphicsitems = self._cache.graphicsitem_layers(stack_id, tile_no)
+            qimg, progress, qgraphicsitems = None, 0.0, []
+            if shown_id is not None:
+                with self._cache:
+                    qimg, progress = self._cache.tile(shown_id, tile_no)
+                    qgraphicsitems = self._cache.graphicsitem_layers(shown_id, tile_no)
+                if shown_id != stack_id:
+                    progress = 0.0
             yield TileProvider.Tile(tile_no, qimg, qgraphicsitems, QRectF(self.tiling.imageRects[tile_no]), progress)
 
+    def _nearestCachedStack(self, stack_id: StackId) -> Optional[StackId]:
+        """The cached stack of the same slice sources closest to stack_id along the 'through' axes"""
+        sources, through = stack_id
+        candidates = [
+            (sum(abs(p - q) for (_, p), (_, q) in zip(through, other)), other)
+            for other_sources, other in self._cache.stacks()
+            if other_sources is sources and len(other) == len(through)
+        ]
+        if not candidates:
+            return None
+        return (sources, min(candidates)[1])
+
+    def _setViewCenter(self, center: QPointF):
+        """
+        Tiles closer to the view center are fetched first.
+        If panning/zooming moved the center to another tile, the
+        queued tasks are re-prioritized (not re-submitted).
+        """
+        self._view_center = center
+        center_tiles = self.tiling.intersected(QRectF(center, QSizeF(1, 1)))
+        center_tile = center_tiles[0] if center_tiles else None
+        if center_tile != self._view_center_tile:
+            self._view_center_tile = center_tile
+            reprioritize_tasks(self, self._updatePriority)
+
+    def tileDistance(self, tile_no: int) -> int:
+        """Distance of a tile from the view center, in tiles (0: the center tile)"""
+        if self._view_center is None:
+            return 0
+        rect = self.tiling.tileRectFs[tile_no]
+        size = max(rect.width(), rect.height(), 1.0)
+        offset = rect.center() - self._view_center
+        return round(max(abs(offset.x()), abs(offset.y())) / size)
+
+    def _priority(self, prefetch: int, ims, tile_no: int, timestamp: int) -> Priority:
+        """
+        Tasks with 'smaller' priority values are processed first.
+          * non-prefetch tasks first (False < True), then tiles around the viewport (RING_PREFETCH),
+            slices warmed up in the background last (WARMUP_PREFETCH),
+          * then layers with higher priority,
+          * then layers that are expected to make the frame deadline, i.e.
+            cheap layers are completed for the whole view before expensive ones,
+          * then tiles closer to the view center,
+          * then more recent tasks.
+        """
+        return (prefetch, -ims.priority, self._latency.cost_class(ims), self.tileDistance(tile_no), -timestamp)
+
+    def _updatePriority(self, priority: Priority, tile_no: int) -> Priority:
+        return priority[:3] + (self.tileDistance(tile_no),) + priority[4:]
+
     def waitForTiles(self, rectF=QRectF(), sceneRectF=QRectF()):
         """
         This function is for testing purposes only.
@@ -218,20 +373,26 @@ class TileProvider(QObject):
         the end of the rendering.
 
         """
-        stack_id = stack_id or self._current_stack_id
+        if stack_id is None or stack_id == self._current_stack_id:
+            stack_id = self._current_stack_id
+            with self._cache:
+                if stack_id in self._cache:
+                    self._cache.touchStack(stack_id)
+                else:
+                    self._cache.addStack(stack_id)
         tile_nos = self.tiling.intersected(rectF)
 
         for tile_no in tile_nos:
             self._refreshTile(stack_id, tile_no, prefetch, layer_indexes)
 
-    def prefetch(self, rectF, through, layer_indexes=None):
+    def prefetch(self, rectF, through, layer_indexes=None, level=True):
         """Request fetching of tiles in advance.
 
         Returns immediately. Prefetch will commence after all regular
         tiles are refreshed (see requestRefresh() and getTiles() ).
         The prefetch is reset when the 'through' value of the slicing
         changes. Several calls to prefetch are handeled in Fifo
-        order.
+        order. level is the prefetch level of the tasks (see _priority).
 
         """
         if self.cache_size == 0:
@@ -241,9 +402,120 @@ class TileProvider(QObject):
         with self._cache:
             if stack_id not in self._cache:
                 self._cache.addStack(stack_id)
-                self._cache.touchStack(self._current_stack_id)
+                if self._current_stack_id in self._cache:
+                    self._cache.touchStack(self._current_stack_id)
+
+        self.requestRefresh(rectF, stack_id, prefetch=level, layer_indexes=layer_indexes)
+
+    def prefetchAhead(self, rectF: QRectF, throughs: Sequence[Sequence[int]], layer_indexes=None):
+        """Prefetch the slices at the predicted 'through' positions, nearest first.
+
+        Replaces the previous prediction: slices no longer predicted are
+        dropped from the render queue (and cancelled if running) with the
+        next getTiles(), slices still predicted keep their queued tasks and
+        are not requested again.
+        """
+        if self.cache_size == 0:
+            throughs = []
+        stack_ids = [(self._current_stack_id[0], tuple(enumerate(through))) for through in throughs]
+        previous = self._prefetch_stacks
+        self._prefetch_stacks = frozenset(stack_ids) - {self._current_stack_id}
+        for through, stack_id in zip(throughs, stack_ids):
+            if stack_id in self._prefetch_stacks and stack_id not in previous:
+                self.prefetch(rectF, through, layer_indexes)
+
+    def warmUp(self, rectF: QRectF, throughs: Sequence[Sequence[int]], layer_indexes=None):
+        """Fetch the tiles in rectF of the slices at the given 'through' positions, after all other tasks.
+
+        Like prefetchAhead, replaces the previous slices: slices no longer
+        given are dropped from the render queue with the next getTiles(),
+        slices still given are not requested again. An empty sequence ends
+        the warm-up.
+        """
+        if self.cache_size == 0:
+            throughs = []
+        stack_ids = [(self._current_stack_id[0], tuple(enumerate(through))) for through in throughs]
+        previous = self._warmup_stacks
+        self._warmup_stacks = frozenset(stack_ids)
+        for through, stack_id in zip(throughs, stack_ids):
+            if stack_id not in previous:
+                self.prefetch(rectF, through, layer_indexes, WARMUP_PREFETCH)
+
+    def pinStacks(self, throughs: Sequence[Sequence[int]]):
+        """Keep the slices at the given 'through' positions in the cache besides the cache_size others.
+
+        Replaces the previously pinned slices, an empty sequence releases them.
+        """
+        self._cache.pinStacks((self._current_stack_id[0], tuple(enumerate(through))) for through in throughs)
 
-        self.requestRefresh(rectF, stack_id, prefetch=True, layer_indexes=layer_indexes)
+    def prefetchRing(self, vp_rectF: QRectF, direction: QPointF = QPointF(), layer_indexes=None):
+        """Prefetch the tiles of the current slice in a ring around the viewport, after all other tasks.
+
+        The ring is one tile wide, and one tile wider on the sides the view
+        was recently panned towards (direction, in scene coordinates).
+        Replaces the previous ring: tiles that are no longer in the ring are
+        dropped from the render queue with the next getTiles(), tiles still
+        in the ring are not requested again.
+        """
+        if not vp_rectF.isValid():
+            self._ring_tiles = frozenset()
+            return
+
+        tile = self.tiling.data2scene.mapRect(QRectF(0, 0, self.tiling.blockSize, self.tiling.blockSize))
+        dx, dy = tile.width(), tile.height()
+        left = right = dx
+        top = bottom = dy
+        if direction.x() > 0:
+            right += dx
+        elif direction.x() < 0:
+            left += dx
+        if direction.y() > 0:
+            bottom += dy
+        elif direction.y() < 0:
+            top += dy
+
+        ring_rectF = vp_rectF.adjusted(-left, -top, right, bottom)
+        ring = frozenset(self.tiling.intersected(ring_rectF)).difference(self.tiling.intersected(vp_rectF))
+        previous = self._ring_tiles
+        self._ring_tiles = ring
+        for tile_no in ring - previous:
+            self._refreshTile(self._current_stack_id, tile_no, RING_PREFETCH, layer_indexes)
+
+    def _fetchedLayers(self, layer_indexes=None) -> list:
+        """The layers (of layer_indexes, if given) whose tiles are fetched: visible and not occluded"""
+        layers = self._sims.viewImageSources()
+        if layer_indexes:
+            layers = [layers[i] for i in layer_indexes]
+        return [ims for ims in layers if self._sims.isVisible(ims) and not self._sims.isOccluded(ims)]
+
+    def sliceFetchSeconds(self, rectF: QRectF, layer_indexes=None) -> Optional[float]:
+        """Estimated seconds to fetch the tiles in rectF of one slice, None until the layers were measured"""
+        estimates = [self._latency.estimate(ims) for ims in self._fetchedLayers(layer_indexes)]
+        estimates = [seconds for seconds in estimates if seconds is not None]
+        if not estimates:
+            return None
+        return len(self.tiling.intersected(rectF)) * sum(estimates) / RENDER_WORKERS
+
+    def sliceBytes(self, rectF: QRectF, layer_indexes=None) -> int:
+        """Memory taken by the layer tiles in rectF of one slice, rendered as 32 bit images"""
+        pixels = sum(
+            self.tiling.imageRects[tile_no].width() * self.tiling.imageRects[tile_no].height()
+            for tile_no in self.tiling.intersected(rectF)
+        )
+        return 4 * pixels * len(self._fetchedLayers(layer_indexes))
+
+    def stackProgress(self, rectF: QRectF, through: Sequence[int], layer_indexes=None) -> float:
+        """Fraction of the layer tiles in rectF of the slice at 'through' that are fetched, 1.0 when complete"""
+        stack_id = (self._current_stack_id[0], tuple(enumerate(through)))
+        layers = self._fetchedLayers(layer_indexes)
+        tile_nos = self.tiling.intersected(rectF)
+        if not layers or not tile_nos:
+            return 1.0
+        with self._cache:
+            if stack_id not in self._cache:
+                return 0.0
+            dirty = sum(self._cache.layerTileDirty(stack_id, ims, tile_no) for ims in layers for tile_no in tile_nos)
+        return 1.0 - dirty / (len(layers) * len(tile_nos))
 
     def _refreshTile(self, stack_id: StackId, tile_no: int, prefetch=False, layer_indexes=None):
         """
@@ -271,13 +543,6 @@ class TileProvider(QObject):
         if layer_indexes:
             layers = [layers[i] for i in layer_indexes]
 
-        if not self.axesSwapped:
-            # Who came up with this transform?
-            transform = QTransform(0, 1, 0, 1, 0, 0, 1, 1, 1)
-        else:
-            transform = QTransform().rotate(90).scale(1, -1)
-        transform *= self.tiling.data2scene
-
         try:
             with self._cache:
                 if not self._cache.tileDirty(stack_id, tile_no):
@@ -309,7 +574,8 @@ class TileProvider(QObject):
 
                 try:
                     # Create the request object right now, from the main thread.
-                    ims_req = ims.request(dataRect, stack_id[1])
+                    # Tiles another view has rendered already are taken from the shared cache.
+                    ims_req = LAYER_TILE_CACHE.request(ims, dataRect, stack_id[1])
                 except IndeterminateRequestError:
                     # In ilastik, the viewer is still churning even as the user might be changing settings in the UI.
                     # Settings changes can cause 'slot not ready' errors during graph setup.
@@ -319,26 +585,32 @@ class TileProvider(QObject):
                     continue
 
                 timestamp = _Counter.inc()
-                fetch_fn = partial(
-                    self._fetch_layer_tile, timestamp, ims, transform, tile_no, stack_id, ims_req, self._cache
-                )
+                fetch_args = (timestamp, ims, tile_no, stack_id, ims_req, self._cache)
 
-                if ims.direct and not prefetch:
+                if isinstance(ims_req, CachedTileRequest):
+                    # Rendered before, there is nothing to compute
+                    self._fetch_layer_tile(*fetch_args)
+                    need_reblend = need_reblend or not prefetch
+                elif ims.direct and not prefetch and not isinstance(ims_req, CompressedTileRequest):
                     # The ImageSource 'ims' is fast (it has the direct flag set to true),
                     # so we process the request synchronously here.
                     # This improves the responsiveness for layers that have the data readily available.
-                    fetch_fn()
+                    # (Compressed tiles are left to the render threads to decompress.)
+                    self._fetch_layer_tile(*fetch_args)
                     need_reblend = True
                 else:
-                    # Tasks with 'smaller' priority values are processed first.
-                    # We want non-prefetch tasks to take priority (False < True)
-                    # and then more recent tasks to take priority (more recent -> process first)
-                    layer_priority = ims.priority
-                    priority: Priority = (prefetch, -layer_priority, -timestamp)
-                    submit_to_threadpool(fetch_fn, priority, self, stack_id, tile_no)
+                    if USE_LAZYFLOW_THREADPOOL:
+                        # Waiting inside a lazyflow request does not block a worker thread,
+                        # and the request buffer relies on completion of fetch_fn for throttling.
+                        fetch_fn = partial(self._fetch_layer_tile, *fetch_args)
+                    else:
+                        fetch_fn = partial(self._submit_layer_tile, *fetch_args)
+
+                    priority = self._priority(prefetch, ims, tile_no, timestamp)
+                    submit_to_threadpool(fetch_fn, priority, self, stack_id, tile_no, ims_req)
 
             if need_reblend:
-                # We synchronously fetched at least one direct layer.
+                # We synchronously fetched at least one direct or shared layer tile.
                 # We can immediately re-blend the composite tile.
                 tile_img = self._blendTile(stack_id, tile_no)
                 with self._cache:
@@ -350,7 +622,26 @@ class TileProvider(QObject):
 
     def setTileDirty(self, stack_id, tile_no):
         with self._cache:
-            self._cache.setTileDirty(stack_id, tile_no, True)
+            if stack_id in self._cache:
+                self._cache.setTileDirty(stack_id, tile_no, True)
+
+    def setAllTilesDirty(self):
+        """Blend all tiles again from their layer tiles, e.g. to show layers that were left out"""
+        with self._cache:
+            self._cache.setAllTilesDirty()
+        self.sceneRectChanged.emit(QRectF())
+
+    def _layerTransform(self) -> QTransform:
+        """
+        Maps the QImage layer tiles, which are cached in the orientation
+        of the data, to the orientation of the scene.
+        """
+        if not self.axesSwapped:
+            # Who came up with this transform?
+            transform = QTransform(0, 1, 0, 1, 0, 0, 1, 1, 1)
+        else:
+            transform = QTransform().rotate(90).scale(1, -1)
+        return transform * self.tiling.data2scene
 
     def _blendTile(self, stack_id, tile_nr):
         """
@@ -359,6 +650,7 @@ class TileProvider(QObject):
         """
         qimg = None
         p = None
+        transform = self._layerTransform()
         for i, (visible, layerOpacity, layerImageSource) in enumerate(reversed(self._sims)):
             image_type = layerImageSource.image_type()
             if issubclass(image_type, QGraphicsItem):
@@ -397,6 +689,8 @@ class TileProvider(QObject):
                     qimg.fill(0xFFFFFFFF)
                     p = QPainter(qimg)
                 p.setOpacity(layerOpacity)
+                # a 90 degree rotation or flip, exact without smooth pixmap transform
+                p.setTransform(QImage.trueMatrix(transform, patch.width(), patch.height()))
                 p.drawImage(0, 0, patch)
 
         if p is not None:
@@ -404,7 +698,28 @@ class TileProvider(QObject):
 
         return qimg
 
-    def _fetch_layer_tile(self, timestamp, ims, transform, tile_nr, stack_id, ims_req, cache):
+    def _submit_layer_tile(self, timestamp, ims, tile_nr, stack_id, ims_req, cache):
+        """
+        Non-blocking variant of _fetch_layer_tile (same parameters).
+
+        Starts ims_req and finishes the layer tile from its completion callback,
+        so the calling worker thread is not parked while the layer data is computed.
+        Requests that compute synchronously finish right here, as before.
+        """
+        try:
+            ims_req.submit()
+        except BaseException as e:
+            if is_in_development_env():
+                raise
+            logger.error(f"Error submitting tile request:\n{e}", exc_info=True)
+            return
+
+        started = time.perf_counter()
+        ims_req.add_done_callback(
+            lambda req: self._fetch_layer_tile(timestamp, ims, tile_nr, stack_id, req, cache, started)
+        )
+
+    def _fetch_layer_tile(self, timestamp, ims, tile_nr, stack_id, ims_req, cache, started=None):
         """
         Fetch a single tile from a layer (ImageSource).
 
@@ -414,8 +729,6 @@ class TileProvider(QObject):
             The timestamp at which ims_req was created
         ims
             The layer (image source) we're fetching from
-        transform
-            The transform to apply to the fetched data, before storing it in the cache
         tile_nr
             The ID of the fetched tile
         stack_id
@@ -425,7 +738,9 @@ class TileProvider(QObject):
             the appropriate type for the layer (i.e. either a QImage or a QGraphicsItem)
         cache
             The value of self._cache at the time the ims_req was created.
-            (The cache can be replaced occasionally. See TileProvider._onSizeChanged().)
+        started
+            time.perf_counter() at which ims_req was submitted, if it was submitted earlier.
+            Used to measure the latency of the layer.
         """
         try:
             try:
@@ -438,17 +753,20 @@ class TileProvider(QObject):
             tile_rect = QRectF(self.tiling.imageRects[tile_nr])
 
             if timestamp > layerTimestamp:
+                if started is None:
+                    started = time.perf_counter()
                 img = ims_req.wait()
-                if isinstance(img, QImage):
-                    img = img.transformed(transform)
-                elif isinstance(img, QGraphicsItem):
+                if not isinstance(ims_req, CachedTileRequest):
+                    self._latency.record(ims, time.perf_counter() - started)
+                # QImages are cached in the orientation of the data, it is applied when blending (see _blendTile)
+                if isinstance(img, QGraphicsItem):
                     # FIXME: It *seems* like applying the same transform to QImages and QGraphicsItems
                     #        makes sense here, but for some strange reason it isn't right.
                     #        For QGraphicsItems, it seems obvious that this is the correct transform.
-                    #        I do not understand the formula that produces 'transform', which is used for QImage tiles.
+                    #        I do not understand the formula in _layerTransform, which is used for QImage tiles.
                     img.setTransform(QTransform.fromTranslate(tile_rect.left(), tile_rect.top()), combine=True)
                     img.setTransform(self.tiling.data2scene, combine=True)
-                else:
+                elif not isinstance(img, QImage):
                     assert False, "Unexpected image type: {}".format(type(img))
 
                 with cache:
@@ -459,6 +777,9 @@ class TileProvider(QObject):
 
                 if stack_id == self._current_stack_id and cache is self._cache:
                     self.sceneRectChanged.emit(tile_rect)
+        except RequestCancelledError:
+            # Whoever cancelled the request has marked the tile dirty again.
+            logger.debug("Layer tile request was cancelled")
         except BaseException as e:
             if is_in_development_env():
                 raise
@@ -509,6 +830,10 @@ class TileProvider(QObject):
                     self._cache.setLayerTileDirtyAllStacks(dirtyImgSrc, tile_no, True)
                     if visibleAndNotOccluded:
                         self._cache.setTileDirtyAllStacks(tile_no, True)
+        # The prefetched tiles are dirty again: request them with the next prediction
+        self._prefetch_stacks = frozenset()
+        self._ring_tiles = frozenset()
+        self._warmup_stacks = frozenset()
         if visibleAndNotOccluded:
             self.sceneRectChanged.emit(QRectF(sceneRect))
 
@@ -516,16 +841,13 @@ class TileProvider(QObject):
         """
         When the current 'stacked image source' has changed it's 'stack id'.
         The 'stack id' changes when the user scrolls to a new plane.
-        When that happens, we keep all of our caches for the old plane,
-        but we add (if necesssary) a new set of caches for all the tiles
-        that will be shown in the new plane.
+        When that happens, we keep all of our caches for the old plane.
+        The caches for the new plane are only added once its tiles are
+        requested (see requestRefresh), so that planes the user scrolls
+        past do not evict cached ones.
         """
-        with self._cache:
-            if newId in self._cache:
-                self._cache.touchStack(newId)
-            else:
-                self._cache.addStack(newId)
         self._current_stack_id = newId
+        self._ring_tiles = frozenset()
         self.sceneRectChanged.emit(QRectF())
 
     def _onVisibleChanged(self, ims, visible):
@@ -550,10 +872,26 @@ class TileProvider(QObject):
 
     def _onSizeChanged(self):
         """
-        Called when the StackedImageSources object we depend on has changed it's size.
-        This is rare, but it means that the entire tile cache is obsolete.
+        Called when the StackedImageSources object we depend on has changed it's size,
+        i.e. layers were added or removed. The tiles of the remaining layers are kept,
+        the tiles all need to be re-rendered.
+        """
+        with self._cache:
+            self._cache.removeLayers(self._sims.viewImageSources())
+            self._cache.setAllTilesDirty()
+        self.sceneRectChanged.emit(QRectF())
+
+    def onOrientationChanged(self):
+        """
+        Called when tiling.data2scene or axesSwapped has changed (rotation, axis swap).
+        QImage layer tiles are cached in the orientation of the data, so the tiles
+        only need to be re-rendered; QGraphicsItem layers are fetched again.
         """
-        self._cache = TilesCache(self._current_stack_id, self._sims, maxstacks=self.cache_size)
+        with self._cache:
+            for ims in self._sims.viewImageSources():
+                if issubclass(ims.image_type(), QGraphicsItem):
+                    self._cache.setLayerTilesDirty(ims)
+            self._cache.setAllTilesDirty()
         self.sceneRectChanged.emit(QRectF())
 
     def _onOrderChanged(self):
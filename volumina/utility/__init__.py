@@ -26,7 +26,7 @@ from .getMainWindow import getMainWindow
 from .singleton import Singleton
 from .shortcutManager import ShortcutManager
 from .shortcutManagerDlg import ShortcutManagerDlg
-from volumina.utility.thunkEvent import execute_in_main_thread
+from volumina.utility.thunkEvent import execute_in_main_thread, execute_in_main_thread_batched
 from volumina.utility.edge_coords import edge_coords_along_axis, edge_coords_nd
 from volumina.utility.simplify_line_segments import simplify_line_segments
 from volumina.utility.signalingDict import SignalingDict
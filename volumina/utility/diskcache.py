@@ -0,0 +1,165 @@
+import collections
+import hashlib
+import logging
+import os
+import threading
+import uuid
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    Arrays stored in compressed files of a directory, bounded by their total size in bytes.
+
+    Entries belong to a fingerprint (e.g. of the content of a data source) and
+    are addressed by a key within it. The least recently used entries are
+    evicted when the directory grows beyond maxbytes. The directory may
+    outlive the process and be shared by several processes: entries that
+    can't be read back, or that were written for another key, are dropped.
+
+    Files are written (put_async) and removed (discard) by a background thread,
+    in the order of the calls; flush() waits for it.
+    """
+
+    SUFFIX = ".npz"
+
+    def __init__(self, directory: str, maxbytes: int):
+        self._directory = os.path.expanduser(directory)
+        self.maxsize = maxbytes
+        self._lock = threading.Lock()
+        # file name -> size in bytes, least recently used first
+        self._files = collections.OrderedDict()
+        self.currsize = 0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DiskCache")
+
+        os.makedirs(self._directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self._directory):
+            if entry.name.endswith(self.SUFFIX) and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _mtime, name, size in sorted(entries):
+            self._files[name] = size
+            self.currsize += size
+
+    def __repr__(self):
+        return "%s(%r, maxsize=%r, currsize=%r)" % (type(self).__name__, self._directory, self.maxsize, self.currsize)
+
+    def __len__(self):
+        return len(self._files)
+
+    @staticmethod
+    def _hash(value: str, length: int) -> str:
+        return hashlib.sha1(value.encode()).hexdigest()[:length]
+
+    def _name(self, fingerprint: str, key: str) -> str:
+        return "%s-%s%s" % (self._hash(fingerprint, 16), self._hash(key, 24), self.SUFFIX)
+
+    def get(self, fingerprint: str, key: str) -> Optional[np.ndarray]:
+        name = self._name(fingerprint, key)
+        with self._lock:
+            if name not in self._files:
+                return None
+            self._files.move_to_end(name)
+
+        path = os.path.join(self._directory, name)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                stored = (str(npz["fingerprint"]), str(npz["key"]))
+                array = npz["data"]
+            os.utime(path)
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile, zlib.error) as e:
+            logger.warning("Dropping unreadable cache file %s: %s", path, e)
+            self._remove(name)
+            return None
+
+        if stored != (fingerprint, key):
+            self._remove(name)
+            return None
+        return array
+
+    def put(self, fingerprint: str, key: str, array: np.ndarray) -> None:
+        """Store array, unless it is larger than the cache or can't be stored without pickling"""
+        if array.dtype.hasobject or array.nbytes > self.maxsize:
+            return
+        name = self._name(fingerprint, key)
+        path = os.path.join(self._directory, name)
+        # write to a temporary file first, so that no one reads a partially written entry
+        tmp_path = os.path.join(self._directory, ".%s.tmp" % uuid.uuid4().hex)
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, data=array, fingerprint=fingerprint, key=key)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to write cache file %s: %s", path, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self.currsize += size - self._files.pop(name, 0)
+            self._files[name] = size
+            evicted = []
+            while self.currsize > self.maxsize and len(self._files) > 1:
+                old, old_size = self._files.popitem(last=False)
+                self.currsize -= old_size
+                evicted.append(old)
+        for old in evicted:
+            self._unlink(old)
+
+    def put_async(self, fingerprint: str, key: str, array: np.ndarray) -> None:
+        """Store array in the background, see put(); the array must not be changed afterwards"""
+        self._writer.submit(self.put, fingerprint, key, array)
+
+    def discard(self, fingerprint: str) -> None:
+        """
+        Remove all entries of fingerprint, including those still to be written by earlier put_async() calls.
+
+        get() doesn't return the entries anymore once discard() returns, the files are removed in the background.
+        """
+        prefix = self._hash(fingerprint, 16) + "-"
+        names = self._forget(prefix)
+        self._writer.submit(self._discard, prefix, names)
+
+    def flush(self) -> None:
+        """Wait until the files of earlier put_async() and discard() calls are written and removed"""
+        self._writer.submit(lambda: None).result()
+
+    def _forget(self, prefix: str) -> List[str]:
+        with self._lock:
+            names = [name for name in self._files if name.startswith(prefix)]
+            for name in names:
+                self.currsize -= self._files.pop(name)
+        return names
+
+    def _discard(self, prefix: str, names: List[str]) -> None:
+        for name in names + self._forget(prefix):
+            self._unlink(name)
+
+    def clear(self) -> None:
+        with self._lock:
+            names = list(self._files)
+        for name in names:
+            self._remove(name)
+
+    def _remove(self, name: str) -> None:
+        with self._lock:
+            size = self._files.pop(name, None)
+            if size is None:
+                return
+            self.currsize -= size
+        self._unlink(name)
+
+    def _unlink(self, name: str) -> None:
+        try:
+            os.remove(os.path.join(self._directory, name))
+        except FileNotFoundError:
+            pass
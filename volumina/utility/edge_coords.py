@@ -2,7 +2,6 @@ from __future__ import print_function
 from builtins import range
 import numpy as np
 import warnings
-from collections import defaultdict
 
 
 try:
@@ -58,26 +57,21 @@ def edge_ids(label_img, axes=None):
         return set(map(tuple, unique_edge_ids))
 
 
-def edge_coords_along_axis(label_img, axis):
+def edge_ids_and_coords_along_axis(label_img, axis):
     """
-    Find the edges between label segments along a particular axis
-    Return all edges as keys in a dict, along with the list of coordinates that belong to the edge.
-
-    Returns a dict of edges -> coordinate lists
-    That is: { (id1, id2) : [coord, coord, coord, coord...] }
+    Find the edges between label segments along a particular axis, without grouping them.
 
-    For all edge ids (id1, id2), id1 < id2.
-
-    Where:
-        - id1 is always less than id2
-        - for each 'coord', len(coord) == label_img.ndim
-        - the edge lies just to the RIGHT (or down, or whatever) of the coordinate
+    Returns (edge_ids, edge_coords), where edge_ids is an (N, 2) array of
+    (id1, id2) pairs (id1 < id2) and edge_coords the (N, label_img.ndim)
+    array of the corresponding coordinates, in C order.
+    The edge lies just to the RIGHT (or down, or whatever) of the coordinate.
     """
     if axis < 0:
         axis += label_img.ndim
     assert label_img.ndim > axis
     if label_img.shape[axis] == 1:
-        return {}  # No edges
+        # No edges
+        return np.ndarray((0, 2), dtype=np.uint32), np.ndarray((0, label_img.ndim), dtype=np.intp)
 
     up_slicing = ((slice(None),) * axis) + (np.s_[:-1],)
     down_slicing = ((slice(None),) * axis) + (np.s_[1:],)
@@ -95,20 +89,46 @@ def edge_coords_along_axis(label_img, axis):
     edge_ids[:, 0] = label_img[up_slicing][edge_mask]
     edge_ids[:, 1] = label_img[down_slicing][edge_mask]
     edge_ids.sort(axis=1)
+    return edge_ids, edge_coords
+
+
+def group_by_edge_ids(edge_ids, values):
+    """
+    Group the rows of values by the (id1, id2) pair in the same row of edge_ids.
+
+    Returns a dict { (id1, id2) : array of rows }, where each array is a
+    contiguous block of one sorted copy of values. Within an edge, the rows
+    keep their original order.
+    """
+    if not len(edge_ids):
+        return {}
 
-    # FIXME: This doesn't work any more...
-    #     # pandas can do groupby 3x faster than pure-python,
-    #     # but pure-python is faster on tiny data (e.g. a couple 256*256 tiles)
-    #     if _pandas_available and len(edge_ids) > 10000:
-    #         df = pd.DataFrame({ 'id1' : edge_ids[:,0],
-    #                             'id2' : edge_ids[:,1],
-    #                             'coords' : NpIter(edge_coords) }) # This is much faster than list(edge_coords)
-    #         return df.groupby(['id1', 'id2'])['coords'].apply(np.asarray).to_dict()
-    #     else:
-    grouped_coords = defaultdict(list)
-    for id_pair, coords in zip(edge_ids, edge_coords):
-        grouped_coords[tuple(id_pair)].append(coords)
-    return grouped_coords
+    # Stable sort by (id1, id2), then split wherever the id pair changes.
+    order = np.lexsort((edge_ids[:, 1], edge_ids[:, 0]))
+    sorted_ids = edge_ids[order]
+    sorted_values = values[order]
+
+    boundaries = np.flatnonzero((sorted_ids[1:] != sorted_ids[:-1]).any(axis=1)) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [len(sorted_ids)]))
+    id_pairs = map(tuple, sorted_ids[starts].tolist())
+    return {id_pair: sorted_values[start:stop] for id_pair, start, stop in zip(id_pairs, starts, stops)}
+
+
+def edge_coords_along_axis(label_img, axis):
+    """
+    Find the edges between label segments along a particular axis
+    Return all edges as keys in a dict, along with the coordinates that belong to the edge.
+
+    Returns a dict of edges -> coordinate arrays
+    That is: { (id1, id2) : array([coord, coord, coord, coord...]) }
+
+    Where:
+        - id1 is always less than id2
+        - each coordinate array has shape (N, label_img.ndim)
+        - the edge lies just to the RIGHT (or down, or whatever) of the coordinate
+    """
+    return group_by_edge_ids(*edge_ids_and_coords_along_axis(label_img, axis))
 
 
 class NpIter(object):
@@ -20,12 +20,28 @@
 ###############################################################################
 import logging
 import heapq
+import time
+import weakref
 from itertools import chain
 from threading import Lock
-from typing import TYPE_CHECKING, Callable, Final, List, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Final,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
 
 from lazyflow.request import Request
 
+from volumina.pixelpipeline.interface import RequestABC
 from volumina.pixelpipeline.slicesources import StackId
 
 logger = logging.getLogger(__name__)
@@ -43,12 +59,21 @@ class PrioTask:
         viewport_ref: "TileProvider",
         stack_id: StackId,
         tile_no: int,
+        request: Optional[RequestABC] = None,
     ):
         self._func: "Request" = func
         self._tile_no = tile_no
         self._prio = prio
         self._vp = viewport_ref
         self._stack_id = stack_id
+        self._request = request
+        self._cancelled = False
+        self._submitted: float = time.perf_counter()
+        self._started: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
 
     @property
     def vp(self):
@@ -66,19 +91,192 @@ class PrioTask:
         self._func.add_done_callback(func)
 
     def run(self) -> None:
+        self._started = time.perf_counter()
         self._func.submit()
 
+    def waited(self, now: Optional[float] = None) -> float:
+        """Seconds spent in the queue, up to `now` if not started yet"""
+        if self._started is not None:
+            return self._started - self._submitted
+        return (time.perf_counter() if now is None else now) - self._submitted
+
+    @property
+    def priority(self):
+        return self._prio
+
+    @priority.setter
+    def priority(self, value):
+        self._prio = value
+
     def __lt__(self, other: "PrioTask"):
         return self._prio < other._prio
 
     def cancel(self, set_dirty=True):
+        """
+        Cancel the task and the (image source) request it is processing.
+
+        The request is not created within the lazyflow request of the task,
+        so lazyflow cannot propagate the cancellation by itself.
+        """
+        if self._cancelled:
+            return
+        self._cancelled = True
         try:
             self._func.cancel()
+            if self._request is not None:
+                self._request.cancel()
         finally:
             if set_dirty:
                 self.vp.setTileDirty(self.stack_id, self.tile_no)
 
 
+class _ViewportQueue:
+    """Waiting tasks of a single viewport
+
+    Tasks are kept in a heap and indexed by (stack_id, tile_no). Tasks that are
+    removed from the queue are cancelled, but stay in the heap until they reach
+    its top (lazy deletion), so removing a task does not require re-heapifying.
+    """
+
+    def __init__(self):
+        self._heap: List[PrioTask] = []
+        self._tiles: Dict[Tuple[StackId, int], List[PrioTask]] = {}
+        self._stacks: Dict[StackId, Set[int]] = {}
+        # tiles with more than one waiting task
+        self._duplicates: Set[Tuple[StackId, int]] = set()
+        # (stack_id, keep_tiles, keep_stacks) of the last `prune` and tiles submitted to since then
+        self._pruned_for: Optional[Tuple[StackId, FrozenSet[int], FrozenSet[StackId]]] = None
+        self._unpruned: Set[Tuple[StackId, int]] = set()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[PrioTask]:
+        for tasks in self._tiles.values():
+            yield from tasks
+
+    def push(self, task: PrioTask) -> None:
+        key = (task.stack_id, task.tile_no)
+        heapq.heappush(self._heap, task)
+        tasks = self._tiles.setdefault(key, [])
+        tasks.append(task)
+        if len(tasks) > 1:
+            self._duplicates.add(key)
+        self._stacks.setdefault(task.stack_id, set()).add(task.tile_no)
+        self._unpruned.add(key)
+        self._size += 1
+
+    def peek(self) -> Optional[PrioTask]:
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    def pop(self) -> Optional[PrioTask]:
+        task = self.peek()
+        if task is not None:
+            heapq.heappop(self._heap)
+            self._unindex(task)
+        return task
+
+    def _unindex(self, task: PrioTask) -> None:
+        key = (task.stack_id, task.tile_no)
+        tasks = self._tiles[key]
+        tasks.remove(task)
+        if len(tasks) < 2:
+            self._duplicates.discard(key)
+        if not tasks:
+            del self._tiles[key]
+            tiles = self._stacks[task.stack_id]
+            tiles.discard(task.tile_no)
+            if not tiles:
+                del self._stacks[task.stack_id]
+        self._size -= 1
+
+    def compact(self) -> None:
+        """Drop cancelled tasks once they make up most of the heap"""
+        if len(self._heap) > 2 * self._size + 64:
+            self._heap = [task for task in self._heap if not task.cancelled]
+            heapq.heapify(self._heap)
+
+    def reprioritize(self, update: Callable[[tuple, int], tuple]) -> None:
+        self._heap = list(self)
+        for task in self._heap:
+            task.priority = update(task.priority, task.tile_no)
+        heapq.heapify(self._heap)
+
+    def prune(
+        self, stack_id: StackId, keep_tiles: FrozenSet[int], keep_stacks: FrozenSet[StackId] = frozenset()
+    ) -> Tuple[List[PrioTask], List[PrioTask]]:
+        """Remove tasks that are outdated or not in `keep_tiles` of `stack_id`
+
+        Tasks of the stacks in `keep_stacks` (prefetched slices) are kept.
+        Only tiles submitted to since the last call are looked at, if it was
+        for the same `stack_id`, `keep_tiles` and `keep_stacks`.
+
+        Returns:
+          Removed tasks superseded by a better task for the same tile, and the
+          removed tasks no longer in view. The caller needs to cancel them.
+        """
+        if self._pruned_for == (stack_id, keep_tiles, keep_stacks):
+            keys: Iterable[Tuple[StackId, int]] = self._unpruned
+        else:
+            keys = [
+                (other, tile_no)
+                for other, tiles in self._stacks.items()
+                if other != stack_id and other not in keep_stacks
+                for tile_no in tiles
+            ]
+            keys += [(stack_id, tile_no) for tile_no in self._stacks.get(stack_id, set()) - keep_tiles]
+            keys += [key for key in self._duplicates if key[0] == stack_id and key[1] in keep_tiles]
+        self._pruned_for = (stack_id, keep_tiles, keep_stacks)
+
+        superseded: List[PrioTask] = []
+        not_needed: List[PrioTask] = []
+        for key in keys:
+            tasks = self._tiles.get(key)
+            if not tasks or (key[0] != stack_id and key[0] in keep_stacks):
+                continue
+            if key[0] != stack_id or key[1] not in keep_tiles:
+                not_needed.extend(tasks)
+            elif len(tasks) > 1:
+                best = min(tasks)
+                superseded.extend(task for task in tasks if task is not best)
+
+        self._unpruned = set()
+        for task in chain(superseded, not_needed):
+            self._unindex(task)
+        return superseded, not_needed
+
+
+class ViewportStats(NamedTuple):
+    """Scheduling statistics of a single viewport, times in seconds"""
+
+    queued: int
+    running: int
+    wait_time: float
+    run_time: float
+
+
+class _TimeAverage:
+    """Exponential moving average of task wait and run times"""
+
+    SMOOTHING = 0.3
+
+    def __init__(self):
+        self.wait_time = 0.0
+        self.run_time = 0.0
+
+    def _smooth(self, old: float, new: float) -> float:
+        return old + self.SMOOTHING * (new - old) if old else new
+
+    def record_wait(self, seconds: float) -> None:
+        self.wait_time = self._smooth(self.wait_time, seconds)
+
+    def record_run(self, seconds: float) -> None:
+        self.run_time = self._smooth(self.run_time, seconds)
+
+
 class LazyflowRequestBuffer:
     """
     This class is cooperating with `TileProvider`.
@@ -91,24 +289,49 @@ class LazyflowRequestBuffer:
     The LazyflowRequestBuffer acts in between the `TileProvider` and the lazyflow
     request system. Requests are submitted only up to an upper limit defined by
     `n_concurrent_tasks`. The other tasks are queued and can be cleared, see
-    `clear_non_relevant_tasks_from_queue`.
+    `clear_non_relevant_tasks_from_queue`. Running tasks of a viewport are
+    cancelled once the viewport moved on to a different slice.
+
+    All viewports share the same budget of concurrent tasks. Each viewport has
+    its own queue; the viewport the user works in (see `set_active_viewport`)
+    is guaranteed a share of the budget: whenever a slot frees up and the
+    active viewport runs fewer than its share, its next task is started.
+    Otherwise the best task over all viewports is started, where tasks that
+    have been waiting for long get a bonus, so background viewports do not
+    starve.
     """
 
-    def __init__(self, n_concurrent_tasks: int = 8):
+    def __init__(self, n_concurrent_tasks: int = 8, active_share: float = 0.5, aging_interval: float = 1.0):
         """
         Args:
           n_concurrent_tasks: How many viewer requests will be submitted to the
             request system. Anecdotally it seems a good compromise to have as
             many as threads in the lazyflow threadpool.
+          active_share: Fraction of `n_concurrent_tasks` reserved for the
+            active viewport (at least one task).
+          aging_interval: Each full `aging_interval` (in seconds) a task has
+            been waiting raises it above all tasks that waited one interval
+            less, regardless of their priority.
         """
         if n_concurrent_tasks <= 0:
             raise RuntimeError(f"Instantiating LazyflowRequestBuffer with {n_concurrent_tasks=}, must be >0.")
+        if not 0.0 <= active_share <= 1.0:
+            raise ValueError(f"{active_share=} must be in [0, 1].")
+        if aging_interval <= 0:
+            raise ValueError(f"{aging_interval=} must be >0.")
         self._lock = Lock()
         self._cleared_tasks: int = 0
         self._n_concurrent_tasks: Final[int] = n_concurrent_tasks
-        self._queue: List[PrioTask] = []
+        self._n_reserved: Final[int] = max(1, int(n_concurrent_tasks * active_share)) if active_share else 0
+        self._aging_interval: Final[float] = aging_interval
+        self._queues: Dict["TileProvider", _ViewportQueue] = {}
+        self._active_vp: Optional["TileProvider"] = None
+        self._times: "weakref.WeakKeyDictionary[TileProvider, _TimeAverage]" = weakref.WeakKeyDictionary()
+        # id(lazyflow request) -> task, for all submitted tasks that have not completed yet
+        self._running: Dict[int, PrioTask] = {}
         self._active: int = 0
         self._failed: int = 0
+        self._cancelled_running: int = 0
 
     def submit(
         self,
@@ -118,41 +341,116 @@ class LazyflowRequestBuffer:
         viewport_ref: "TileProvider",
         stack_id: StackId,
         tile_no: int,
+        request: Optional[RequestABC] = None,
     ):
+        """
+        Args:
+          request: The image source request processed by `func`, if any. It
+            is cancelled together with the task.
+        """
         root_priority = [1] + list(priority)
         req = Request(func, root_priority)
         with self._lock:
-            heapq.heappush(self._queue, PrioTask(req, priority, viewport_ref, stack_id, tile_no))
+            task = PrioTask(req, priority, viewport_ref, stack_id, tile_no, request)
+            self._queues.setdefault(viewport_ref, _ViewportQueue()).push(task)
+        self.run()
+
+    def set_active_viewport(self, viewport: Optional["TileProvider"]):
+        """Set the viewport whose tasks are guaranteed a share of the budget"""
+        with self._lock:
+            self._active_vp = viewport
         self.run()
 
+    def _running_in(self, viewport: "TileProvider") -> int:
+        return sum(1 for task in self._running.values() if task.vp == viewport)
+
+    def _pop_next(self) -> Optional[PrioTask]:
+        """Remove the task to be started next from its queue, must hold the lock"""
+        active_queue = self._queues.get(self._active_vp)
+        if active_queue and self._running_in(self._active_vp) < self._n_reserved:
+            queue = active_queue
+        else:
+            now = time.perf_counter()
+
+            def key(queue: _ViewportQueue):
+                head = queue.peek()
+                return (-int(head.waited(now) / self._aging_interval), head.priority)
+
+            queue = min((q for q in self._queues.values() if q), key=key, default=None)
+            if queue is None:
+                return None
+
+        task = queue.pop()
+        if not queue:
+            del self._queues[task.vp]
+        return task
+
     def run(self):
         with self._lock:
             while self._active < self._n_concurrent_tasks:
-                try:
-                    req = heapq.heappop(self._queue)
-                except IndexError:
+                req = self._pop_next()
+                if req is None:
                     return
 
-                if req:
-                    req.subscribe_complete(self.decr)
-                    self._active += 1
-                    req.run()
+                req.subscribe_complete(self.decr)
+                self._running[id(req._func)] = req
+                self._active += 1
+                req.run()
+                self._times.setdefault(req.vp, _TimeAverage()).record_wait(req.waited())
 
     def decr(self, req: Request):
         with self._lock:
+            task = self._running.pop(id(req), None)
             self._active -= 1
             if req.exception:
                 self._failed += 1
+            if task is not None:
+                self._times.setdefault(task.vp, _TimeAverage()).record_run(time.perf_counter() - task._started)
         self.run()
 
     def clear(self):
         with self._lock:
-            for task in self._queue:
-                task.cancel()
-                self._cleared_tasks += 1
-            self._queue = []
+            for queue in self._queues.values():
+                for task in queue:
+                    task.cancel()
+                    self._cleared_tasks += 1
+            self._queues = {}
+
+    def idle(self) -> bool:
+        """Whether no task is running or waiting, in any viewport"""
+        with self._lock:
+            return self._active == 0 and not any(self._queues.values())
 
-    def clear_non_relevant_tasks_from_queue(self, viewport: "TileProvider", stack_id: StackId, keep_tiles: list[int]):
+    def viewport_stats(self, viewport: "TileProvider") -> ViewportStats:
+        """Queue depth, running tasks and smoothed wait and run times of a viewport"""
+        with self._lock:
+            times = self._times.get(viewport) or _TimeAverage()
+            return ViewportStats(
+                queued=len(self._queues.get(viewport, ())),
+                running=self._running_in(viewport),
+                wait_time=times.wait_time,
+                run_time=times.run_time,
+            )
+
+    def reprioritize(self, viewport: "TileProvider", update: Callable[[tuple, int], tuple]):
+        """Re-evaluate the priorities of waiting tasks of a viewport without re-submitting them
+
+        Args:
+          viewport: only tasks of this viewport are updated
+          update: called with (priority, tile_no) of a task, returns its new priority
+        """
+        with self._lock:
+            queue = self._queues.get(viewport)
+            if queue:
+                queue.reprioritize(update)
+
+    def clear_non_relevant_tasks_from_queue(
+        self,
+        viewport: "TileProvider",
+        stack_id: StackId,
+        keep_tiles: Iterable[int],
+        keep_stacks: Iterable[StackId] = (),
+    ):
         """Remove waiting tiles no longer visible or outdated for the current viewport
 
         Cancellation criteria are:
@@ -160,35 +458,51 @@ class LazyflowRequestBuffer:
           * task in a different 2d slice
           * tasks in the same slice, but outside the field of view
 
+        Tasks of the slices in `keep_stacks` (the slices the viewport is
+        prefetching) are neither removed nor cancelled.
+
+        Tasks that are already running are only cancelled if they belong to a
+        different 2d slice. Cancelled tiles are marked dirty, so they are
+        requested again should the viewport return to them.
+
+        This is called on every paint: the cost is proportional to the number
+        of removed tasks, and repeated calls for an unchanged view only look at
+        tasks submitted in between.
+
         Args:
           viewport: The viewport that requests new tiles to be rendered
           stack_id: corresponding to the slice requested by the viewport
-          keep_tiles: list of all tiles in the current view
+          keep_tiles: all tiles in the current view
+          keep_stacks: slices whose tasks are kept as they are
         """
-        tmp_queue: dict[Tuple[StackId, int], PrioTask] = {}
-        tmp_queue_other_vp: List[PrioTask] = []
+        keep_tiles = frozenset(keep_tiles)
+        keep_stacks = frozenset(keep_stacks)
         with self._lock:
-            for task in self._queue:
-                # don't touch tasks outside the current viewport
-                if task.vp != viewport:
-                    tmp_queue_other_vp.append(task)
-                    continue
-
+            # tasks of other viewports are in other queues and are not touched
+            queue = self._queues.get(viewport)
+            if queue is not None:
+                superseded, not_needed = queue.prune(stack_id, keep_tiles, keep_stacks)
                 # Remove older requests of the same tile in the current 2d_slice
-                if (stack_id, task.tile_no) in tmp_queue:
+                for task in superseded:
                     task.cancel(set_dirty=False)
-                    self._cleared_tasks += 1
-                    continue
-
                 # Remove
                 # * tasks outside current 2d slice from the queue
                 # * tasks in the current slice, but no longer visible (not in keep_tiles)
-                if task.stack_id != stack_id or task.tile_no not in keep_tiles:
+                for task in not_needed:
                     task.cancel()
-                    self._cleared_tasks += 1
-                    continue
+                self._cleared_tasks += len(superseded) + len(not_needed)
+                queue.compact()
 
-                tmp_queue[(stack_id, task.tile_no)] = task
+            stale_running = [
+                task
+                for task in self._running.values()
+                if task.vp == viewport
+                and task.stack_id != stack_id
+                and task.stack_id not in keep_stacks
+                and not task.cancelled
+            ]
+            self._cancelled_running += len(stale_running)
 
-            self._queue = list(chain(tmp_queue.values(), tmp_queue_other_vp))
-            heapq.heapify(self._queue)
+        # Cancel outside the lock: lazyflow may invoke `decr` synchronously.
+        for task in stale_running:
+            task.cancel()
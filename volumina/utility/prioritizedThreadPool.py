@@ -1,10 +1,12 @@
-from typing import Callable
+import heapq
+from typing import Any, Callable, Optional
 from future import standard_library
 
 standard_library.install_aliases()
 from concurrent.futures.thread import ThreadPoolExecutor, _WorkItem
 import concurrent.futures._base
 import queue
+import threading
 
 
 class PrioritizedTask(_WorkItem):
@@ -13,9 +15,11 @@ class PrioritizedTask(_WorkItem):
     Used by the global renderer_pool (a thread pool).
     """
 
-    def __init__(self, fut, func, priority):
+    def __init__(self, fut, func, priority, context=None):
         super(PrioritizedTask, self).__init__(fut, func, [], {})
         self.priority = priority
+        # opaque to the executor, passed to the update function in PrioritizedThreadPoolExecutor.reprioritize
+        self.context = context
 
     def __lt__(self, other):
         """
@@ -42,8 +46,11 @@ class PrioritizedThreadPoolExecutor(ThreadPoolExecutor):
     def __init__(self, max_workers: int):
         super(PrioritizedThreadPoolExecutor, self).__init__(max_workers)
         self._work_queue: queue.PriorityQueue[PrioritizedTask] = queue.PriorityQueue()
+        # number of submitted tasks that are not done yet
+        self._pending = 0
+        self._pending_lock = threading.Lock()
 
-    def submit(self, func: Callable[[], None], /, priority: tuple[float | int | bool, ...]):
+    def submit(self, func: Callable[[], None], /, priority: tuple[float | int | bool, ...], context: Any = None):
         """
         Mostly copied from ThreadPoolExecutor.submit(), but here we replace '_WorkItem' with 'PrioritizedTask'.
         Also, we pass the 'prefetch' and 'timestamp' parameters in the priority argument.
@@ -53,17 +60,45 @@ class PrioritizedThreadPoolExecutor(ThreadPoolExecutor):
                 raise RuntimeError("cannot schedule new futures after shutdown")
 
             fut = concurrent.futures._base.Future()
-            w = PrioritizedTask(fut, func, priority)
+            w = PrioritizedTask(fut, func, priority, context)
+
+            with self._pending_lock:
+                self._pending += 1
+            fut.add_done_callback(self._task_done)
 
             self._work_queue.put(w)
             self._adjust_thread_count()
             return fut
 
+    def _task_done(self, _fut):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def idle(self) -> bool:
+        """Whether no task is running or waiting"""
+        with self._pending_lock:
+            return self._pending == 0
+
+    def reprioritize(self, update: Callable[[tuple, Any], Optional[tuple]]):
+        """
+        Re-evaluate the priorities of all queued tasks without re-submitting them.
+
+        update(priority, context) returns the new priority of a task.
+        """
+        q = self._work_queue
+        with q.mutex:
+            for task in q.queue:
+                if isinstance(task, PrioritizedTask):
+                    task.priority = update(task.priority, task.context)
+            heapq.heapify(q.queue)
+
     def clear(self):
         q = self._work_queue
         while not q.empty():
             try:
-                q.get(False)
+                task = q.get(False)
             except:
                 continue
+            if isinstance(task, PrioritizedTask):
+                task.future.cancel()
             q.task_done()
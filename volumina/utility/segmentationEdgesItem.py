@@ -2,31 +2,270 @@ from __future__ import print_function
 from collections import defaultdict
 import threading
 import logging
+import math
+import weakref
 
 import numpy as np
 
 from qtpy.QtCore import Signal
-from qtpy.QtCore import Qt, QObject, QRectF, QPointF, QPoint
-from qtpy.QtWidgets import QApplication, QGraphicsObject, QGraphicsPathItem, QGraphicsSceneHoverEvent
-from qtpy.QtGui import QPainterPath, QPen, QColor, QPainterPathStroker, QPainter
+from qtpy.QtCore import Qt, QObject, QRectF, QPointF, QPoint, QLineF
+from qtpy.QtWidgets import QApplication, QGraphicsObject, QGraphicsSceneHoverEvent
+from qtpy.QtGui import QPainterPath, QPen, QColor, QPainter
 
 from volumina.utility import SignalingDict, edge_coords_nd, simplify_line_segments
+from volumina.utility.edge_coords import edge_ids_and_coords_along_axis, group_by_edge_ids
+
+try:
+    from qtpy import sip
+except ImportError:
+    sip = None
 
 logger = logging.getLogger(__name__)
 
 
+class TileEdges(object):
+    """
+    The line segments of all edges in a tile, stored in flat arrays.
+
+    id_pairs: list of the edge ids (id1, id2) found in the tile
+    segments: (N, 2, 2) array of line segments (pairs of (x, y) end points), grouped by edge
+    segment_edges: (N,) array with the index into id_pairs of each segment
+    keys: the id_pairs packed into sortable keys (see pack_id_pairs())
+
+    The segments are also sorted into a coarse grid of cells, to quickly find
+    the edge at a position. Only numpy is involved, so a TileEdges object
+    may be created in any thread.
+    """
+
+    CELL_SIZE = 8
+
+    def __init__(self, id_pairs, segments, segment_edges):
+        self.id_pairs = list(id_pairs)
+        self.segments = np.asarray(segments, dtype=np.float64).reshape((-1, 2, 2))
+        self.segment_edges = np.asarray(segment_edges, dtype=np.intp)
+        assert len(self.segments) == len(self.segment_edges)
+        self.keys = pack_id_pairs(self.id_pairs)
+
+        lengths = np.linalg.norm(self.segments[:, 1] - self.segments[:, 0], axis=1)
+        self._cell_size = max(self.CELL_SIZE, math.ceil(lengths.max())) if len(lengths) else self.CELL_SIZE
+        cells = np.floor(self.segments.mean(axis=1) / self._cell_size).astype(np.intp)
+        cell_ids = self._cell_ids(cells[:, 0], cells[:, 1])
+        self._cell_order = np.argsort(cell_ids, kind="stable")
+        self._sorted_cell_ids = cell_ids[self._cell_order]
+
+    @classmethod
+    def from_line_segments(cls, line_segments):
+        """line_segments: { id_pair : (N, 2, 2) array }, see line_segments_for_labels()"""
+        id_pairs = list(line_segments.keys())
+        counts = [len(line_segments[id_pair]) for id_pair in id_pairs]
+        if id_pairs:
+            segments = np.concatenate([np.reshape(line_segments[id_pair], (-1, 2, 2)) for id_pair in id_pairs])
+        else:
+            segments = np.zeros((0, 2, 2))
+        return cls(id_pairs, segments, np.repeat(np.arange(len(id_pairs)), counts))
+
+    @classmethod
+    def from_labels(cls, label_img, simplify_with_tolerance=None):
+        return cls.from_line_segments(line_segments_for_labels(label_img, simplify_with_tolerance))
+
+    def __len__(self):
+        return len(self.id_pairs)
+
+    @staticmethod
+    def _cell_ids(cx, cy):
+        # cells of a tile are within a few thousand of the origin, fold x and y into one key
+        return cx * (1 << 20) + cy
+
+    def bounds(self):
+        """(xmin, ymin, xmax, ymax) of all segments, or None if there are none"""
+        if not len(self.segments):
+            return None
+        points = self.segments.reshape((-1, 2))
+        (xmin, ymin), (xmax, ymax) = points.min(axis=0), points.max(axis=0)
+        return xmin, ymin, xmax, ymax
+
+    def edge_at(self, x, y, tolerance):
+        """Index (into id_pairs) of the edge closest to (x, y), or None if no edge is within tolerance"""
+        reach = tolerance + self._cell_size / 2.0
+        cx0, cx1 = (int(math.floor(v / self._cell_size)) for v in (x - reach, x + reach))
+        cy0, cy1 = (int(math.floor(v / self._cell_size)) for v in (y - reach, y + reach))
+
+        candidates = []
+        for cx in range(cx0, cx1 + 1):
+            lo, hi = self._cell_ids(cx, cy0), self._cell_ids(cx, cy1)
+            start = np.searchsorted(self._sorted_cell_ids, lo, side="left")
+            stop = np.searchsorted(self._sorted_cell_ids, hi, side="right")
+            candidates.append(self._cell_order[start:stop])
+        candidates = np.concatenate(candidates)
+        if not len(candidates):
+            return None
+
+        a = self.segments[candidates, 0]
+        ab = self.segments[candidates, 1] - a
+        ap = np.array([x, y]) - a
+        t = np.clip(np.sum(ap * ab, axis=1) / np.maximum(np.sum(ab * ab, axis=1), 1e-12), 0.0, 1.0)
+        distances = np.linalg.norm(ap - t[:, None] * ab, axis=1)
+        nearest = np.argmin(distances)
+        if distances[nearest] > tolerance:
+            return None
+        return int(self.segment_edges[candidates[nearest]])
+
+    def edges_along(self, p0, p1, tolerance):
+        """Indices of the edges within tolerance of the line from p0 to p1, in the order they are passed"""
+        (x0, y0), (x1, y1) = p0, p1
+        steps = max(1, int(math.ceil(math.hypot(x1 - x0, y1 - y0) / max(tolerance, 0.5))))
+        edges = []
+        for t in np.linspace(0.0, 1.0, steps + 1):
+            edge = self.edge_at(x0 + t * (x1 - x0), y0 + t * (y1 - y0), tolerance)
+            if edge is not None and edge not in edges:
+                edges.append(edge)
+        return edges
+
+
+# sortable keys of (id1, id2) edge ids, ordered by id1 first
+EDGE_KEY_DTYPE = np.dtype([("id1", np.uint64), ("id2", np.uint64)])
+
+
+def pack_id_pairs(id_pairs):
+    """
+    Keys (of EDGE_KEY_DTYPE) for a sequence of (id1, id2) edge ids; the ids may take the whole uint64 range
+    """
+    id_pairs = list(id_pairs)
+    keys = np.zeros((len(id_pairs),), dtype=EDGE_KEY_DTYPE)
+    if id_pairs:
+        try:
+            pairs = np.array(id_pairs, dtype=np.int64).reshape((-1, 2))
+        except OverflowError:
+            # ids beyond the int64 range; converted exactly, unlike with a float64 array
+            pairs = np.array(id_pairs, dtype=object).reshape((-1, 2))
+        if pairs.min() < 0:
+            raise ValueError("Edge ids must not be negative")
+        keys["id1"] = pairs[:, 0]
+        keys["id2"] = pairs[:, 1]
+    return keys
+
+
+class EdgeTileIndex(QObject):
+    """
+    Index from the edges in a pen table to the SegmentationEdgesItems (tiles) showing them.
+
+    The index is the only listener of the pen table's updated() signal. The
+    updated keys are looked up in one sorted array of the edges of all
+    registered items, and only the items showing an updated edge are told
+    which of their edges changed.
+    """
+
+    _indices = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def for_pen_table(cls, pen_table):
+        """The index shared by all items that use pen_table"""
+        index = cls._indices.get(pen_table)
+        if index is None:
+            index = cls._indices[pen_table] = cls(pen_table)
+        return index
+
+    def __init__(self, pen_table):
+        super(EdgeTileIndex, self).__init__(pen_table)
+        self._pen_table = weakref.ref(pen_table)
+        self._items = {}  # slot -> weakref to SegmentationEdgesItem
+        self._next_slot = 0
+
+        # The edges of all items, sorted by key; rebuilt on the next update after items were added.
+        self._keys = np.zeros((0,), dtype=EDGE_KEY_DTYPE)
+        self._slots = np.zeros((0,), dtype=np.intp)
+        self._edges = np.zeros((0,), dtype=np.intp)
+        self._stale = False
+
+        pen_table.updated.connect(self._handle_updated)
+
+    def register(self, item):
+        slot = self._next_slot
+        self._next_slot += 1
+        self._items[slot] = weakref.ref(item, lambda _ref: self._items.pop(slot, None))
+        self._stale = True
+
+    def __len__(self):
+        return len(self._items)
+
+    def _rebuild(self):
+        items = [(slot, ref()) for slot, ref in list(self._items.items())]
+        items = [(slot, item) for slot, item in items if item is not None]
+        if not items:
+            self._keys = self._keys[:0]
+            self._slots = self._slots[:0]
+            self._edges = self._edges[:0]
+        else:
+            keys = np.concatenate([item.edges.keys for _slot, item in items])
+            order = np.argsort(keys, kind="stable")
+            self._keys = keys[order]
+            self._slots = np.repeat([slot for slot, _item in items], [len(item.edges) for _slot, item in items])[order]
+            self._edges = np.concatenate([np.arange(len(item.edges)) for _slot, item in items])[order]
+        self._stale = False
+
+    def _handle_updated(self, updated_keys):
+        if not self._items or not updated_keys:
+            return
+        if self._stale:
+            self._rebuild()
+
+        updated_keys = list(updated_keys)
+        keys = pack_id_pairs(updated_keys)
+        first = np.searchsorted(self._keys, keys, side="left")
+        counts = np.searchsorted(self._keys, keys, side="right") - first
+        found = counts > 0
+        if not found.any():
+            return
+
+        # Expand the (first, count) ranges of all found keys into positions in the index
+        first, counts = first[found], counts[found]
+        positions = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+        # The bounding rect of an item grows with the widest new pen
+        pen_table = self._pen_table()
+        found_pens = (pen_table.get(updated_keys[i]) for i in np.flatnonzero(found))
+        pens = {id(pen): pen for pen in found_pens if pen is not None}
+        max_width = max([pen.widthF() for pen in pens.values()], default=0.0)
+
+        slots = self._slots[positions]
+        order = np.argsort(slots, kind="stable")
+        slots, edges = slots[order], self._edges[positions][order]
+        boundaries = np.flatnonzero(slots[1:] != slots[:-1]) + 1
+        for slot_edges, slot in zip(np.split(edges, boundaries), slots[np.concatenate(([0], boundaries))]):
+            ref = self._items.get(slot)
+            item = ref and ref()
+            if item is not None:
+                item.handle_updated_edges(slot_edges, max_width)
+
+
+def lines_for_segments(segments):
+    """
+    QLineF objects for an (N, 2, 2) array of line segments, as accepted by QPainter.drawLines()
+    """
+    segments = np.ascontiguousarray(segments, dtype=np.float64)
+    if sip is not None and hasattr(sip, "array"):
+        # Fill the QLineF array directly from the numpy buffer
+        lines = sip.array(QLineF, len(segments))
+        if len(segments):
+            np.asarray(memoryview(lines)).view(np.float64)[:] = segments.ravel()
+        return lines
+    return [QLineF(*segment.ravel()) for segment in segments]
+
+
 class SegmentationEdgesItem(QGraphicsObject):
     """
-    A parent item for a collection of SingleEdgeItems.
+    Displays all edges of a tile (see TileEdges) in a single item.
+
+    Segments are drawn with one drawLines() call per pen. Clicks, drags and
+    hovering are mapped to the edge under the mouse via TileEdges.edge_at().
     """
 
     edgeClicked = Signal(tuple, object)  # id_pair, QGraphicsSceneMouseEvent
     edgeSwiped = Signal(tuple, object)  # id_pair, QGraphicsSceneMouseEvent
 
-    def __init__(self, path_items, edge_pen_table, default_pen, *, hoverIdChanged=None, parent=None, isClickable=False):
+    def __init__(self, edges, edge_pen_table, default_pen, *, hoverIdChanged=None, parent=None, isClickable=False):
         """
-        path_items: A dict of { edge_id : SingleEdgeItem }
-                    Use generate_path_items_for_labels() to produce this dict.
+        edges: A TileEdges object with the edges to display
 
         edge_pen_table: Must be of type SignalingDict, mapping from id_pair -> QPen.
                         May contain id_pair elements that are not present in the label_img.
@@ -42,27 +281,146 @@ class SegmentationEdgesItem(QGraphicsObject):
         self.hoverIdChanged = hoverIdChanged
         self.isClickable = isClickable
         super(SegmentationEdgesItem, self).__init__(parent=parent)
-        self.setFlag(QGraphicsObject.ItemHasNoContents)
 
         assert isinstance(edge_pen_table, SignalingDict)
         self.edge_pen_table = edge_pen_table
-        self.edge_pen_table.updated.connect(self.handle_updated_pen_table)
-        self.set_path_items(path_items)
         self.default_pen = default_pen
+        self.edges = edges
+        self.edge_indices = {id_pair: i for i, id_pair in enumerate(edges.id_pairs)}
 
-    def set_path_items(self, path_items):
-        self.path_items = path_items
-        for path_item in list(path_items.values()):
-            path_item.set_parent(self)
+        self._scale = 1
+        self._hover_edge = None
+
+        self._pens = {}  # id(pen) -> (code, pen); holding the pens keeps their ids unique
+        self._pen_codes = np.array([self._pen_code(self._pen(edge)) for edge in range(len(edges))], dtype=np.intp)
+        self._changed_edges = []
+        self._pen_groups = None
+        self._max_pen_width = max([pen.widthF() for _code, pen in self._pens.values()] + [default_pen.widthF()])
+        self._bounding_rect = self._compute_bounding_rect()
+
+        # Pen table updates reach this item only if they concern one of its edges
+        EdgeTileIndex.for_pen_table(self.edge_pen_table).register(self)
+        if self.hoverIdChanged:
+            self.setAcceptHoverEvents(True)
+            self.hoverIdChanged.connect(self.handle_id_hover)
+        if not self.isClickable:
+            self.setAcceptedMouseButtons(Qt.NoButton)
 
-        # Cache the path item keys as a set
-        self.path_ids = set(path_items.keys())
+    def _pen(self, edge):
+        return self.edge_pen_table.get(self.edges.id_pairs[edge], self.default_pen)
+
+    def _pen_code(self, pen):
+        return self._pens.setdefault(id(pen), (len(self._pens), pen))[0]
+
+    def _drop_unused_pens(self):
+        """Forget the pens no edge uses anymore and renumber the others"""
+        used = np.unique(self._pen_codes)
+        if len(used) == len(self._pens):
+            return
+        renumber = np.full(len(self._pens), -1, dtype=np.intp)
+        renumber[used] = np.arange(len(used))
+        self._pen_codes = renumber[self._pen_codes]
+        self._pens = {
+            pen_id: (int(renumber[code]), pen) for pen_id, (code, pen) in self._pens.items() if renumber[code] >= 0
+        }
+
+    def _group_segments(self):
+        """Sort the segments into one group per pen"""
+        if self._changed_edges:
+            changed = np.unique(np.concatenate(self._changed_edges))
+            self._changed_edges = []
+            self._pen_codes[changed] = [self._pen_code(self._pen(edge)) for edge in changed]
+            self._drop_unused_pens()
+
+        segment_pens = self._pen_codes[self.edges.segment_edges]
+        order = np.argsort(segment_pens, kind="stable")
+        bounds = np.searchsorted(segment_pens[order], np.arange(len(self._pens) + 1))
+        segments = self.edges.segments[order]
+        self._pen_groups = [
+            (pen, lines_for_segments(segments[bounds[code] : bounds[code + 1]]))
+            for code, pen in self._pens.values()
+            if bounds[code] < bounds[code + 1]
+        ]
+
+    def _compute_bounding_rect(self):
+        bounds = self.edges.bounds()
+        if bounds is None:
+            return QRectF()
+        xmin, ymin, xmax, ymax = bounds
+        margin = self._max_pen_width + 2
+        return QRectF(xmin, ymin, xmax - xmin, ymax - ymin).adjusted(-margin, -margin, margin, margin)
 
     def boundingRect(self):
-        # Return an empty rect to indicate 'no content'.
-        # This 'item' is merely a parent node for child items.
-        # (See QGraphicsObject.ItemHasNoContents.)
-        return QRectF()
+        return self._bounding_rect
+
+    def paint(self, painter: QPainter, option, widget=None):
+        transform, invertable = painter.worldTransform().inverted()
+        if invertable:
+            self._scale = transform.m11()
+
+        if self._pen_groups is None:
+            self._group_segments()
+        for pen, lines in self._pen_groups:
+            painter.setPen(pen)
+            painter.drawLines(lines)
+
+        if self._hover_edge is not None:
+            hover_pen = QPen(self._pen(self._hover_edge))
+            hover_pen.setWidth(hover_pen.width() + 2)
+            painter.setPen(hover_pen)
+            painter.drawLines(lines_for_segments(self.edges.segments[self.edges.segment_edges == self._hover_edge]))
+
+    def _tolerance(self):
+        # Like the stroked shape of a pen: adjust the active area depending on the zoom level
+        return max(self._max_pen_width * self._scale / 2.0, 0.5)
+
+    def edge_at(self, pos):
+        """The id_pair of the edge at pos (in item coordinates), or None"""
+        edge = self.edges.edge_at(pos.x(), pos.y(), self._tolerance())
+        return None if edge is None else self.edges.id_pairs[edge]
+
+    def hoverMoveEvent(self, event: QGraphicsSceneHoverEvent):
+        id_pair = self.edge_at(event.pos())
+        if self.isClickable:
+            if id_pair is None:
+                self.unsetCursor()
+            else:
+                self.setCursor(Qt.PointingHandCursor)
+        if id_pair != self._hover_id():
+            self.hoverIdChanged.emit(id_pair)
+
+    def hoverLeaveEvent(self, event: QGraphicsSceneHoverEvent):
+        if self._hover_edge is not None:
+            self.hoverIdChanged.emit(None)
+
+    def _hover_id(self):
+        return None if self._hover_edge is None else self.edges.id_pairs[self._hover_edge]
+
+    def handle_id_hover(self, id_pair):
+        hover_edge = self.edge_indices.get(id_pair)
+        if hover_edge != self._hover_edge:
+            self._hover_edge = hover_edge
+            self.update()
+
+    def mousePressEvent(self, event):
+        id_pair = self.edge_at(self.mapFromScene(event.scenePos()))
+        if id_pair is None:
+            # Let the items below have the click
+            event.ignore()
+            return
+        self.handle_edge_clicked(id_pair, event)
+
+    def mouseMoveEvent(self, event):
+        """
+        Note: ImageScene2D has special behavior to send us mouseMoveEvents that we would otherwise not receive.
+              In such cases, the event.pos() may be invalid, so don't use it.
+        """
+        if event.buttons() == Qt.NoButton:
+            return
+        p0 = self.mapFromScene(event.lastScenePos())
+        p1 = self.mapFromScene(event.scenePos())
+        for edge in self.edges.edges_along((p0.x(), p0.y()), (p1.x(), p1.y()), self._tolerance()):
+            self.handle_mouse_drag(self.edges.id_pairs[edge], event)
 
     def handle_edge_clicked(self, id_pair, event):
         self.edgeClicked.emit(id_pair, event)
@@ -70,53 +428,65 @@ class SegmentationEdgesItem(QGraphicsObject):
     def handle_mouse_drag(self, id_pair, event):
         self.edgeSwiped.emit(id_pair, event)
 
-    def handle_updated_pen_table(self, updated_path_ids):
-        updated_path_ids = self.path_ids.intersection(updated_path_ids)
-        for id_pair in updated_path_ids:
-            item = self.path_items[id_pair]
-            pen = self.edge_pen_table.get(id_pair, self.default_pen)
-            item.setPen(pen)
+    def handle_updated_edges(self, edges, max_pen_width=0.0):
+        """
+        Called by the EdgeTileIndex when the pens of some of our edges have changed.
 
+        edges: indices (into edges.id_pairs) of the changed edges
+        max_pen_width: the width of the widest new pen
+        """
+        if max_pen_width > self._max_pen_width:
+            self.prepareGeometryChange()
+            self._max_pen_width = max_pen_width
+            self._bounding_rect = self._compute_bounding_rect()
+        # The new pens are looked up when we're painted next, items that aren't shown never need them.
+        self._changed_edges.append(edges)
+        self._pen_groups = None
+        self.update()
+
+
+def line_segments_for_labels_PURE_PYTHON(label_img, simplify_with_tolerance=None):
+    """
+    Find the line segments separating the segments of a 2D label image.
 
-def painter_paths_for_labels_PURE_PYTHON(label_img, simplify_with_tolerance=None):
+    Returns a dict { id_pair : (N, 2, 2) array of line segments (pairs of (x, y) end points) }.
+    Only numpy is involved, so this may be called from any thread.
+    """
     # Find edge coordinates.
     # Note: 'x_axis' edges are those found when sweeping along the x axis.
     #       That is, the line separating the two segments will be *vertical*.
     assert label_img.ndim == 2
+    if simplify_with_tolerance is None:
+        # Convert the coordinates of both axes to line segments at once and group them by edge in a single pass.
+        x_axis_ids, x_axis_coords = edge_ids_and_coords_along_axis(label_img, 0)
+        y_axis_ids, y_axis_coords = edge_ids_and_coords_along_axis(label_img, 1)
+        line_segments = line_segments_from_edge_coords(y_axis_coords, x_axis_coords)
+        return group_by_edge_ids(np.concatenate((y_axis_ids, x_axis_ids)), line_segments)
+
     x_axis_edge_coords, y_axis_edge_coords = edge_coords_nd(label_img)
     # x_axis_edge_coords, y_axis_edge_coords = edgeCoords2D(label_img)
 
-    # Populate the path_items dict.
-    painter_paths = {}
-    for id_pair in set(list(x_axis_edge_coords.keys()) + list(y_axis_edge_coords.keys())):
-        horizontal_edge_coords = vertical_edge_coords = []
-        if id_pair in y_axis_edge_coords:
-            horizontal_edge_coords = y_axis_edge_coords[id_pair]
-        if id_pair in x_axis_edge_coords:
-            vertical_edge_coords = x_axis_edge_coords[id_pair]
-        painter_paths[id_pair] = painter_path_from_edge_coords(
-            horizontal_edge_coords, vertical_edge_coords, simplify_with_tolerance
+    line_segments = {}
+    for id_pair in set(x_axis_edge_coords.keys()) | set(y_axis_edge_coords.keys()):
+        line_segments[id_pair] = line_segments_from_edge_coords(
+            y_axis_edge_coords.get(id_pair, ()), x_axis_edge_coords.get(id_pair, ()), simplify_with_tolerance
         )
 
-    return painter_paths
+    return line_segments
 
 
 try:
     import vigra
-    from ilastik_carving_tools import line_segments_for_labels
+    from ilastik_carving_tools import line_segments_for_labels as _carving_line_segments_for_labels
 
-    def painter_paths_for_labels(label_img, simplify_with_tolerance=None):
+    def line_segments_for_labels(label_img, simplify_with_tolerance=None):
         if simplify_with_tolerance is not None:
-            return painter_paths_for_labels_PURE_PYTHON(label_img, simplify_with_tolerance)
-        line_seg_lookup = line_segments_for_labels(vigra.taggedView(label_img, "xy"))
-        painter_paths = {}
-        for edge_id, line_segments in list(line_seg_lookup.items()):
-            point_list = line_segments.reshape(-1, 2)
-            painter_paths[edge_id] = arrayToQPath(point_list[:, 0], point_list[:, 1], connect="pairs")
-        return painter_paths
+            return line_segments_for_labels_PURE_PYTHON(label_img, simplify_with_tolerance)
+        line_seg_lookup = _carving_line_segments_for_labels(vigra.taggedView(label_img, "xy"))
+        return {edge_id: line_segments.reshape(-1, 2, 2) for edge_id, line_segments in line_seg_lookup.items()}
 
 except ImportError:
-    painter_paths_for_labels = painter_paths_for_labels_PURE_PYTHON
+    line_segments_for_labels = line_segments_for_labels_PURE_PYTHON
 
 try:
     from ilastik_carving_tools import edgeCoords2D
@@ -126,22 +496,6 @@ except ImportError:
     pass
 
 
-def generate_path_items_for_labels(
-    edge_pen_table, default_pen, label_img, simplify_with_tolerance=None, isClickable=False
-):
-    painter_paths = painter_paths_for_labels(label_img, simplify_with_tolerance)
-
-    path_items = {}
-    for id_pair in list(painter_paths.keys()):
-        path_items[id_pair] = SingleEdgeItem(
-            id_pair,
-            painter_paths[id_pair],
-            initial_pen=edge_pen_table.get(id_pair, default_pen),
-            isClickable=isClickable,
-        )
-    return path_items
-
-
 def line_segments_from_edge_coords(horizontal_edge_coords, vertical_edge_coords, simplify_with_tolerance=None):
     """
     simplify_with_tolerance: If None, no simplification.
@@ -158,32 +512,24 @@ def line_segments_from_edge_coords(horizontal_edge_coords, vertical_edge_coords,
     #     line_segments.append( ((x+1, y), (x+1, y+1)) )
 
     # Same as above commented-out code, but faster
-    if horizontal_edge_coords:
-        horizontal_edge_coords = np.array(horizontal_edge_coords)
-    else:
-        horizontal_edge_coords = np.ndarray((0, 2), dtype=np.uint32)
-
-    if vertical_edge_coords:
-        vertical_edge_coords = np.array(vertical_edge_coords)
-    else:
-        vertical_edge_coords = np.ndarray((0, 2), dtype=np.uint32)
-
-    num_segments = len(horizontal_edge_coords) + len(vertical_edge_coords)
-    line_segments = np.zeros((num_segments, 2, 2), dtype=np.uint32)
-    line_segments[: len(horizontal_edge_coords), 0, :] = horizontal_edge_coords + (0, 1)
-    line_segments[: len(horizontal_edge_coords), 1, :] = horizontal_edge_coords + (1, 1)
-    line_segments[len(horizontal_edge_coords) :, 0, :] = vertical_edge_coords + (1, 0)
-    line_segments[len(horizontal_edge_coords) :, 1, :] = vertical_edge_coords + (1, 1)
+    horizontal_edge_coords = np.reshape(horizontal_edge_coords, (-1, 2))
+    vertical_edge_coords = np.reshape(vertical_edge_coords, (-1, 2))
+
+    num_horizontal = len(horizontal_edge_coords)
+    line_segments = np.empty((num_horizontal + len(vertical_edge_coords), 2, 2), dtype=np.uint32)
+    line_segments[:num_horizontal, 0, :] = horizontal_edge_coords + (0, 1)
+    line_segments[:num_horizontal, 1, :] = horizontal_edge_coords + (1, 1)
+    line_segments[num_horizontal:, 0, :] = vertical_edge_coords + (1, 0)
+    line_segments[num_horizontal:, 1, :] = vertical_edge_coords + (1, 1)
 
     if simplify_with_tolerance is not None:
         sequential_points = simplify_line_segments(line_segments, tolerance=simplify_with_tolerance)
-        line_segments = []
-        for point_list in sequential_points:
-            # Since these points are already in order, doubling the size of the point list like this
-            # is slightly inefficient, but it simplifies things because we can use the same QPath
-            # generation method.
-            line_segments += list(zip(point_list[:-1], point_list[1:]))
-        line_segments = np.array(line_segments)
+        # Since these points are already in order, doubling the size of the point list like this
+        # is slightly inefficient, but it simplifies things because we can use the same QPath
+        # generation method.
+        line_segments = np.concatenate(
+            [np.stack((points[:-1], points[1:]), axis=1) for points in sequential_points] or [np.zeros((0, 2, 2))]
+        )
     return line_segments
 
 
@@ -196,90 +542,6 @@ def painter_path_from_edge_coords(horizontal_edge_coords, vertical_edge_coords,
     return path
 
 
-class SingleEdgeItem(QGraphicsPathItem):
-    """
-    Represents a single edge between two superpixels.
-    Must be owned by a SegmentationEdgesItem object
-    """
-
-    def __init__(self, id_pair, painter_path, initial_pen=None, isClickable=False):
-        super(SingleEdgeItem, self).__init__()
-        self.parent = None  # Should be initialized with set_parent()
-        self.id_pair = id_pair
-        self._hover = False
-        if not initial_pen:
-            initial_pen = QPen()
-            initial_pen.setCosmetic(True)
-            initial_pen.setCapStyle(Qt.RoundCap)
-            initial_pen.setColor(Qt.white)
-            initial_pen.setWidth(3)
-
-        self.setPen(initial_pen)
-        self.setPath(painter_path)
-        if isClickable:
-            self.setCursor(Qt.PointingHandCursor)
-
-        self._scale = 1
-
-    def shape(self):
-        # Adjust active area depending on the zoom level
-        stroker = QPainterPathStroker()
-        stroker.setWidth(self.pen().width() * self._scale)
-        return stroker.createStroke(self.path())
-
-    def hoverEnterEvent(self, event: QGraphicsSceneHoverEvent):
-        self.parent.hoverIdChanged.emit(self.id_pair)
-
-    def hoverLeaveEvent(self, event: QGraphicsSceneHoverEvent):
-        self.parent.hoverIdChanged.emit(None)
-
-    def mousePressEvent(self, event):
-        self.parent.handle_edge_clicked(self.id_pair, event)
-
-    def mouseMoveEvent(self, event):
-        """
-        Note: ImageScene2D has special behavior to send us mouseMoveEvents that we would otherwise not receive.
-              In such cases, the event.pos() may be invalid, so don't use it.
-        """
-        if event.buttons() != Qt.NoButton:
-            self.parent.handle_mouse_drag(self.id_pair, event)
-
-    def handle_id_hover(self, id_pair):
-        if self.id_pair == id_pair and not self._hover:
-            self._hover = True
-            self.update(self.boundingRect())
-        elif self.id_pair != id_pair and self._hover:
-            self._hover = False
-            self.update(self.boundingRect())
-
-    def set_parent(self, parent):
-        assert isinstance(parent, SegmentationEdgesItem)
-        self.setParentItem(parent)
-        self.parent = parent
-        if self.parent.hoverIdChanged:
-            self.setAcceptHoverEvents(True)
-            self.parent.hoverIdChanged.connect(self.handle_id_hover)
-        if not self.parent.isClickable:
-            self.setAcceptedMouseButtons(Qt.NoButton)
-
-    def paint(self, painter: QPainter, option, widget):
-        transform, invertable = painter.worldTransform().inverted()
-        if invertable:
-            self._scale = transform.m11()
-
-        if self._hover:
-            hover_pen = QPen(self.pen())
-            hover_pen.setWidth(hover_pen.width() + 2)
-            painter.strokePath(self.path(), hover_pen)
-        else:
-            super().paint(painter, option, widget)
-
-    ## Default implementation automatically already calls mousePressEvent()...
-    # def mouseDoubleClickEvent(self, event):
-    #    event.accept()
-    #    self.parent.handle_edge_clicked( self.id_pair )
-
-
 def pop_matching(l, match_f):
     for i, item in enumerate(l):
         if match_f(item):
@@ -419,10 +681,10 @@ if __name__ == "__main__":
     pen_table = SignalingDict(None)
 
     start = time.time()
-    path_items = generate_path_items_for_labels(pen_table, default_pen, labels_img, None)
-    print("generate took {}".format(time.time() - start))  # 52 ms
+    tile_edges = TileEdges.from_labels(labels_img)
+    print("generate took {}".format(time.time() - start))
 
-    edges_item = SegmentationEdgesItem(path_items, pen_table, default_pen)
+    edges_item = SegmentationEdgesItem(tile_edges, pen_table, default_pen, isClickable=True)
 
     def assign_random_color(id_pair, buttons):
         print("handling click: {}".format(id_pair))
@@ -86,11 +86,24 @@ class SignalingDict(QObject):
         added_keys = other_keys - original_keys
 
         common_keys = original_keys.intersection(other_keys)
-        changed_keys = [key for key in common_keys if self._dict[key] != other[key]]
+        changed_keys = [
+            key for key in common_keys if self._dict[key] is not other[key] and self._dict[key] != other[key]
+        ]
 
         self._dict.update(other)
         self.updated.emit(set(changed_keys).union(added_keys))
 
+    def discard(self, keys):
+        """
+        Remove the given keys, ignoring those that are not present.
+        The updated() signal is emitted once, with all removed keys.
+        """
+        removed_keys = {key for key in keys if key in self._dict}
+        for key in removed_keys:
+            del self._dict[key]
+        if removed_keys:
+            self.updated.emit(removed_keys)
+
     def clear(self):
         keys = list(self._dict.keys())
         self._dict.clear()
@@ -116,6 +116,8 @@ class GlobalThunkEventProcessor(QObject):
     def __init__(self, parent=None):
         super(GlobalThunkEventProcessor, self).__init__(parent)
         self.thunkEventHandler = ThunkEventHandler(self)
+        self._batch = []
+        self._batchLock = threading.Lock()
 
     def execute(self, f, *args, **kwargs):
         if threading.current_thread().name == "MainThread":
@@ -132,9 +134,42 @@ class GlobalThunkEventProcessor(QObject):
         e.wait()
         return result[0]
 
+    def execute_batched(self, f, *args, **kwargs):
+        """
+        Like execute(), but calls made from several threads before the main thread
+        gets to process them are executed together, in a single event.
+        Exceptions raised by f are re-raised in the calling thread.
+        """
+        if threading.current_thread().name == "MainThread":
+            return f(*args, **kwargs)
+
+        e = threading.Event()
+        outcome = [None, None]  # result, exception
+        with self._batchLock:
+            self._batch.append((partial(f, *args, **kwargs), e, outcome))
+            first = len(self._batch) == 1
+        if first:
+            self.thunkEventHandler.post(self._executeBatch)
+        e.wait()
+        if outcome[1] is not None:
+            raise outcome[1]
+        return outcome[0]
+
+    def _executeBatch(self):
+        with self._batchLock:
+            batch, self._batch = self._batch, []
+        for f, e, outcome in batch:
+            try:
+                outcome[0] = f()
+            except BaseException as ex:
+                outcome[1] = ex
+            finally:
+                e.set()
+
 
 global_thunk_event_processor = GlobalThunkEventProcessor()
 execute_in_main_thread = global_thunk_event_processor.execute
+execute_in_main_thread_batched = global_thunk_event_processor.execute_batched
 
 if __name__ == "__main__":
     import threading
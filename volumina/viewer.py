@@ -235,6 +235,14 @@ class Viewer(QMainWindow):
         self.layerstack.append(layer)
         return layer
 
+    def addMultiChannelCompositeLayer(self, a, name=None, **kwargs):
+        source, self.dataShape = createDataSource(a, True)
+        layer = MultiChannelCompositeLayer(source, **kwargs)
+        if name:
+            layer.name = name
+        self.layerstack.append(layer)
+        return layer
+
     def addRGBALayer(self, a, name=None):
         assert a.shape[2] >= 3
         sources = [None, None, None, None]
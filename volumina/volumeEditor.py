@@ -49,6 +49,8 @@ from .imageView2D import ImageView2D
 from .positionModel import PositionModel
 from .croppingMarkers import CropExtentsModel
 from .navigationController import NavigationController, NavigationInterpreter
+from .playbackController import PlaybackController
+from .warmUpController import WarmUpController
 from .brushingcontroller import BrushingInterpreter, BrushingController, CrosshairController
 from .thresholdingcontroller import ThresholdingInterpreter
 from .brushingmodel import BrushingModel
@@ -211,6 +213,12 @@ class VolumeEditor(QObject):
         self.navCtrl = NavigationController(self.imageViews, self.imagepumps, self.posModel, view3d=self.view3d)
         self.navInterpret = NavigationInterpreter(self.navCtrl)
 
+        # playback of the time axis
+        self.player = PlaybackController(self.posModel, self.imageScenes, parent=self)
+
+        # background warm-up of a region of interest
+        self.roiWarmUp = WarmUpController(self.imageScenes, parent=self)
+
         # event switch
         self.eventSwitch = EventSwitch(self.imageViews, self.navInterpret)
 
@@ -239,6 +247,8 @@ class VolumeEditor(QObject):
         if crosshair:
             self.posModel.cursorPositionChanged.connect(self.navCtrl.moveCrosshair)
         self.posModel.slicingPositionSettled.connect(self.navCtrl.settleSlicingPosition)
+        self.posModel.activeViewChanged.connect(self._onActiveViewChanged)
+        self._onActiveViewChanged(self.posModel.activeView)
 
         self.layerStack.layerAdded.connect(self._onLayerAdded)
         self.parent = parent
@@ -269,6 +279,8 @@ class VolumeEditor(QObject):
             i.setTileWidth(tileWidth)
 
     def cleanUp(self):
+        self.player.stop()
+        self.roiWarmUp.cancel()
         QApplication.processEvents()
         for scene in self._imageViews:
             scene.close()
@@ -324,6 +336,10 @@ class VolumeEditor(QObject):
         view3d.slice_changed.connect(onSliceDragged)
         return view3d
 
+    def _onActiveViewChanged(self, axis):
+        for i, scene in enumerate(self.imageScenes):
+            scene.setActive(i == axis)
+
     def _onLayerAdded(self, layer, row):
         self.navCtrl.layerChangeChannel(layer)
         layer.channelChanged.connect(partial(self.navCtrl.layerChangeChannel, layer=layer))
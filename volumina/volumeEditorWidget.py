@@ -52,6 +52,7 @@ from qtpy.QtWidgets import (
     QSpacerItem,
     QDialogButtonBox,
     QVBoxLayout,
+    QProgressDialog,
 )
 
 # volumina
@@ -575,15 +576,55 @@ class VolumeEditorWidget(QWidget):
         self._viewMenu.addAction("Set layer cache size").triggered.connect(setCacheSize)
 
         def enablePrefetching(enable):
-            # Enable for Z view only
-            self.editor.imageScenes[2].setPrefetchingEnabled(enable)
+            for scene in self.editor.imageScenes:
+                scene.setPrefetchingEnabled(enable)
 
-        #             for scene in self.editor.imageScenes:
-        #                 scene.setPrefetchingEnabled( enable )
         actionUsePrefetching = self._viewMenu.addAction("Use prefetching")
         actionUsePrefetching.setCheckable(True)
+        actionUsePrefetching.setChecked(True)
         actionUsePrefetching.toggled.connect(enablePrefetching)
 
+        def playTimeSeries(play):
+            self.editor.player.setPlaying(play)
+            actionPlay.setChecked(self.editor.player.isPlaying())
+
+        actionPlay = self._viewMenu.addAction("Play time series")
+        actionPlay.setCheckable(True)
+        actionPlay.triggered.connect(playTimeSeries)
+        self.editor.player.playingChanged.connect(actionPlay.setChecked)
+
+        def warmUpCroppedRegion():
+            cropModel = self.editor.cropModel
+            start, stop = cropModel.get_roi_3d()
+            t_start, t_stop = cropModel.get_roi_t()
+            warmUp = self.editor.roiWarmUp
+
+            progressDialog = QProgressDialog("Warming up the cropped region...", "Cancel", 0, 100, self)
+            progressDialog.setWindowTitle("Warm-up")
+            progressDialog.setMinimumDuration(0)
+            progressDialog.canceled.connect(warmUp.cancel)
+
+            def showProgress(progress, eta):
+                progressDialog.setValue(int(progress * 100))
+                text = "Warming up the cropped region..."
+                if eta is not None:
+                    text += "\n%d s left" % eta
+                if warmUp.skippedSlices:
+                    text += "\n%d slices don't fit into the cache" % warmUp.skippedSlices
+                progressDialog.setLabelText(text)
+
+            def finish(_completed):
+                warmUp.progressChanged.disconnect(showProgress)
+                warmUp.finished.disconnect(finish)
+                progressDialog.close()
+
+            warmUp.progressChanged.connect(showProgress)
+            warmUp.finished.connect(finish)
+            warmUp.start((t_start,) + tuple(start), (t_stop,) + tuple(stop))
+
+        actionWarmUp = self._viewMenu.addAction("Warm up cropped region")
+        actionWarmUp.triggered.connect(warmUpCroppedRegion)
+
         def blockGuiForRendering():
             for v in self.editor.imageViews:
                 v.scene().joinRenderingAllTiles()
@@ -0,0 +1,161 @@
+###############################################################################
+#   volumina: volume slicing and editing library
+#
+#       Copyright (C) 2011-2025, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+#          http://ilastik.org/license/
+###############################################################################
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from qtpy.QtCore import QObject, QRectF, QTimer, Signal
+
+from volumina.config import CONFIG
+from volumina.imageScene2D import ImageScene2D
+
+
+class _SceneWarmUp:
+    """The slices of a region of interest still to be warmed up in one scene"""
+
+    def __init__(self, scene: ImageScene2D, rectF: QRectF, throughs: List[Tuple[int, int]]):
+        self.scene = scene
+        self.rectF = rectF
+        self.pending = throughs
+        self.running: List[Tuple[int, int]] = []
+        self.done = 0
+
+
+class WarmUpController(QObject):
+    """
+    Fetches a region of interest (e.g. the crop of a CropExtentsModel) into the
+    tile caches of the image scenes in the background.
+
+    The slices of the region are fetched nearest to the current slice first,
+    a few at a time per scene (IN_FLIGHT), after all other tiles (see
+    TileProvider.warmUp): the tiles the user is looking at only wait for the
+    warm-up tasks that are already running. Slices that don't fit into the
+    memory budget are left out. The warmed up slices are pinned in the tile
+    caches until the next warm-up, or until it is cancelled.
+    """
+
+    progressChanged = Signal(float, object)  # fraction of the slices warmed up, estimated seconds left (or None)
+    finished = Signal(bool)  # False if cancelled
+
+    # slices per scene that are fetched at the same time
+    IN_FLIGHT = 2
+    # ms between checks of the slices in flight
+    POLL_INTERVAL = 100
+
+    def __init__(self, imageScenes: Sequence[ImageScene2D], parent=None):
+        super().__init__(parent)
+        self._scenes = list(imageScenes)
+        self._layers = None
+        self._jobs: List[_SceneWarmUp] = []
+        self._total = 0
+        self._skipped = 0
+        self._started = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.POLL_INTERVAL)
+        self._timer.timeout.connect(self._poll)
+
+    def isRunning(self) -> bool:
+        return self._timer.isActive()
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the slices of the region (that fit into the memory budget) that are warmed up"""
+        if not self._total:
+            return 1.0
+        done = sum(job.done for job in self._jobs)
+        done += sum(
+            job.scene.sliceProgress(job.rectF, through, self._layers) for job in self._jobs for through in job.running
+        )
+        return done / self._total
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds until the warm-up is complete, None until a part of it is done"""
+        progress = self.progress
+        if progress <= 0.0:
+            return None
+        return (time.perf_counter() - self._started) * (1.0 - progress) / progress
+
+    @property
+    def skippedSlices(self) -> int:
+        """Slices of the region that were left out because they don't fit into the memory budget"""
+        return self._skipped
+
+    def start(self, start: Sequence[int], stop: Sequence[int], layer_indexes=None, memory_budget: Optional[int] = None):
+        """
+        Warm up the region from start to stop, (t, x, y, z) each, replacing a running warm-up.
+
+        layer_indexes: the layers to fetch, all if None.
+        memory_budget: bytes the cached tiles of the region may take in all scenes,
+                       by default the size of the shared layer tile cache.
+        """
+        self.cancel()
+        if memory_budget is None:
+            memory_budget = CONFIG.cache_size
+
+        self._layers = layer_indexes
+        self._jobs = []
+        self._total = self._skipped = 0
+        for scene in self._scenes:
+            rectF, throughs = scene.roiSlices(start, stop)
+            slice_bytes = scene.sliceBytes(rectF, layer_indexes)
+            if slice_bytes:
+                fit = memory_budget // (len(self._scenes) * slice_bytes)
+                self._skipped += max(0, len(throughs) - fit)
+                throughs = throughs[:fit]
+            # keep the warmed up slices once the warm-up is done, without growing the cache for other slices
+            scene.pinSlices(throughs)
+            self._jobs.append(_SceneWarmUp(scene, rectF, throughs))
+            self._total += len(throughs)
+
+        self._started = time.perf_counter()
+        self._timer.start()
+        self._poll()
+
+    def cancel(self):
+        if not self.isRunning():
+            return
+        self._stop()
+        for job in self._jobs:
+            job.scene.pinSlices([])
+        self.finished.emit(False)
+
+    def _stop(self):
+        self._timer.stop()
+        for job in self._jobs:
+            job.scene.warmUp(QRectF(), [])
+
+    def _poll(self):
+        for job in self._jobs:
+            for through in list(job.running):
+                if job.scene.sliceProgress(job.rectF, through, self._layers) >= 1.0:
+                    job.running.remove(through)
+                    job.done += 1
+            while job.pending and len(job.running) < self.IN_FLIGHT:
+                job.running.append(job.pending.pop(0))
+            # slices that became dirty meanwhile are requested again
+            job.scene.warmUp(job.rectF, job.running, self._layers)
+
+        self.progressChanged.emit(self.progress, self.eta)
+        if all(not job.running for job in self._jobs):
+            self._stop()
+            self.finished.emit(True)